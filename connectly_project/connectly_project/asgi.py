@@ -12,5 +12,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'connectly_project.settings')
+# Serve the read-heavy endpoints with the native async views (posts/async_views.py)
+os.environ.setdefault('ASYNC_API_VIEWS', 'True')
 
 application = get_asgi_application()
+
+# Maintenance tasks in a background thread when SCHEDULER_IN_PROCESS is set (posts/scheduler.py)
+from posts import scheduler  # noqa: E402  (needs the apps loaded by the line above)
+scheduler.start_in_process()
@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os # Added for environment variables
-from decouple import config # Added for environment variables
+from decouple import Csv, config # Added for environment variables
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -58,6 +60,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'posts.User'
 
 MIDDLEWARE = [
+    'posts.middleware.RequestMetricsMiddleware', # First, so its timings cover the whole stack
+    'posts.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -127,15 +131,170 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {
+            # On disk rather than in memory so threaded tests get SQLite's real
+            # file locking (and busy timeout) between connections
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# DATABASE_PROFILE=sqlite-concurrent tunes SQLite for many concurrent requests:
+# WAL (readers no longer wait for writers), write locks taken at BEGIN and
+# waited for up to SQLITE_BUSY_TIMEOUT_MS, synchronous=NORMAL (a power loss can
+# drop the last commits, never corrupt the file), a larger page cache and
+# memory-mapped reads, and connections kept open between requests.
+SQLITE_BUSY_TIMEOUT_MS = config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int)
+SQLITE_CONCURRENT_PROFILE = {
+    'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=600, cast=int),
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+        # Read-then-write transactions can't fail on lock upgrade if they start as writers
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join([
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}',
+            f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=268435456, cast=int)}",
+            # Negative: size in KiB rather than pages
+            f"PRAGMA cache_size=-{config('SQLITE_CACHE_SIZE_KB', default=65536, cast=int)}",
+            'PRAGMA temp_store=MEMORY',
+        ]),
+    },
+}
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='default')
+if DATABASE_PROFILE == 'sqlite-concurrent':
+    DATABASES['default'].update(SQLITE_CONCURRENT_PROFILE)
+elif DATABASE_PROFILE != 'default':
+    raise ImproperlyConfigured(f"Unknown DATABASE_PROFILE {DATABASE_PROFILE!r}; use 'default' or 'sqlite-concurrent'")
+
+# Read replicas (posts/routers.py): reads go to one of REPLICA_DATABASES, writes
+# to `default`. DATABASE_REPLICAS takes comma separated SQLite files for local
+# testing (aliases replica1, replica2, ...); for PostgreSQL add the aliases to
+# DATABASES and list them in REPLICA_DATABASES. A client that wrote reads from
+# the primary for REPLICA_PIN_SECONDS afterwards, so it sees its own writes.
+REPLICA_DATABASES = []
+for index, replica_name in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': replica_name,
+        # Tests read the replica through the test database
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+DATABASE_ROUTERS = ['posts.routers.ReplicaRouter']
+
+
+# Caches
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# The `responses` alias backs posts.cache.ResponseCache. The default is a bounded
+# in-process LRU; set RESPONSE_CACHE_BACKEND=filebased to share entries between local workers.
+# The `auth` alias backs posts.authentication.CachedTokenAuthentication.
+
+RESPONSE_CACHE_BACKEND = config('RESPONSE_CACHE_BACKEND', default='locmem')
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+# Feed pages are invalidated by every post, like and comment; this bounds their age otherwise
+FEED_CACHE_TIMEOUT = config('FEED_CACHE_TIMEOUT', default=30, cast=int)
+# How long CachedTokenAuthentication may serve a token -> user lookup from the `auth` alias
+AUTH_TOKEN_CACHE_TIMEOUT = config('AUTH_TOKEN_CACHE_TIMEOUT', default=60, cast=int)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'connectly-default',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'connectly-responses',
+        'OPTIONS': {'MAX_ENTRIES': config('RESPONSE_CACHE_MAX_ENTRIES', default=5000, cast=int)},
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'connectly-auth',
+        'OPTIONS': {'MAX_ENTRIES': config('AUTH_TOKEN_CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    },
+    # Failed logins (posts/login.py); apart from `auth` so a flood of bad passwords can't evict tokens
+    'login_failures': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'connectly-login-failures',
+        'OPTIONS': {'MAX_ENTRIES': config('LOGIN_NEGATIVE_CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    },
+}
+if RESPONSE_CACHE_BACKEND == 'filebased':
+    CACHES['responses'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('RESPONSE_CACHE_LOCATION', default=str(BASE_DIR / '.response_cache')),
+        'OPTIONS': {'MAX_ENTRIES': config('RESPONSE_CACHE_MAX_ENTRIES', default=5000, cast=int)},
+    }
+elif RESPONSE_CACHE_BACKEND != 'locmem':
+    raise ImproperlyConfigured(f"Unknown RESPONSE_CACHE_BACKEND {RESPONSE_CACHE_BACKEND!r}; use 'locmem' or 'filebased'")
+
+# Rate limiting (posts/throttling.py): RATE_LIMIT_BACKEND=memory keeps per-process token
+# buckets; filebased counts in the `ratelimit` cache, shared by the workers on one host.
+RATE_LIMIT_BACKEND = config('RATE_LIMIT_BACKEND', default='memory')
+if RATE_LIMIT_BACKEND == 'filebased':
+    CACHES['ratelimit'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('RATE_LIMIT_LOCATION', default=str(BASE_DIR / '.ratelimit')),
+    }
+elif RATE_LIMIT_BACKEND != 'memory':
+    raise ImproperlyConfigured(f"Unknown RATE_LIMIT_BACKEND {RATE_LIMIT_BACKEND!r}; use 'memory' or 'filebased'")
+
+# Request instrumentation (posts/metrics.py): length of the rolling window behind
+# /posts/metrics/, and whether responses carry a Server-Timing header
+REQUEST_METRICS_WINDOW = config('REQUEST_METRICS_WINDOW', default=300, cast=int)
+REQUEST_METRICS_SERVER_TIMING = config('REQUEST_METRICS_SERVER_TIMING', default=True, cast=bool)
+
+# Route the feed, post detail, comment list and like URLs to the async views in
+# posts/async_views.py. asgi.py turns this on; WSGI keeps the DRF views.
+ASYNC_API_VIEWS = config('ASYNC_API_VIEWS', default=False, cast=bool)
+
+# Write-behind likes (posts/like_buffer.py): like/unlike only update memory and a
+# background thread writes them every LIKE_FLUSH_INTERVAL seconds. A crash loses
+# at most that many seconds of likes. 0 disables the thread (flush manually).
+LIKE_WRITE_BEHIND = config('LIKE_WRITE_BEHIND', default=False, cast=bool)
+LIKE_FLUSH_INTERVAL = config('LIKE_FLUSH_INTERVAL', default=1.0, cast=float)
+# Posts whose liking users stay in memory between flushes (least recently liked are dropped)
+LIKE_MEMBER_CACHE_SIZE = config('LIKE_MEMBER_CACHE_SIZE', default=10000, cast=int)
+
+# Argon2 (argon2-cffi) hashes new passwords; PBKDF2 and BCrypt hashes still verify and
+# are upgraded to Argon2 on the user's next login (posts/login.py)
 PASSWORD_HASHERS = [
-    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
 ]
 
+# Login pipeline (posts/login.py): logins allowed to hash at once before the endpoint
+# answers 503, and how long failed credentials are remembered
+LOGIN_HASH_SLOTS = config('LOGIN_HASH_SLOTS', default=os.cpu_count() or 1, cast=int)
+LOGIN_NEGATIVE_CACHE_SECONDS = config('LOGIN_NEGATIVE_CACHE_SECONDS', default=30, cast=int)
+
+# Media job queue (posts/media_jobs.py): worker processes per runner (0 processes in the
+# runner itself), jobs claimed per batch, seconds before a running job counts as abandoned,
+# attempts before a job fails, and whether web processes run the queue in a background
+# thread (polling every MEDIA_JOB_POLL_INTERVAL seconds) instead of `manage.py process_media`
+MEDIA_JOB_WORKERS = config('MEDIA_JOB_WORKERS', default=os.cpu_count() or 1, cast=int)
+MEDIA_JOB_BATCH_SIZE = config('MEDIA_JOB_BATCH_SIZE', default=50, cast=int)
+MEDIA_JOB_TIMEOUT = config('MEDIA_JOB_TIMEOUT', default=300, cast=int)
+MEDIA_JOB_MAX_ATTEMPTS = config('MEDIA_JOB_MAX_ATTEMPTS', default=3, cast=int)
+MEDIA_JOBS_IN_PROCESS = config('MEDIA_JOBS_IN_PROCESS', default=False, cast=bool)
+MEDIA_JOB_POLL_INTERVAL = config('MEDIA_JOB_POLL_INTERVAL', default=5.0, cast=float)
+# Days finished jobs are kept before the scheduler's prune_media_jobs task deletes them
+MEDIA_JOB_RETENTION_DAYS = config('MEDIA_JOB_RETENTION_DAYS', default=7, cast=int)
+
+# Maintenance scheduler (posts/scheduler.py): threads running due tasks, seconds between
+# checks for due tasks, rows per batch inside tasks, days of run log kept, and whether web
+# processes run the scheduler in a background thread instead of `manage.py run_scheduler`
+SCHEDULER_WORKERS = config('SCHEDULER_WORKERS', default=2, cast=int)
+SCHEDULER_POLL_INTERVAL = config('SCHEDULER_POLL_INTERVAL', default=5.0, cast=float)
+SCHEDULER_BATCH_SIZE = config('SCHEDULER_BATCH_SIZE', default=500, cast=int)
+SCHEDULER_RUN_LOG_DAYS = config('SCHEDULER_RUN_LOG_DAYS', default=30, cast=int)
+SCHEDULER_IN_PROCESS = config('SCHEDULER_IN_PROCESS', default=False, cast=bool)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
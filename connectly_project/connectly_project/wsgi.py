@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'connectly_project.settings')
 
 application = get_wsgi_application()
+
+# Maintenance tasks in a background thread when SCHEDULER_IN_PROCESS is set (posts/scheduler.py)
+from posts import scheduler  # noqa: E402  (needs the apps loaded by the line above)
+scheduler.start_in_process()
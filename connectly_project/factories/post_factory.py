@@ -1,36 +1,36 @@
+from itertools import islice
+
+from django.db import transaction
+
+from posts import media_jobs
 from posts.models import Post
+from posts.signals import notify_posts_created
+from posts.timeline import fan_out_post, fan_out_posts
 
 
 class PostFactory:
+    # Rows per INSERT statement/transaction in create_posts
+    BULK_BATCH_SIZE = 500
+
     @staticmethod
-    def create_post(post_type, title, content='', metadata=None, author=None):
+    def build_post(post_type, title, content='', metadata=None, author=None):
         """
-        Factory method to create posts with validation.
-        
-        Args:
-            post_type: Type of post (text, image, video)
-            title: Title of the post
-            content: Content of the post (optional)
-            metadata: Dictionary containing post metadata (optional)
-            author: User instance who is creating the post (optional)
-            
-        Returns:
-            Post: Created Post instance
-            
+        Validate the post fields and return an unsaved Post.
+
         Raises:
             ValueError: If post_type is invalid or required metadata is missing
         """
         if metadata is None:
             metadata = {}
-        
+
         # Validate metadata is a dictionary
         if not isinstance(metadata, dict):
             raise ValueError("Metadata must be a JSON object (dictionary)")
-        
+
         # Validate title length (max_length=255 in model)
         if len(title) > 255:
             raise ValueError("Title cannot exceed 255 characters")
-            
+
         if post_type not in dict(Post.POST_TYPES):
             raise ValueError("Invalid post type")
 
@@ -40,10 +40,93 @@ class PostFactory:
         if post_type == 'video' and 'duration' not in metadata:
             raise ValueError("Video posts require 'duration' in metadata")
 
-        return Post.objects.create(
+        return Post(
             title=title,
             content=content,
             post_type=post_type,
             metadata=metadata,
             author=author
         )
+
+    @staticmethod
+    def create_post(post_type, title, content='', metadata=None, author=None):
+        """
+        Factory method to create posts with validation.
+
+        Args:
+            post_type: Type of post (text, image, video)
+            title: Title of the post
+            content: Content of the post (optional)
+            metadata: Dictionary containing post metadata (optional)
+            author: User instance who is creating the post (optional)
+
+        Returns:
+            Post: Created Post instance
+
+        Raises:
+            ValueError: If post_type is invalid or required metadata is missing
+        """
+        post = PostFactory.build_post(post_type, title, content, metadata, author)
+        with transaction.atomic():
+            post.save()
+            # Push the post into the followers' home timelines
+            fan_out_post(post)
+            # Media metadata is processed after the request, by the job queue
+            media_jobs.enqueue([post])
+            notify_posts_created([post])
+        return post
+
+    @staticmethod
+    def create_posts(items, author=None, batch_size=None):
+        """
+        Validate and create many posts, writing them in chunks with bulk_create.
+
+        Args:
+            items: Iterable of dicts with post_type (default 'text'), title, content and metadata.
+                   It is consumed lazily, so generators and streams are fine.
+            author: User instance set as the author of every post (optional)
+            batch_size: Posts per INSERT/transaction (defaults to BULK_BATCH_SIZE)
+
+        Returns:
+            tuple: (created, errors) where created is the list of saved Posts and
+            errors is a list of {'index': <position in items>, 'error': <message>}
+        """
+        batch_size = batch_size or PostFactory.BULK_BATCH_SIZE
+        created, errors = [], []
+        items = enumerate(items)
+
+        while True:
+            window = list(islice(items, batch_size))
+            if not window:
+                break
+            chunk = []
+            for index, item in window:
+                try:
+                    chunk.append(PostFactory._build_from_item(item, author))
+                except KeyError as e:
+                    errors.append({'index': index, 'error': f'Missing required field: {e}'})
+                except (TypeError, ValueError) as e:
+                    errors.append({'index': index, 'error': str(e)})
+            if chunk:
+                with transaction.atomic():
+                    chunk = Post.objects.bulk_create(chunk)
+                    fan_out_posts(chunk)
+                    media_jobs.enqueue(chunk)
+                    notify_posts_created(chunk)
+                created.extend(chunk)
+        return created, errors
+
+    @staticmethod
+    def _build_from_item(item, author):
+        if isinstance(item, ValueError):
+            # Parsers hand malformed entries through as errors so they are reported per item
+            raise item
+        if not isinstance(item, dict):
+            raise ValueError("Each post must be a JSON object")
+        return PostFactory.build_post(
+            post_type=item.get('post_type', 'text'),
+            title=item['title'],
+            content=item.get('content', ''),
+            metadata=item.get('metadata', {}),
+            author=author
+        )
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the cache invalidation receivers)
+        from . import metrics  # noqa: F401  (instruments new database connections)
+        from . import search
+        # Later migrations that rebuild posts_post/posts_comment drop the index triggers
+        post_migrate.connect(search.reinstall_after_migrate, sender=self)
@@ -0,0 +1,275 @@
+"""
+Native async variants of the read-heavy post endpoints.
+
+Under an ASGI server these replace the DRF views for the feed, post detail,
+comment list and like routes (same URLs, same payloads), so a slow client
+holds an event-loop task instead of a worker thread. Reads use the async ORM;
+the transactional like writes and the home timeline merge run through
+sync_to_async. connectly_project/asgi.py turns them on via ASYNC_API_VIEWS.
+"""
+from functools import partial
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import path
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, NotFound, Throttled, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from singletons.logger_singleton import LoggerSingleton
+from .authentication import aauthenticate_credentials
+from .cache import response_cache
+from .models import Comment, Post
+from .pagination import HotKeysetPagination, KeysetPagination
+from .serializers import CommentSerializer, LikeSerializer, PostSerializer, sparse_fieldset
+from .throttling import ConfigRateThrottle
+from .views import FEED_SORTS, CommentPagination, NewsFeedPagination, PostDetailView
+from . import likes, timeline, trending
+
+logger = LoggerSingleton().get_logger()
+# Per-request read lines; sampled via LOG_SAMPLE_RATES
+access_logger = LoggerSingleton().get_logger('access')
+
+
+def render(data, status_code=status.HTTP_200_OK, headers=None):
+    # Same bytes as DRF's JSONRenderer so both code paths are interchangeable for clients
+    return HttpResponse(
+        JSONRenderer().render(data), status=status_code, content_type='application/json', headers=headers
+    )
+
+
+async def authenticate_token(request):
+    """Resolve `Authorization: Token <key>` like CachedTokenAuthentication. Returns (user, error)."""
+    auth = request.headers.get('Authorization', '').split()
+    if not auth or auth[0].lower() != 'token':
+        return None, 'Authentication credentials were not provided.'
+    if len(auth) != 2:
+        return None, 'Invalid token header.'
+    try:
+        user, _ = await aauthenticate_credentials(auth[1])
+    except AuthenticationFailed as e:
+        return None, str(e.detail)
+    return user, None
+
+
+async def cached(namespace, key, build, timeout=None):
+    """Async counterpart of ResponseCache.respond; build() returns (status_code, data)"""
+    if key is None:
+        status_code, data = await build()
+        return render(data, status_code)
+    data = await sync_to_async(response_cache.get)(namespace, key)
+    if data is not None:
+        return render(data)
+    status_code, data = await build()
+    if status_code == status.HTTP_200_OK:
+        await sync_to_async(response_cache.set)(key, data, timeout)
+    return render(data, status_code)
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def paginate_keyset(queryset, request, serializer_class, pagination_class=KeysetPagination):
+    paginator = pagination_class()
+    queryset = queryset.order_by(*paginator.ordering)
+
+    async def afetch(position, limit):
+        page = queryset if position is None else queryset.filter(paginator.position_filter(position))
+        return await alist(page[:limit])
+
+    page = await paginator.apaginate_fetch(afetch, request)
+    return {'next': paginator.get_next_link(), 'results': serializer_class(page, many=True).data}
+
+
+async def paginate_pages(queryset, request, pagination_class, serializer_class):
+    """Page-number pagination with the same payload and links as DRF's PageNumberPagination"""
+    paginator = pagination_class()
+    page_size = paginator.get_page_size(request)
+    count = await queryset.acount()
+    last = max(1, ceil(count / page_size))
+
+    param = paginator.page_query_param
+    number = request.query_params.get(param, 1)
+    if number in paginator.last_page_strings:
+        number = last
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        number = 0
+    if not 1 <= number <= last:
+        # Out of range pages are an empty result, as in the sync views
+        return {'count': count, 'next': None, 'previous': None, 'results': []}
+
+    offset = (number - 1) * page_size
+    items = await alist(queryset[offset:offset + page_size])
+    url = request.build_absolute_uri()
+    previous = None
+    if number > 1:
+        previous = remove_query_param(url, param) if number == 2 else replace_query_param(url, param, number - 1)
+    return {
+        'count': count,
+        'next': replace_query_param(url, param, number + 1) if number < last else None,
+        'previous': previous,
+        'results': serializer_class(items, many=True).data,
+    }
+
+
+class AsyncTokenAPIView(View):
+    """
+    Base class for async views: token authentication, 401s shaped like DRF's,
+    DRF-style throttle_classes and no CSRF (token-authenticated API).
+    """
+    throttle_classes = []
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        user, error = await authenticate_token(request)
+        if user is None:
+            return render({'detail': error}, status.HTTP_401_UNAUTHORIZED, headers={'WWW-Authenticate': 'Token'})
+        request.user = user
+        # query_params, build_absolute_uri() etc. for the shared pagination code
+        self.drf_request = Request(request)
+        self.drf_request.user = user
+        for throttle in [throttle_class() for throttle_class in self.throttle_classes]:
+            # In-memory by default; a shared backend does cache I/O
+            allowed = (throttle.allow_request(self.drf_request, self) if settings.RATE_LIMIT_BACKEND == 'memory'
+                       else await sync_to_async(throttle.allow_request)(self.drf_request, self))
+            if not allowed:
+                exc = Throttled(throttle.wait())
+                return render({'detail': exc.detail}, exc.status_code, headers={'Retry-After': '%d' % exc.wait})
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except NotFound as e:
+            return render({'detail': e.detail}, status.HTTP_404_NOT_FOUND)
+        except ValidationError as e:
+            return render(e.detail, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncNewsFeedView(AsyncTokenAPIView):
+    """Async NewsFeedView: GET /posts/feed/ with the same pagination modes and scopes"""
+
+    async def get(self, request):
+        if request.GET.get('scope') == 'following':
+            fieldset = sparse_fieldset(self.drf_request)
+            posts = PostSerializer.narrow(Post.objects.all(), **fieldset)
+            paginator = KeysetPagination()
+            fetch = sync_to_async(lambda position, limit: timeline.home_timeline(request.user, position, limit, posts))
+            page = await paginator.apaginate_fetch(fetch, self.drf_request)
+            data = PostSerializer(page, many=True, **fieldset).data
+            return render({'next': paginator.get_next_link(), 'results': data})
+
+        key = await sync_to_async(response_cache.feed_key)(request)
+        return await cached('feed', key, self.build, timeout=settings.FEED_CACHE_TIMEOUT)
+
+    async def build(self):
+        sort = self.drf_request.query_params.get('sort', 'new')
+        if sort not in FEED_SORTS:
+            return status.HTTP_400_BAD_REQUEST, {'error': f"sort must be one of: {', '.join(FEED_SORTS)}"}
+        fieldset = sparse_fieldset(self.drf_request)
+        serializer = partial(PostSerializer, **fieldset)
+        if sort == 'hot':
+            return status.HTTP_200_OK, await paginate_keyset(
+                PostSerializer.narrow(trending.hot_posts(), **fieldset), self.drf_request, serializer,
+                HotKeysetPagination,
+            )
+
+        posts = PostSerializer.narrow(Post.objects.all(), **fieldset).order_by('-created_at', '-id')
+        if KeysetPagination.is_requested(self.drf_request):
+            return status.HTTP_200_OK, await paginate_keyset(posts, self.drf_request, serializer)
+        data = await paginate_pages(posts, self.drf_request, NewsFeedPagination, serializer)
+        access_logger.info("Retrieved %s posts for news feed", len(data['results']))
+        return status.HTTP_200_OK, data
+
+
+class AsyncPostDetailView(AsyncTokenAPIView):
+    """Async PostDetailView: GET /posts/{id}/"""
+
+    async def get(self, request, pk):
+        key = await sync_to_async(response_cache.post_key)(pk, 'detail', request)
+        return await cached('detail', key, lambda: self.build(pk))
+
+    async def build(self, pk):
+        try:
+            post = await Post.objects.for_detail().aget(pk=pk)
+        except Post.DoesNotExist:
+            logger.error("Post not found with ID: %s", pk)
+            return status.HTTP_404_NOT_FOUND, {'error': 'Post not found'}
+        access_logger.info("User %s accessed post %s", self.request.user.username, pk)
+        return status.HTTP_200_OK, PostDetailView.serialize(post)
+
+
+class AsyncPostCommentsView(AsyncTokenAPIView):
+    """Async PostCommentsView: GET /posts/{id}/comments/"""
+
+    async def get(self, request, pk):
+        key = await sync_to_async(response_cache.post_key)(pk, 'comments', request)
+        return await cached('comments', key, lambda: self.build(pk))
+
+    async def build(self, pk):
+        if not await Post.objects.filter(pk=pk).aexists():
+            logger.error("Post not found with ID: %s", pk)
+            return status.HTTP_404_NOT_FOUND, {'error': 'Post not found'}
+
+        fieldset = sparse_fieldset(self.drf_request)
+        serializer = partial(CommentSerializer, **fieldset)
+        comments = CommentSerializer.narrow(Comment.objects.filter(post_id=pk), **fieldset)
+        if KeysetPagination.is_requested(self.drf_request):
+            return status.HTTP_200_OK, await paginate_keyset(comments, self.drf_request, serializer)
+        data = await paginate_pages(comments, self.drf_request, CommentPagination, serializer)
+        access_logger.info("Retrieved %s comments for post %s", len(data['results']), pk)
+        return status.HTTP_200_OK, data
+
+
+class AsyncLikePostView(AsyncTokenAPIView):
+    """Async LikePostView: POST/DELETE /posts/{id}/like/"""
+    throttle_classes = [ConfigRateThrottle]
+
+    async def post(self, request, pk):
+        like = await sync_to_async(likes.add_like)(request.user, pk)
+        if like is None:
+            if not await Post.objects.filter(pk=pk).aexists():
+                logger.error("Post not found with ID: %s", pk)
+                return render({'error': 'Post not found'}, status.HTTP_404_NOT_FOUND)
+            logger.warning("User %s attempted to like post %s again", request.user.username, pk)
+            return render({'error': 'You have already liked this post'}, status.HTTP_400_BAD_REQUEST)
+        logger.info("User %s liked post %s", request.user.username, pk)
+        data = await sync_to_async(lambda: LikeSerializer(like).data)()
+        return render({'message': 'Post liked successfully', 'like': data}, status.HTTP_201_CREATED)
+
+    async def delete(self, request, pk):
+        if await sync_to_async(likes.remove_like)(request.user, pk):
+            logger.info("User %s unliked post %s", request.user.username, pk)
+            return render({'message': 'Post unliked successfully'})
+        if not await Post.objects.filter(pk=pk).aexists():
+            logger.error("Post not found with ID: %s", pk)
+            return render({'error': 'Post not found'}, status.HTTP_404_NOT_FOUND)
+        logger.warning("User %s tried to unlike post %s but hasn't liked it", request.user.username, pk)
+        return render({'error': 'You have not liked this post'}, status.HTTP_400_BAD_REQUEST)
+
+
+# URL names in posts/urls.py served by an async view when ASYNC_API_VIEWS is on
+ASYNC_VIEWS = {
+    'news-feed': AsyncNewsFeedView,
+    'post-detail': AsyncPostDetailView,
+    'post-comments-list': AsyncPostCommentsView,
+    'post-like': AsyncLikePostView,
+}
+
+
+def async_urlpatterns(urlpatterns):
+    """Copy of `urlpatterns` with the ASYNC_VIEWS routes pointing at their async views"""
+    return [
+        path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name)
+        if getattr(pattern, 'name', None) in ASYNC_VIEWS else pattern
+        for pattern in urlpatterns
+    ]
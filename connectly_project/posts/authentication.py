@@ -0,0 +1,79 @@
+"""
+Token authentication with a cache in front of the Token/User lookup.
+
+DRF's TokenAuthentication joins Token and User on every request. Here the
+resolved (user, token) pair is kept in the `auth` cache alias (a bounded LRU
+with a TTL), so authenticated requests normally skip that query. Entries are
+dropped when the token is deleted or the user is saved (e.g. deactivated) via
+the receivers in posts/signals.py; changes made with QuerySet.update() are only
+picked up when the TTL expires.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class TokenCache:
+    def __init__(self, alias='auth'):
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(token_key):
+        # Never use the raw credential as a cache key (file/shared backends may persist it)
+        return 'authtoken:' + hashlib.sha256(token_key.encode('utf-8')).hexdigest()
+
+    def get(self, token_key):
+        return self.backend.get(self.key(token_key))
+
+    async def aget(self, token_key):
+        return await self.backend.aget(self.key(token_key))
+
+    def set(self, token_key, user, token):
+        self.backend.set(self.key(token_key), (user, token), settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+    async def aset(self, token_key, user, token):
+        await self.backend.aset(self.key(token_key), (user, token), settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+    def invalidate(self, *token_keys):
+        self.backend.delete_many([self.key(token_key) for token_key in token_keys])
+
+    def invalidate_user(self, user_id):
+        self.invalidate(*Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that serves repeat lookups from token_cache"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+async def aauthenticate_credentials(key):
+    """Async counterpart of CachedTokenAuthentication.authenticate_credentials for the async views"""
+    cached = await token_cache.aget(key)
+    if cached is not None:
+        return cached
+    try:
+        token = await Token.objects.select_related('user').aget(key=key)
+    except Token.DoesNotExist:
+        raise AuthenticationFailed('Invalid token.')
+    if not token.user.is_active:
+        raise AuthenticationFailed('User inactive or deleted.')
+    await token_cache.aset(key, token.user, token)
+    return token.user, token
@@ -0,0 +1,304 @@
+"""
+Shared plumbing for the benchmark management commands: a throwaway database,
+deterministic seeding through PostFactory and latency statistics.
+"""
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+
+from factories.post_factory import PostFactory
+from singletons.config_manager import ConfigManager
+from .models import Comment, Like, User
+from . import media_jobs, timeline, trending
+
+# Requests go through the test client; keep redirects/host checks out of the measurements
+BENCH_SETTINGS = {
+    'ALLOWED_HOSTS': ['*'],
+    'SECURE_SSL_REDIRECT': False,
+    'DEBUG': False,
+    # Media jobs are drained by seed(), not by a thread in the middle of a measurement
+    'MEDIA_JOBS_IN_PROCESS': False,
+}
+
+BENCH_PASSWORD = 'bench_pass123'
+
+# Vocabulary for generated titles/comments
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+    'incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud'
+).split()
+
+
+@contextmanager
+def without_rate_limits():
+    """Turn the write throttle off: a few bench users send far more than RATE_LIMIT requests"""
+    with ConfigManager().override(RATE_LIMIT=None, RATE_LIMIT_ENDPOINTS={}):
+        yield
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Run the body against a freshly migrated test database that is dropped afterwards"""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        with override_settings(**BENCH_SETTINGS), without_rate_limits():
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def seed(users=20, posts_per_user=25, comments_per_post=3, likes_per_post=5, follows_per_user=5, seed=42,
+         media_posts=10):
+    """
+    Populate the database with a deterministic dataset: the same arguments always
+    produce the same rows (and primary keys, on a fresh database).
+
+    Returns a dict with the users, their API tokens, the post ids, the ids of
+    processed image posts and a staff user (password BENCH_PASSWORD) with its token.
+    """
+    rng = random.Random(seed)
+    members = [User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com') for i in range(users)]
+    for member in members:
+        member.set_unusable_password()
+    User.objects.bulk_create(members)
+    members = list(User.objects.filter(username__startswith='bench_user_').order_by('pk'))
+    tokens = Token.objects.bulk_create([Token(user=member, key=Token.generate_key()) for member in members])
+    admin = User.objects.create_user(username='bench_admin', password=BENCH_PASSWORD, is_staff=True)
+    admin_token = Token.objects.create(user=admin)
+
+    for member in members:
+        for followee in rng.sample(members, min(follows_per_user, users)):
+            if followee.pk != member.pk:
+                timeline.follow(member, followee)
+
+    post_ids = []
+    for member in members:
+        items = [
+            {'title': f'Post {n} by {member.username}', 'content': ' '.join(rng.choices(WORDS, k=30))}
+            for n in range(posts_per_user)
+        ]
+        created, _ = PostFactory.create_posts(items, author=member)
+        post_ids.extend(post.pk for post in created)
+
+    Comment.objects.bulk_create([
+        Comment(text=' '.join(rng.choices(WORDS, k=12)), author=rng.choice(members), post_id=post_id)
+        for post_id in post_ids for _ in range(comments_per_post)
+    ])
+    Like.objects.bulk_create([
+        Like(user=member, post_id=post_id)
+        for post_id in post_ids for member in rng.sample(members, min(likes_per_post, users))
+    ])
+    images = [
+        {'post_type': 'image', 'title': f'Image {n}', 'metadata': {'file_size': f'{n + 1} MB', 'resolution': '1920x1080'}}
+        for n in range(media_posts)
+    ]
+    media, _ = PostFactory.create_posts(images, author=admin)
+    while media_jobs.run_once():
+        pass
+
+    # Bulk inserts bypass the denormalized counters
+    call_command('reconcile_counters', stdout=StringIO())
+    trending.refresh()
+
+    return {
+        'users': members,
+        'tokens': [token.key for token in tokens],
+        'post_ids': post_ids,
+        'media_post_ids': [post.pk for post in media],
+        'admin': admin,
+        'admin_token': admin_token.key,
+    }
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (milliseconds) for one measured run"""
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class Stopwatch:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
+
+
+# -- API suite ----------------------------------------------------------------
+#
+# One scenario per (route, method) of posts/urls.py. build(dataset, i) returns the
+# path and JSON body of the i-th request; scenarios act as the staff user unless
+# marked MEMBER, in which case they rotate through the seeded users.
+
+ADMIN, MEMBER = 'admin', 'member'
+BULK_ITEMS = 50
+
+
+def _post_id(dataset, i):
+    # A prime stride spreads consecutive requests over the whole table without repeats
+    post_ids = dataset['post_ids']
+    return post_ids[(i * 7919) % len(post_ids)]
+
+
+def _member_id(dataset, i):
+    return dataset['users'][i % len(dataset['users'])].pk
+
+
+def _post_body(i):
+    return {'title': f'Bench post {i}', 'content': ' '.join(WORDS[:20]), 'post_type': 'text', 'metadata': {}}
+
+
+SCENARIOS = [
+    # (label, url name, method, actor, build)
+    ('users.list', 'user-list-create', 'get', ADMIN, lambda d, i: ('/posts/users/', None)),
+    ('users.create', 'user-list-create', 'post', ADMIN,
+     lambda d, i: ('/posts/users/', {'username': f'bench_new_{i}', 'password': BENCH_PASSWORD})),
+    ('users.me', 'user-profile', 'get', MEMBER, lambda d, i: ('/posts/users/me/', None)),
+    ('users.follow', 'user-follow', 'post', ADMIN, lambda d, i: (f'/posts/users/{_member_id(d, i)}/follow/', None)),
+    ('users.unfollow', 'user-follow', 'delete', ADMIN, lambda d, i: (f'/posts/users/{_member_id(d, i)}/follow/', None)),
+    ('feed.page', 'news-feed', 'get', MEMBER, lambda d, i: (f'/posts/feed/?page={i % 5 + 1}', None)),
+    ('feed.cursor', 'news-feed', 'get', MEMBER, lambda d, i: ('/posts/feed/?pagination=cursor', None)),
+    ('feed.following', 'news-feed', 'get', MEMBER, lambda d, i: ('/posts/feed/?scope=following', None)),
+    ('feed.hot', 'news-feed', 'get', MEMBER, lambda d, i: ('/posts/feed/?sort=hot', None)),
+    ('posts.list', 'post-list-create', 'get', ADMIN, lambda d, i: ('/posts/', None)),
+    ('posts.create', 'post-list-create', 'post', ADMIN,
+     lambda d, i: ('/posts/', {**_post_body(i), 'author': d['admin'].pk})),
+    ('posts.create_factory', 'post-create-factory', 'post', ADMIN, lambda d, i: ('/posts/create/', _post_body(i))),
+    ('posts.bulk', 'post-bulk-create', 'post', ADMIN,
+     lambda d, i: ('/posts/bulk/', [_post_body(i * BULK_ITEMS + n) for n in range(BULK_ITEMS)])),
+    ('posts.detail', 'post-detail', 'get', MEMBER, lambda d, i: (f'/posts/{_post_id(d, i)}/', None)),
+    ('posts.like', 'post-like', 'post', ADMIN, lambda d, i: (f'/posts/{_post_id(d, i)}/like/', None)),
+    ('posts.unlike', 'post-like', 'delete', ADMIN, lambda d, i: (f'/posts/{_post_id(d, i)}/like/', None)),
+    ('posts.like_batch', 'post-like-batch', 'post', MEMBER,
+     lambda d, i: ('/posts/like/', {'post_ids': [_post_id(d, i * BULK_ITEMS + n) for n in range(BULK_ITEMS)]})),
+    ('posts.comment', 'post-comment', 'post', MEMBER,
+     lambda d, i: (f'/posts/{_post_id(d, i)}/comment/', {'text': f'Bench comment {i}'})),
+    ('posts.comments', 'post-comments-list', 'get', MEMBER, lambda d, i: (f'/posts/{_post_id(d, i)}/comments/', None)),
+    ('posts.media', 'post-media', 'get', MEMBER,
+     lambda d, i: (f'/posts/{d["media_post_ids"][i % len(d["media_post_ids"])]}/media/', None)),
+    ('search.posts', 'post-search', 'get', MEMBER, lambda d, i: (f'/posts/search/?q={WORDS[i % len(WORDS)]}', None)),
+    ('search.prefix', 'post-search', 'get', MEMBER,
+     lambda d, i: (f'/posts/search/?q={WORDS[i % len(WORDS)][:3]}*&type=comments', None)),
+    ('comments.list', 'comment-list-create', 'get', ADMIN, lambda d, i: ('/posts/comments/', None)),
+    ('comments.create', 'comment-list-create', 'post', MEMBER,
+     lambda d, i: ('/posts/comments/', {'post': _post_id(d, i), 'text': f'Bench comment {i}'})),
+    ('auth.login', 'authenticate-user', 'post', ADMIN,
+     lambda d, i: ('/posts/authenticate/', {'username': 'bench_admin', 'password': BENCH_PASSWORD})),
+    ('cache.stats', 'cache-stats', 'get', ADMIN, lambda d, i: ('/posts/cache/stats/', None)),
+    ('metrics.endpoints', 'request-metrics', 'get', ADMIN, lambda d, i: ('/posts/metrics/', None)),
+    ('export.posts', 'export', 'get', ADMIN, lambda d, i: ('/posts/export/posts/', None)),
+]
+
+
+def uncovered_routes():
+    """Names of posts/urls.py routes that no scenario exercises"""
+    from . import urls
+    covered = {route for _, route, _, _, _ in SCENARIOS}
+    return sorted(pattern.name for pattern in urls.urlpatterns if pattern.name not in covered)
+
+
+def run_suite(dataset, iterations=30, warmup=3, only=None):
+    """
+    Run every scenario (or the labels in `only`) sequentially through the test client.
+    Latency covers the whole response, including streamed bodies.
+    """
+    client = Client(raise_request_exception=False)
+    results = {}
+    for label, route, method, actor, build in SCENARIOS:
+        if only and label not in only:
+            continue
+        latencies, queries, statuses = [], [], Counter()
+        for i in range(warmup + iterations):
+            path, body = build(dataset, i)
+            token = dataset['admin_token'] if actor == ADMIN else dataset['tokens'][i % len(dataset['tokens'])]
+            kwargs = {'headers': {'Authorization': f'Token {token}'}}
+            if body is not None:
+                kwargs.update(data=body, content_type='application/json')
+
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            latencies.append(elapsed)
+            queries.append(len(captured))
+            statuses[response.status_code] += 1
+
+        # 401/403 mean the scenario itself is broken, not that the route is slow
+        errors = sum(count for code, count in statuses.items() if code >= 500 or code in (401, 403))
+        results[label] = {
+            'route': route,
+            'method': method.upper(),
+            **summarize(latencies, sum(latencies), errors),
+            'queries_per_request': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        }
+    return results
+
+
+def compare(current, baseline, tolerance=0.2, min_delta_ms=1.0):
+    """
+    Diff two bench_api reports scenario by scenario. A scenario regresses when its
+    p95 latency grew by more than `tolerance` (and at least min_delta_ms) or it
+    issues more queries per request than in the baseline.
+    """
+    rows, regressions = [], []
+    for label, now in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(label)
+        if before is None:
+            rows.append({'scenario': label, 'new': True})
+            continue
+
+        row = {'scenario': label}
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            row[metric] = _delta(before[metric], now[metric])
+        row['queries_per_request'] = _delta(before['queries_per_request']['mean'], now['queries_per_request']['mean'])
+
+        problems = []
+        if (now['p95_ms'] > before['p95_ms'] * (1 + tolerance)
+                and now['p95_ms'] - before['p95_ms'] >= min_delta_ms):
+            problems.append('p95_ms')
+        if now['queries_per_request']['mean'] > before['queries_per_request']['mean']:
+            problems.append('queries_per_request')
+        row['regressions'] = problems
+        rows.append(row)
+        if problems:
+            regressions.append(label)
+    return {'tolerance': tolerance, 'scenarios': rows, 'regressions': regressions}
+
+
+def _delta(before, now):
+    change = round((now - before) / before, 4) if before else None
+    return {'baseline': before, 'current': now, 'change': change}
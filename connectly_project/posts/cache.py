@@ -0,0 +1,150 @@
+"""
+Versioned response cache for the read-heavy post endpoints.
+
+Entries live in the `responses` alias of settings.CACHES (a bounded in-process
+LRU by default). Keys embed a per-post version or the feed generation, so
+invalidation is a single counter bump: stale entries simply stop being
+addressed and age out of the LRU. Versions share the LRU with the entries;
+one that is evicted restarts from the current time in nanoseconds, never from
+a number it had before, so the entries it addressed are not served again.
+
+With read replicas, requests pinned to the primary (read-your-writes) bypass
+the cache, and for REPLICA_PIN_SECONDS after a bump nothing is cached under
+the new version: a replica that hasn't caught up yet would store the old
+payload there.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from singletons.config_manager import ConfigManager
+from . import routers
+
+FEED_GENERATION_KEY = 'feed:gen'
+
+
+class ResponseCache:
+    def __init__(self, alias='responses'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    # -- keys -------------------------------------------------------------
+
+    @staticmethod
+    def _request_fingerprint(request):
+        # Paginated payloads embed absolute next/previous links, so the host matters too.
+        # Pages without ?page_size= follow DEFAULT_PAGE_SIZE, which can change at runtime.
+        uri = f"{request.build_absolute_uri()} {ConfigManager().get_setting('DEFAULT_PAGE_SIZE')}"
+        return hashlib.md5(uri.encode('utf-8')).hexdigest()
+
+    def _version(self, version_key):
+        version = self.backend.get(version_key)
+        if version is None:
+            # Never seen, or evicted along with the entries. Restarting at a fixed number would
+            # address entries cached under it before, so start from a value never used yet.
+            self.backend.add(version_key, time.time_ns(), timeout=None)
+            version = self.backend.get(version_key, 0)
+        return version
+
+    def _bump(self, version_key):
+        try:
+            self.backend.incr(version_key)
+        except ValueError:
+            # Missing: any fresh seed is a new generation
+            if not self.backend.add(version_key, time.time_ns(), timeout=None):
+                self.backend.incr(version_key)
+        if settings.REPLICA_DATABASES:
+            self.backend.set(f'{version_key}:recent', True, settings.REPLICA_PIN_SECONDS)
+
+    def _cacheable(self, version_key):
+        # Replica reads may lag behind the bump; pinned requests must see the primary
+        if not settings.REPLICA_DATABASES:
+            return True
+        return not routers.is_pinned() and self.backend.get(f'{version_key}:recent') is None
+
+    def post_key(self, post_id, namespace, request):
+        """Cache key of a post's page, or None when this request must not use the cache"""
+        version_key = f'post:{post_id}:v'
+        if not self._cacheable(version_key):
+            return None
+        version = self._version(version_key)
+        return f'resp:{namespace}:{post_id}:v{version}:{self._request_fingerprint(request)}'
+
+    def feed_key(self, request):
+        """Cache key of a feed page, or None when this request must not use the cache"""
+        if not self._cacheable(FEED_GENERATION_KEY):
+            return None
+        generation = self._version(FEED_GENERATION_KEY)
+        return f'resp:feed:g{generation}:{self._request_fingerprint(request)}'
+
+    # -- reads / writes ---------------------------------------------------
+
+    def get(self, namespace, key):
+        data = self.backend.get(key)
+        self._record(namespace, hit=data is not None)
+        return data
+
+    def set(self, key, data, timeout=None):
+        if timeout is None:
+            timeout = settings.RESPONSE_CACHE_TIMEOUT
+        self.backend.set(key, data, timeout)
+
+    def respond(self, namespace, key, build, timeout=None):
+        """Serve a cached payload for `key`, or call build() and cache its data if it succeeded (no key: just build)"""
+        if key is None:
+            return build()
+        data = self.get(namespace, key)
+        if data is not None:
+            return Response(data)
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            self.set(key, response.data, timeout)
+        return response
+
+    def invalidate_post(self, post_id):
+        """Drop the cached detail and comment pages of one post"""
+        self._bump(f'post:{post_id}:v')
+
+    def invalidate_feed(self):
+        """Drop every cached page of the global news feed"""
+        self._bump(FEED_GENERATION_KEY)
+
+    # -- stats ------------------------------------------------------------
+
+    def _record(self, namespace, hit):
+        with self._lock:
+            counters = self._stats.setdefault(namespace, [0, 0])
+            counters[0 if hit else 1] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = {name: tuple(counters) for name, counters in self._stats.items()}
+
+        def summarize(hits, misses):
+            total = hits + misses
+            return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+
+        hits = sum(h for h, _ in snapshot.values())
+        misses = sum(m for _, m in snapshot.values())
+        return {
+            'backend': settings.CACHES[self.alias]['BACKEND'],
+            **summarize(hits, misses),
+            'endpoints': {name: summarize(h, m) for name, (h, m) in sorted(snapshot.items())},
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,93 @@
+"""
+Streaming exports of posts, comments and likes.
+
+Rows are read with QuerySet.iterator(chunk_size=...) and encoded one at a
+time, so memory use stays flat and the first bytes go out before the whole
+table has been read. Used by ExportView and the export_data command.
+"""
+import csv
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Post, Comment, Like
+
+EXPORTS = {
+    'posts': (Post, ['id', 'title', 'content', 'post_type', 'metadata', 'author_id',
+                     'created_at', 'like_count', 'comment_count']),
+    'comments': (Comment, ['id', 'text', 'author_id', 'post_id', 'created_at']),
+    'likes': (Like, ['id', 'user_id', 'post_id', 'created_at']),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def parse_bound(value, end_of_day=False):
+    """Parse an ISO date or datetime query bound; raises ValueError if it is neither"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_rows(kind, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one dict per row of `kind`, oldest first, optionally bounded by created_at"""
+    model, fields = EXPORTS[kind]
+    queryset = model.objects.order_by('created_at', 'id')
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lte=until)
+    for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield dict(zip(fields, values))
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([
+            json.dumps(row[field], cls=DjangoJSONEncoder) if isinstance(row[field], (dict, list)) else row[field]
+            for field in fields
+        ])
+
+
+def json_array(items):
+    """Stream an iterable of JSON-serializable items as a single JSON array"""
+    yield '['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(item, cls=DjangoJSONEncoder)
+    yield ']'
+
+
+def export_stream(kind, output='ndjson', since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encoded export of `kind` as an iterator of text chunks"""
+    rows = export_rows(kind, since, until, chunk_size)
+    if output == 'csv':
+        return csv_lines(EXPORTS[kind][1], rows)
+    return ndjson_lines(rows)
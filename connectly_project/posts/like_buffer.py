@@ -0,0 +1,226 @@
+"""
+Write-behind buffer for likes (LIKE_WRITE_BEHIND).
+
+Like and unlike requests only touch memory: the buffer keeps, per post, the
+set of users who like it (loaded from the database the first time the post is
+touched), the pending like/unlike of each (user, post) pair and the net change
+to like_count. A background thread writes the pending changes every
+LIKE_FLUSH_INTERVAL seconds in one transaction, so a viral post costs one
+write batch per interval instead of one transaction per like.
+
+Reads of like_count add pending_delta() so clients see their own likes at once.
+Member sets stay loaded across flushes in an LRU of LIKE_MEMBER_CACHE_SIZE
+posts, so a hot post is read from the database once, not once per flush.
+
+Durability window: changes are only in this process's memory until the next
+flush, so a crash (not a normal exit, which flushes) loses at most the last
+LIKE_FLUSH_INTERVAL seconds of likes. The membership sets are per process;
+with several workers a user can like the same post through two of them, but
+the flush inserts with ON CONFLICT DO NOTHING and recounts like_count from the
+Like table, so the stored data stays consistent. A worker's sets don't see
+likes made through other workers until they drop out of its LRU, so there a
+repeated like or unlike may be refused or accepted by mistake; the stored
+rows and counts are right either way.
+"""
+import atexit
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from singletons.logger_singleton import LoggerSingleton
+from .models import Like, Post
+
+logger = LoggerSingleton().get_logger()
+
+
+class LikeBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._members = OrderedDict()  # post_id -> set of user ids liking it (database + pending), LRU order
+        self._pending = {}   # (user_id, post_id) -> True to like, False to unlike
+        self._deltas = {}    # post_id -> like_count change not yet committed
+        self._loading = Counter()  # post_id -> member set loads in progress
+        self._generations = {}     # post_id -> member sets dropped while a load was in progress
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        # A normal exit writes whatever is still pending
+        atexit.register(self.stop)
+
+    def _membership(self, post_id):
+        """The post's member set, loading it if needed; None if the post doesn't exist"""
+        while True:
+            with self._lock:
+                members = self._members.get(post_id)
+                if members is not None:
+                    self._members.move_to_end(post_id)
+                    return members
+                generation = self._generations.get(post_id, 0)
+                self._loading[post_id] += 1
+            try:
+                # From the primary: a lagging replica would give a wrong member set
+                using = router.db_for_write(Like)
+                if not Post.objects.using(using).filter(pk=post_id).exists():
+                    return None
+                loaded = set(Like.objects.using(using).filter(post_id=post_id).values_list('user_id', flat=True))
+                with self._lock:
+                    # Only if this post's set wasn't dropped meanwhile: it may hold likes flushed after the read
+                    if self._generations.get(post_id, 0) == generation:
+                        members = self._members.setdefault(post_id, loaded)
+                        self._evict()
+                        return members
+            finally:
+                with self._lock:
+                    self._loading[post_id] -= 1
+                    if not self._loading[post_id]:
+                        del self._loading[post_id]
+                        self._generations.pop(post_id, None)
+
+    def _drop(self, post_id):
+        # Callers hold _lock
+        if self._members.pop(post_id, None) is not None and post_id in self._loading:
+            self._generations[post_id] = self._generations.get(post_id, 0) + 1
+
+    def _evict(self):
+        """Drop the least recently used member sets beyond LIKE_MEMBER_CACHE_SIZE; callers hold _lock"""
+        excess = len(self._members) - settings.LIKE_MEMBER_CACHE_SIZE
+        if excess <= 0:
+            return
+        # Sets of posts with pending changes carry unwritten state and stay
+        busy = {post_id for _, post_id in self._pending}
+        for post_id in [post_id for post_id in self._members if post_id not in busy][:excess]:
+            self._drop(post_id)
+
+    def forget(self, post_id):
+        """Drop a post's member set and pending changes (the post was deleted)"""
+        with self._lock:
+            self._drop(post_id)
+            self._pending = {key: like for key, like in self._pending.items() if key[1] != post_id}
+            self._deltas.pop(post_id, None)
+
+    def _record(self, user_id, post_id, like):
+        members = self._membership(post_id)
+        if members is None:
+            return None
+        with self._lock:
+            # Re-read under the lock: the set may have been replaced by a reload
+            members = self._members.setdefault(post_id, members)
+            if (user_id in members) == like:
+                return False
+            if like:
+                members.add(user_id)
+            else:
+                members.discard(user_id)
+            self._pending[(user_id, post_id)] = like
+            self._deltas[post_id] = self._deltas.get(post_id, 0) + (1 if like else -1)
+        self._ensure_flusher()
+        return True
+
+    def add(self, user_id, post_id):
+        """Like in memory. True if recorded, False if already liked, None if the post doesn't exist."""
+        return self._record(user_id, post_id, True)
+
+    def remove(self, user_id, post_id):
+        """Unlike in memory. True if recorded, False if not liked, None if the post doesn't exist."""
+        return self._record(user_id, post_id, False)
+
+    def pending_delta(self, post_id):
+        """Change to post_id's stored like_count that hasn't been committed yet"""
+        return self._deltas.get(post_id, 0)
+
+    def flush(self):
+        """Write all pending changes in one transaction; returns the number of (user, post) changes"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                deltas = {}
+                for (_, post_id), like in pending.items():
+                    deltas[post_id] = deltas.get(post_id, 0) + (1 if like else -1)
+            if pending:
+                try:
+                    self._write(pending)
+                except Exception:
+                    logger.exception("Failed to flush %s buffered likes; will retry", len(pending))
+                    with self._lock:
+                        # Newer requests for the same pair win over the failed ones
+                        self._pending = {**pending, **self._pending}
+                    return 0
+            with self._lock:
+                for post_id, delta in deltas.items():
+                    remaining = self._deltas.get(post_id, 0) - delta
+                    if remaining:
+                        self._deltas[post_id] = remaining
+                    else:
+                        self._deltas.pop(post_id, None)
+                # Sets kept over the limit while their posts had pending changes
+                self._evict()
+            return len(pending)
+
+    @staticmethod
+    def _write(pending):
+        using = router.db_for_write(Like)
+        created_at = timezone.now()
+        liked = [Like(user_id=user_id, post_id=post_id, created_at=created_at)
+                 for (user_id, post_id), like in pending.items() if like]
+        unliked = Q()
+        for (user_id, post_id), like in pending.items():
+            if not like:
+                unliked |= Q(user_id=user_id, post_id=post_id)
+        post_ids = {post_id for _, post_id in pending}
+
+        with transaction.atomic(using=using):
+            # Posts deleted (perhaps by another worker) since their likes were buffered
+            existing = set(Post.objects.using(using).filter(pk__in=post_ids).values_list('pk', flat=True))
+            liked = [like for like in liked if like.post_id in existing]
+            if liked:
+                # Rows another worker already inserted are skipped (ON CONFLICT DO NOTHING)
+                Like.objects.using(using).bulk_create(liked, ignore_conflicts=True)
+            if unliked:
+                Like.objects.using(using).filter(unliked).delete()
+            # Recount instead of adding deltas so concurrent writers can't make it drift
+            count = Like.objects.filter(post=OuterRef('pk')).values('post').annotate(n=Count('*')).values('n')
+            Post.objects.using(using).filter(pk__in=post_ids).update(
+                like_count=Coalesce(Subquery(count), Value(0))
+            )
+
+    def _ensure_flusher(self):
+        if self._thread is not None or not settings.LIKE_FLUSH_INTERVAL:
+            # LIKE_FLUSH_INTERVAL = 0: no background thread, call flush() yourself
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='like-buffer-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._wakeup.wait(settings.LIKE_FLUSH_INTERVAL):
+                self.flush()
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        """Stop the flusher thread and write whatever is still pending"""
+        thread = self._thread
+        if thread is not None:
+            self._wakeup.set()
+            thread.join()
+            self._thread = None
+            self._wakeup.clear()
+        self.flush()
+
+    def reset(self):
+        """Drop all buffered state without writing it (tests)"""
+        with self._lock:
+            self._members.clear()
+            self._pending.clear()
+            self._deltas.clear()
+            self._generations.clear()
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,111 @@
+"""
+Like/unlike write path shared by the sync (DRF) and async views.
+
+Each operation is a single conditional statement on the Like table: an
+INSERT ... SELECT ... ON CONFLICT DO NOTHING for likes (the SELECT skips
+missing posts, the conflict clause skips existing likes) and a DELETE ... WHERE
+for unlikes. Whatever rows that statement actually changed decide the
+Post.like_count adjustment, so concurrent requests for the same (user, post)
+never double count and never raise. The counter update runs in the same
+transaction and the change is announced once it commits.
+
+With LIKE_WRITE_BEHIND on, the same functions record the change in
+posts.like_buffer instead and it reaches the database on the next flush.
+"""
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .like_buffer import like_buffer
+from .models import Like, Post
+from .signals import notify_interaction
+
+# Most post ids accepted by one add_likes() call
+BATCH_LIMIT = 100
+
+
+def _insert_likes(using, user_id, post_ids, created_at):
+    """Insert the missing likes in one statement; returns {post_id: like_id} for the new rows"""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    fields = {name: Like._meta.get_field(name) for name in ('id', 'user', 'post', 'created_at')}
+    post_pk = Post._meta.pk
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    sql = (
+        f"INSERT INTO {qn(Like._meta.db_table)} "
+        f"({qn(fields['user'].column)}, {qn(fields['post'].column)}, {qn(fields['created_at'].column)}) "
+        f"SELECT %s, {qn(post_pk.column)}, %s FROM {qn(Post._meta.db_table)} "
+        f"WHERE {qn(post_pk.column)} IN ({placeholders}) "
+        f"ON CONFLICT DO NOTHING "
+        f"RETURNING {qn(fields['post'].column)}, {qn(fields['id'].column)}"
+    )
+    params = [user_id, fields['created_at'].get_db_prep_save(created_at, connection), *post_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {post_id: like_id for post_id, like_id in cursor.fetchall()}
+
+
+def add_likes(user, post_ids):
+    """
+    Like every post in `post_ids` the user doesn't like yet. Missing posts and
+    existing likes are skipped. Returns {post_id: Like} for the likes created.
+    """
+    post_ids = sorted(set(post_ids))
+    if not post_ids:
+        return {}
+    if len(post_ids) > BATCH_LIMIT:
+        raise ValueError(f"At most {BATCH_LIMIT} posts can be liked at once")
+
+    created_at = timezone.now()
+    if settings.LIKE_WRITE_BEHIND:
+        return _buffer_likes(user, post_ids, created_at)
+
+    using = router.db_for_write(Like)
+    with transaction.atomic(using=using):
+        inserted = _insert_likes(using, user.pk, post_ids, created_at)
+        if inserted:
+            Post.objects.using(using).filter(pk__in=inserted).adjust_counters(likes=1)
+            for post_id in inserted:
+                notify_interaction(post_id, 'like')
+    return {
+        post_id: Like(pk=like_id, user=user, post_id=post_id, created_at=created_at)
+        for post_id, like_id in inserted.items()
+    }
+
+
+def _buffer_likes(user, post_ids, created_at):
+    created = {}
+    for post_id in post_ids:
+        if like_buffer.add(user.pk, post_id):
+            notify_interaction(post_id, 'like')
+            # Not stored yet, so no primary key
+            created[post_id] = Like(user=user, post_id=post_id, created_at=created_at)
+    return created
+
+
+def add_like(user, post_id):
+    """Like one post. Returns the new Like, or None if it already existed or the post doesn't."""
+    return add_likes(user, [post_id]).get(post_id)
+
+
+def remove_like(user, post_id):
+    """Delete the like with one DELETE ... WHERE. Returns False if there was nothing to delete."""
+    if settings.LIKE_WRITE_BEHIND:
+        if not like_buffer.remove(user.pk, post_id):
+            return False
+        notify_interaction(post_id, 'unlike')
+        return True
+
+    using = router.db_for_write(Like)
+    with transaction.atomic(using=using):
+        deleted, _ = Like.objects.using(using).filter(user=user, post_id=post_id).delete()
+        if not deleted:
+            return False
+        Post.objects.using(using).filter(pk=post_id).adjust_counters(likes=-1)
+        notify_interaction(post_id, 'unlike')
+    return True
+
+
+def like_count(post):
+    """Post.like_count including changes still waiting in the write-behind buffer"""
+    return post.like_count + like_buffer.pending_delta(post.pk)
@@ -0,0 +1,97 @@
+"""
+Password login pipeline behind POST /posts/authenticate/.
+
+Password hashes are slow on purpose, so a burst of logins (say, every client
+reconnecting after an outage) can take every core and starve other requests.
+Here:
+
+- Credentials go through django.contrib.auth.authenticate(), so every entry of
+  AUTHENTICATION_BACKENDS is tried and failures send user_login_failed. Django's
+  check_password also replaces a hash made with anything but the first entry of
+  PASSWORD_HASHERS (Argon2) or with outdated parameters, so PBKDF2 users move
+  to Argon2 the next time they log in.
+- At most LOGIN_HASH_SLOTS logins (default: one per core) hash at once, each on
+  its own request thread; Argon2 and PBKDF2 release the GIL while hashing. A
+  login arriving when every slot is taken isn't queued: authenticate() raises
+  LoginBusy and the view answers 503.
+- Failed credentials are remembered for LOGIN_NEGATIVE_CACHE_SECONDS (as an
+  HMAC of username, password and stored hash, in the `login_failures` cache),
+  so a client retrying the same wrong password costs a cache lookup, not a
+  hash. Changing the password changes the stored hash, which invalidates the
+  entry. Failures answered from the cache send user_login_failed too.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import get_user_model, user_login_failed
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+
+CACHE_ALIAS = 'login_failures'
+# What django.contrib.auth.authenticate() sends in place of the password
+CLEANSED_PASSWORD = '********************'
+
+
+class LoginBusy(Exception):
+    """Too many logins in flight; retry later"""
+
+
+class HashingSlots:
+    """Bounds the logins hashing at once, refusing (not queueing) the ones past the bound"""
+
+    def __init__(self, size=None):
+        self._size = size
+        self._slots = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self):
+        """A slot for the duration of the block; raises LoginBusy when none is free"""
+        with self._lock:
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(self._size or settings.LOGIN_HASH_SLOTS)
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise LoginBusy()
+        try:
+            yield
+        finally:
+            slots.release()
+
+
+hashing_slots = HashingSlots()
+
+
+def _failure_key(username, password, encoded):
+    digest = salted_hmac('posts.login.failure', f'{username}\0{password}\0{encoded}', algorithm='sha256')
+    return f'login_failed:{digest.hexdigest()}'
+
+
+def authenticate(username, password, request=None):
+    """
+    The active user with these credentials, or None (after sending
+    user_login_failed). Raises LoginBusy when every hashing slot is taken.
+    """
+    User = get_user_model()
+    # The local hash, if any, keys the negative cache
+    try:
+        encoded = User._default_manager.get_by_natural_key(username).password
+    except User.DoesNotExist:
+        encoded = ''
+
+    cache = caches[CACHE_ALIAS]
+    key = _failure_key(username, password, encoded)
+    if cache.get(key):
+        user_login_failed.send(
+            sender=auth.__name__, credentials={'username': username, 'password': CLEANSED_PASSWORD}, request=request
+        )
+        return None
+
+    with hashing_slots.hold():
+        # Unknown usernames are hashed too (ModelBackend), so they take as long as a wrong password
+        user = auth.authenticate(request, username=username, password=password)
+    if user is None:
+        cache.set(key, True, settings.LOGIN_NEGATIVE_CACHE_SECONDS)
+    return user
@@ -0,0 +1,62 @@
+"""
+Maintenance tasks run by the scheduler (posts/scheduler.py).
+
+Each task takes no arguments and returns a JSON-serializable summary that is
+stored in the run log. Scheduled tasks work in batches of SCHEDULER_BATCH_SIZE
+rows (one transaction per batch, so they never hold locks for long);
+rebuild_search_index doesn't and is only run on demand.
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+
+from .cache import response_cache
+from .models import TaskRun
+from . import media_jobs, trending
+
+
+def reconcile_counters():
+    """Recompute drifted like/comment counters"""
+    out = StringIO()
+    call_command('reconcile_counters', batch_size=settings.SCHEDULER_BATCH_SIZE, stdout=out)
+    return out.getvalue().strip()
+
+
+def refresh_trending():
+    """Fold new events into the trending scores"""
+    processed = trending.refresh(batch_size=settings.SCHEDULER_BATCH_SIZE)
+    if any(processed.values()):
+        response_cache.invalidate_feed()
+    return processed
+
+
+def process_media():
+    """Media jobs no runner picked up (e.g. with MEDIA_JOBS_IN_PROCESS off and no process_media worker)"""
+    return {'processed': media_jobs.runner.drain()}
+
+
+def rebuild_search_index():
+    """Rebuild the full-text index from the base tables, in one transaction (run_scheduler --run only)"""
+    out = StringIO()
+    call_command('rebuild_search_index', stdout=out)
+    return out.getvalue().strip()
+
+
+def prune_media_jobs():
+    """Delete media jobs that finished successfully more than MEDIA_JOB_RETENTION_DAYS ago"""
+    return {'deleted': media_jobs.prune(batch_size=settings.SCHEDULER_BATCH_SIZE)}
+
+
+def prune_task_runs():
+    """Delete run log entries older than SCHEDULER_RUN_LOG_DAYS"""
+    cutoff = timezone.now() - timedelta(days=settings.SCHEDULER_RUN_LOG_DAYS)
+    old = TaskRun.objects.filter(started_at__lt=cutoff).exclude(status=TaskRun.RUNNING)
+    deleted = 0
+    while True:
+        pks = list(old.order_by('pk').values_list('pk', flat=True)[:settings.SCHEDULER_BATCH_SIZE])
+        if not pks:
+            return {'deleted': deleted}
+        deleted += TaskRun.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,118 @@
+import json
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmarking
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route in posts/urls.py against a deterministic seeded dataset: "
+        "p50/p95/p99 latency, queries per request and throughput, as JSON, optionally "
+        "compared with a stored baseline report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Seeded users (default: 100)')
+        parser.add_argument('--posts-per-user', type=int, default=20, help='Seeded posts per user (default: 20)')
+        parser.add_argument('--comments-per-post', type=int, default=3, help='Seeded comments per post (default: 3)')
+        parser.add_argument('--likes-per-post', type=int, default=5, help='Seeded likes per post (default: 5)')
+        parser.add_argument('--follows-per-user', type=int, default=5, help='Seeded follows per user (default: 5)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the dataset (default: 42)')
+        parser.add_argument('--iterations', type=int, default=30, help='Measured requests per scenario (default: 30)')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per scenario (default: 3)')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only run this scenario label (repeatable), e.g. feed.page')
+        parser.add_argument('--with-cache', action='store_true',
+                            help='Keep the response cache on (by default the views themselves are measured)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--baseline', help='Compare against this earlier report')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 slowdown versus the baseline as a fraction (default: 0.2)')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if any scenario regressed against the baseline')
+
+    def handle(self, *args, **options):
+        missing = benchmarking.uncovered_routes()
+        if missing:
+            raise CommandError(f"No benchmark scenario for routes: {', '.join(missing)}")
+        labels = {label for label, *_ in benchmarking.SCENARIOS}
+        unknown = set(options['scenarios'] or []) - labels
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        dataset_options = {
+            'users': options['users'],
+            'posts_per_user': options['posts_per_user'],
+            'comments_per_post': options['comments_per_post'],
+            'likes_per_post': options['likes_per_post'],
+            'follows_per_user': options['follows_per_user'],
+            'seed': options['seed'],
+        }
+        caches = settings.CACHES
+        if not options['with_cache']:
+            caches = {**caches, 'responses': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        with benchmarking.scratch_database():
+            dataset = benchmarking.seed(**dataset_options)
+            with override_settings(CACHES=caches):
+                scenarios = benchmarking.run_suite(
+                    dataset, options['iterations'], options['warmup'], only=options['scenarios']
+                )
+            vendor = connection.vendor
+
+        report = {
+            'benchmark': 'api',
+            'config': {
+                'dataset': dataset_options,
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'response_cache': options['with_cache'],
+            },
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': vendor,
+            },
+            'scenarios': scenarios,
+        }
+        if baseline is not None:
+            report['comparison'] = benchmarking.compare(report, baseline, options['tolerance'])
+
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(text + '\n')
+            self._print_summary(report)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(text)
+
+        regressions = report.get('comparison', {}).get('regressions')
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"Regressed against {options['baseline']}: {', '.join(regressions)}")
+
+    def _print_summary(self, report):
+        self.stdout.write(f"{'scenario':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}")
+        for label, result in report['scenarios'].items():
+            self.stdout.write(
+                f"{label:<22}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+                f"{result['throughput_rps']:>10}{result['queries_per_request']['mean']:>9}"
+            )
+        for label in report.get('comparison', {}).get('regressions', []):
+            self.stdout.write(self.style.WARNING(f"Regression: {label}"))
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import types
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import include, path
+
+from posts import benchmarking, urls as posts_urls
+from posts.async_views import async_urlpatterns
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent-connection throughput of the WSGI (DRF) views and the ASGI "
+        "(async) views on the feed, detail, comments and like endpoints, using a seeded scratch database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,10,50',
+                            help='Comma separated numbers of concurrent connections (default: 1,10,50)')
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Requests per mode and concurrency level (default: 400)')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='WSGI worker threads serving the connections (default: 8)')
+        parser.add_argument('--client-delay-ms', type=float, default=20.0,
+                            help='Time each connection stays open after its response, modelling a slow '
+                                 'client; a WSGI worker is held for it, an async task is not (default: 20)')
+        parser.add_argument('--like-ratio', type=float, default=0.1,
+                            help='Share of requests that are like writes (default: 0.1)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if settings.ASYNC_API_VIEWS:
+            raise CommandError("Unset ASYNC_API_VIEWS: the WSGI run needs the DRF views in posts.urls")
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError("--concurrency must be a comma separated list of integers")
+
+        delay = options['client_delay_ms'] / 1000
+        results = []
+        with benchmarking.scratch_database():
+            dataset = benchmarking.seed(seed=options['seed'])
+            # No response cache: measure the views, not cache hits
+            with override_settings(CACHES={**settings.CACHES, 'responses': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                for concurrency in levels:
+                    plan = self._plan(dataset, options['requests'], options['like_ratio'], options['seed'])
+                    results.append({'mode': 'wsgi', 'concurrency': concurrency,
+                                    **self._run_wsgi(plan, concurrency, options['workers'], delay)})
+                    with override_settings(ROOT_URLCONF=self._async_urlconf()):
+                        results.append({'mode': 'asgi', 'concurrency': concurrency,
+                                        **asyncio.run(self._run_asgi(plan, concurrency, delay))})
+
+        report = json.dumps({
+            'benchmark': 'asgi',
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'workers': options['workers'],
+            'client_delay_ms': options['client_delay_ms'],
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(report)
+
+    @staticmethod
+    def _async_urlconf():
+        urlconf = types.ModuleType('bench_asgi_urls')
+        urlconf.urlpatterns = [path('posts/', include(async_urlpatterns(posts_urls.urlpatterns)))]
+        return urlconf
+
+    @staticmethod
+    def _plan(dataset, count, like_ratio, seed):
+        """The same deterministic request mix for both modes: (method, path, token)"""
+        rng = random.Random(seed)
+        post_ids, tokens = dataset['post_ids'], dataset['tokens']
+        plan = []
+        for _ in range(count):
+            token = rng.choice(tokens)
+            if rng.random() < like_ratio:
+                plan.append(('post', f'/posts/{rng.choice(post_ids)}/like/', token))
+                continue
+            route = rng.choice([
+                '/posts/feed/',
+                '/posts/feed/?pagination=cursor',
+                f'/posts/{rng.choice(post_ids)}/',
+                f'/posts/{rng.choice(post_ids)}/comments/',
+            ])
+            plan.append(('get', route, token))
+        return plan
+
+    @staticmethod
+    def _run_wsgi(plan, concurrency, workers, delay):
+        """`concurrency` client connections served by a pool of `workers` threads"""
+        pool = threading.BoundedSemaphore(workers)
+        latencies, errors = [], []
+
+        def connection_loop(requests):
+            client = Client(raise_request_exception=False)
+            for method, url, token in requests:
+                started = time.perf_counter()
+                with pool:
+                    response = getattr(client, method)(url, headers={'Authorization': f'Token {token}'})
+                    time.sleep(delay)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 500 or response.status_code == 401:
+                    errors.append(url)
+            connection.close()
+
+        threads = [threading.Thread(target=connection_loop, args=(plan[i::concurrency],)) for i in range(concurrency)]
+        with benchmarking.Stopwatch() as watch:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return benchmarking.summarize(latencies, watch.elapsed, len(errors))
+
+    @staticmethod
+    async def _run_asgi(plan, concurrency, delay):
+        """`concurrency` client connections multiplexed on one event loop"""
+        latencies, errors = [], []
+
+        async def connection_loop(requests):
+            client = AsyncClient(raise_request_exception=False)
+            for method, url, token in requests:
+                started = time.perf_counter()
+                response = await getattr(client, method)(url, headers={'Authorization': f'Token {token}'})
+                await asyncio.sleep(delay)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 500 or response.status_code == 401:
+                    errors.append(url)
+
+        with benchmarking.Stopwatch() as watch:
+            await asyncio.gather(*(connection_loop(plan[i::concurrency]) for i in range(concurrency)))
+        return benchmarking.summarize(latencies, watch.elapsed, len(errors))
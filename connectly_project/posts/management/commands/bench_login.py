@@ -0,0 +1,132 @@
+import json
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmarking, login
+from posts.models import User
+
+# The hasher order before the login pipeline: PBKDF2 first
+LEGACY_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Logins per second (and per core) under concurrent clients: django.contrib.auth.authenticate "
+        "with PBKDF2 first, against the posts.login pipeline (hashing slots, Argon2 with rehash on "
+        "login, negative cache), with good and with repeated bad credentials"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Seeded users (default: 20)')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients (default: 8)')
+        parser.add_argument('--logins', type=int, default=5, help='Logins per thread and run (default: 5)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['threads'], options['logins']) < 1:
+            raise CommandError("--users, --threads and --logins must be at least 1")
+        cores = os.cpu_count() or 1
+
+        with benchmarking.scratch_database():
+            # One PBKDF2 hash for everybody: hashing each user's own would dominate the setup
+            legacy_hash = make_password(benchmarking.BENCH_PASSWORD, hasher='pbkdf2_sha256')
+            users = [f'login{i}' for i in range(options['users'])]
+            User.objects.bulk_create(User(username=name, password=legacy_hash) for name in users)
+
+            with override_settings(PASSWORD_HASHERS=LEGACY_HASHERS):
+                before = self._run(authenticate, users, benchmarking.BENCH_PASSWORD, options)
+                before_bad = self._run(authenticate, users, 'wrong password', options)
+
+            # Back to PBKDF2 hashes: the first login of each user pays for its upgrade
+            User.objects.update(password=legacy_hash)
+            caches[login.CACHE_ALIAS].clear()
+            pipeline = self._login_pipeline
+            first = self._run(pipeline, users, benchmarking.BENCH_PASSWORD, options)
+            upgraded = User.objects.filter(password__startswith='argon2$').count()
+            for username in users:
+                # Everybody on the new hash before measuring the steady state
+                pipeline(username, benchmarking.BENCH_PASSWORD)
+            after = self._run(pipeline, users, benchmarking.BENCH_PASSWORD, options)
+            after_bad = self._run(pipeline, users, 'wrong password', options)
+
+        results = {
+            'before': {'valid': before, 'repeated_invalid': before_bad},
+            'after': {'first_login_with_rehash': first, 'valid': after, 'repeated_invalid': after_bad},
+        }
+        for runs in results.values():
+            for run in runs.values():
+                run['logins_per_second_per_core'] = (
+                    round(run['throughput_rps'] / cores, 1) if run['throughput_rps'] else None
+                )
+        report = json.dumps({
+            'benchmark': 'login',
+            'seed': options['seed'],
+            'cores': cores,
+            'threads': options['threads'],
+            'logins_per_thread': options['logins'],
+            'hash_slots': settings.LOGIN_HASH_SLOTS,
+            'preferred_hasher': settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1],
+            'users_upgraded_by_first_run': upgraded,
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(report)
+
+    @staticmethod
+    def _login_pipeline(username, password):
+        # Like a client retrying after a 503; the wait counts towards the login's latency
+        while True:
+            try:
+                return login.authenticate(username, password)
+            except login.LoginBusy:
+                time.sleep(0.005)
+
+    @staticmethod
+    def _run(check, users, password, options):
+        """`threads` clients each logging in `logins` times as random users"""
+        latencies, errors = [], 0
+        lock = threading.Lock()
+        start = threading.Barrier(options['threads'])
+        expect_success = password == benchmarking.BENCH_PASSWORD
+
+        def loop(index):
+            nonlocal errors
+            rng = random.Random(options['seed'] * 1000 + index)
+            mine, failed = [], 0
+            start.wait()
+            for _ in range(options['logins']):
+                started = time.perf_counter()
+                user = check(username=rng.choice(users), password=password)
+                mine.append(time.perf_counter() - started)
+                failed += (user is not None) != expect_success
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors += failed
+
+        threads = [threading.Thread(target=loop, args=(i,)) for i in range(options['threads'])]
+        with benchmarking.Stopwatch() as watch:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return benchmarking.summarize(latencies, watch.elapsed, errors)
@@ -0,0 +1,120 @@
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from posts import benchmarking
+
+# Settings keys a profile may change on the default connection
+PROFILE_KEYS = ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stock SQLite settings with the sqlite-concurrent profile (WAL, busy timeout, "
+        "pragmas, persistent connections) under concurrent readers and writers, on a seeded scratch database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads (default: 8)')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads (default: 4)')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per thread and profile (default: 200)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark compares SQLite settings; the default database is not SQLite")
+        if options['readers'] < 1 and options['writers'] < 1:
+            raise CommandError("Need at least one reader or writer thread")
+
+        stock = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+        profiles = {'default': stock, 'sqlite-concurrent': settings.SQLITE_CONCURRENT_PROFILE}
+        results = {}
+        for name, profile in profiles.items():
+            results[name] = self._run_profile(profile, options)
+
+        report = json.dumps({
+            'benchmark': 'sqlite',
+            'seed': options['seed'],
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'requests_per_thread': options['requests'],
+            'results': results,
+            'speedup': {
+                kind: round(results['sqlite-concurrent'][kind]['throughput_rps']
+                            / results['default'][kind]['throughput_rps'], 2)
+                for kind in ('reads', 'writes')
+                if results['default'][kind]['throughput_rps']
+            },
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(report)
+
+    def _run_profile(self, profile, options):
+        # A fresh database file per profile: journal_mode=WAL sticks to the file
+        saved = {key: connection.settings_dict.get(key) for key in PROFILE_KEYS}
+        connection.close()
+        # New thread-local connections are built from this same settings dict
+        connection.settings_dict.update(profile)
+        try:
+            with benchmarking.scratch_database():
+                dataset = benchmarking.seed(seed=options['seed'])
+                with override_settings(CACHES={**settings.CACHES, 'responses': {
+                        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                    return self._run(dataset, options)
+        finally:
+            connection.close()
+            connection.settings_dict.update(saved)
+
+    @staticmethod
+    def _run(dataset, options):
+        """Reader and writer threads each with their own client (and database connection)"""
+        post_ids, tokens = dataset['post_ids'], dataset['tokens']
+        latencies = {'reads': [], 'writes': []}
+        errors = {'reads': 0, 'writes': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(options['readers'] + options['writers'])
+
+        def loop(kind, index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            client = Client(raise_request_exception=False)
+            token = tokens[index % len(tokens)]
+            headers = {'Authorization': f'Token {token}'}
+            mine, failed = [], 0
+            start.wait()
+            for i in range(options['requests']):
+                post_id = rng.choice(post_ids)
+                started = time.perf_counter()
+                if kind == 'reads':
+                    url = rng.choice(['/posts/feed/', f'/posts/{post_id}/', f'/posts/{post_id}/comments/'])
+                    response = client.get(url, headers=headers)
+                else:
+                    response = client.post(f'/posts/{post_id}/comment/', {'text': f'Bench comment {i}'},
+                                           content_type='application/json', headers=headers)
+                mine.append(time.perf_counter() - started)
+                failed += response.status_code >= 500 or response.status_code == 401
+            connection.close()
+            with lock:
+                latencies[kind].extend(mine)
+                errors[kind] += failed
+
+        threads = [threading.Thread(target=loop, args=('reads', i)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=loop, args=('writes', i)) for i in range(options['writers'])]
+        with benchmarking.Stopwatch() as watch:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return {kind: benchmarking.summarize(latencies[kind], watch.elapsed, errors[kind]) for kind in latencies}
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = "Stream posts, comments or likes to stdout or a file as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(export.EXPORTS))
+        parser.add_argument('--output', choices=sorted(export.FORMATS), default='ndjson',
+                            help='Output format (default: ndjson)')
+        parser.add_argument('--since', help='Only rows created at or after this ISO date/datetime')
+        parser.add_argument('--until', help='Only rows created at or before this ISO date/datetime')
+        parser.add_argument('--file', help='Write to this path instead of stdout')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip')
+
+    def handle(self, *args, **options):
+        try:
+            since = export.parse_bound(options['since'])
+            until = export.parse_bound(options['until'], end_of_day=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = export.export_stream(options['kind'], options['output'], since, until, options['chunk_size'])
+        if options['file']:
+            with open(options['file'], 'w', encoding='utf-8', newline='') as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
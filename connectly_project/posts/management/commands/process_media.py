@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from posts import media_jobs
+from posts.models import MediaJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Process pending media jobs (normalized metadata of image and video posts) on a pool of worker "
+        "processes until none are left; --interval keeps polling in the foreground"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            help='Worker processes (default: MEDIA_JOB_WORKERS; 0 processes in this process)')
+        parser.add_argument('--batch-size', type=int,
+                            help='Jobs claimed at a time (default: MEDIA_JOB_BATCH_SIZE)')
+        parser.add_argument('--interval', type=float,
+                            help='Look for new jobs every this many seconds until interrupted')
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 0:
+            raise CommandError("--workers cannot be negative")
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        runner = media_jobs.MediaJobRunner(workers=options['workers'], batch_size=options['batch_size'])
+        try:
+            self._drain(runner, always_report=True)
+            if not options['interval']:
+                return
+            while True:
+                time.sleep(options['interval'])
+                close_old_connections()
+                self._drain(runner)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            runner.stop()
+
+    def _drain(self, runner, always_report=False):
+        processed = runner.drain()
+        if processed or always_report:
+            failed = MediaJob.objects.filter(status=MediaJob.FAILED).count()
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} media jobs ({failed} failed in total)"))
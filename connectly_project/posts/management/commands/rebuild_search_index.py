@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index of posts and comments from the base tables; "
+        "--reinstall also recreates the index tables and SQLite sync triggers (migrate repairs missing ones by itself)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias (default: default)')
+        parser.add_argument('--reinstall', action='store_true',
+                            help='Drop and recreate the index tables/triggers before rebuilding')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        try:
+            backend = search.backend(connection)
+        except NotSupportedError as e:
+            raise CommandError(str(e))
+
+        with transaction.atomic(using=connection.alias):
+            if options['reinstall']:
+                backend.uninstall()
+                backend.install()
+            else:
+                backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index on {connection.alias} ({connection.vendor})"))
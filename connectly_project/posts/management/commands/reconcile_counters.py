@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import Post, Like, Comment
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count / Post.comment_count from the Like and Comment tables in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of posts to reconcile per transaction (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted posts without writing the fixes')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            pks = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            checked += len(pks)
+            fixed += self._reconcile_batch(pks, dry_run)
+
+        verb = 'would fix' if dry_run else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts, {verb} {fixed} drifted counters"))
+
+    def _reconcile_batch(self, pks, dry_run):
+        with transaction.atomic():
+            posts = Post.objects.filter(pk__in=pks).only('pk', 'like_count', 'comment_count')
+            if not dry_run:
+                # Lock the rows first so likes/comments landing mid-batch can't be overwritten
+                posts = posts.select_for_update()
+            posts = list(posts)
+            like_totals = dict(
+                Like.objects.filter(post_id__in=pks).order_by().values_list('post').annotate(total=Count('pk'))
+            )
+            comment_totals = dict(
+                Comment.objects.filter(post_id__in=pks).order_by().values_list('post').annotate(total=Count('pk'))
+            )
+
+            drifted = []
+            for post in posts:
+                likes = like_totals.get(post.pk, 0)
+                comments = comment_totals.get(post.pk, 0)
+                if post.like_count != likes or post.comment_count != comments:
+                    post.like_count = likes
+                    post.comment_count = comments
+                    drifted.append(post)
+            if drifted and not dry_run:
+                Post.objects.bulk_update(drifted, ['like_count', 'comment_count'])
+        return len(drifted)
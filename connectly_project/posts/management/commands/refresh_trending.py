@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from posts import trending
+from posts.cache import response_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold new posts, likes and comments into the trending scores behind /posts/feed/?sort=hot; "
+        "--interval keeps refreshing in the foreground"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Events read per transaction (default: 1000)')
+        parser.add_argument('--full', action='store_true',
+                            help='Drop all scores and recompute from every event (after changing weights)')
+        parser.add_argument('--interval', type=float,
+                            help='Refresh every this many seconds until interrupted')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        self._refresh(options['batch_size'], options['full'])
+        if not options['interval']:
+            return
+        try:
+            while True:
+                time.sleep(options['interval'])
+                close_old_connections()
+                self._refresh(options['batch_size'], full=False)
+        except KeyboardInterrupt:
+            pass
+
+    def _refresh(self, batch_size, full):
+        processed = trending.refresh(batch_size=batch_size, full=full)
+        if any(processed.values()):
+            # Cached ?sort=hot pages are keyed on the feed generation
+            response_cache.invalidate_feed()
+        summary = ', '.join(f'{count} {kind}s' for kind, count in processed.items())
+        self.stdout.write(self.style.SUCCESS(f"Trending scores refreshed from {summary}"))
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from posts import scheduler
+from posts.models import TaskRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the maintenance scheduler in the foreground until interrupted (waiting for running tasks "
+        "on exit); --list shows the timetable, --run runs tasks right away"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            help='Tasks that may run at the same time (default: SCHEDULER_WORKERS)')
+        parser.add_argument('--list', action='store_true',
+                            help='Show every task with its schedule, last run and next run, then exit')
+        parser.add_argument('--run', nargs='+', metavar='TASK',
+                            help='Run these tasks now (unless already running elsewhere), then exit')
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+        if options['list']:
+            return self._list()
+        if options['run']:
+            return self._run(options['run'])
+
+        runner = scheduler.Scheduler(workers=options['workers'])
+        self.stdout.write(f"Scheduling {', '.join(scheduler.schedules())} (Ctrl+C to stop)")
+        try:
+            while True:
+                for name in runner.tick():
+                    self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} started {name}")
+                time.sleep(settings.SCHEDULER_POLL_INTERVAL)
+                close_old_connections()
+        except KeyboardInterrupt:
+            self.stdout.write("Waiting for running tasks...")
+        finally:
+            runner.stop()
+
+    def _list(self):
+        plan = scheduler.schedules()
+        due = scheduler.Scheduler().next_runs()
+        for name in scheduler.TASKS:
+            run = TaskRun.objects.filter(task=name).order_by('-started_at').first()
+            last = f"{run.status} at {run.started_at:%Y-%m-%d %H:%M:%S}" if run else 'never run'
+            next_run = f"{due[name]:%Y-%m-%d %H:%M:%S}" if name in due else '-'
+            self.stdout.write(f"{name:<22} {str(plan.get(name, 'disabled')):<14} next {next_run:<19}  last {last}")
+
+    def _run(self, names):
+        unknown = [name for name in names if name not in scheduler.TASKS]
+        if unknown:
+            raise CommandError(f"Unknown tasks: {', '.join(unknown)} (choose from {', '.join(scheduler.TASKS)})")
+        failed = []
+        for name in names:
+            run = scheduler.run_task(name)
+            style = self.style.SUCCESS if run.status == TaskRun.SUCCEEDED else self.style.WARNING
+            self.stdout.write(style(f"{name}: {run.status} {run.result if run.result is not None else run.error}"))
+            if run.status == TaskRun.FAILED:
+                failed.append(name)
+        if failed:
+            raise CommandError(f"Failed: {', '.join(failed)}")
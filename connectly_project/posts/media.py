@@ -0,0 +1,154 @@
+"""
+Normalized metadata for image and video posts.
+
+Pure functions of a post's type and metadata with no Django imports, so the
+media job runner (posts/media_jobs.py) can run them in worker processes.
+process() returns what is stored under metadata['media']:
+
+- file_size_bytes from `file_size` (a byte count or a string such as "2.5 MB" or "800KiB"),
+- width, height, aspect_ratio and orientation from `width`/`height` or a
+  `resolution`/`dimensions` string such as "1920x1080",
+- thumbnail: the size a thumbnail renders at, fitting THUMBNAIL_BOX with the
+  original aspect ratio,
+- duration_seconds from `duration` (seconds, "90s", "1:30" or "1:02:03") and,
+  for videos, poster_at: the frame offset used for the thumbnail.
+
+Invalid values raise ValueError, which fails the job with that message.
+"""
+import re
+
+THUMBNAIL_BOX = (320, 320)
+# Videos take their poster frame this far into the clip, capped at POSTER_MAX_SECONDS
+POSTER_FRACTION = 0.1
+POSTER_MAX_SECONDS = 10.0
+
+_SIZE_UNITS = {
+    '': 1, 'b': 1,
+    'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3,
+    'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3,
+}
+_SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*$', re.IGNORECASE)
+_RESOLUTION = re.compile(r'^\s*(\d+)\s*[x×]\s*(\d+)\s*$', re.IGNORECASE)
+_SECONDS = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*s?\s*$', re.IGNORECASE)
+
+
+def parse_size(value):
+    """Bytes in `value`: a number of bytes or a string with a unit"""
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid file_size: {value!r}")
+    if isinstance(value, (int, float)):
+        size = value
+    else:
+        match = _SIZE.match(str(value))
+        if not match or match.group(2).lower() not in _SIZE_UNITS:
+            raise ValueError(f"Invalid file_size: {value!r}")
+        size = float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()]
+    if size < 0:
+        raise ValueError(f"Invalid file_size: {value!r}")
+    return int(size)
+
+
+def parse_duration(value):
+    """Seconds in `value`: a number, "90s", "1:30" or "1:02:03" """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid duration: {value!r}")
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    elif ':' in str(value):
+        parts = str(value).strip().split(':')
+        try:
+            numbers = [float(part) for part in parts]
+        except ValueError:
+            raise ValueError(f"Invalid duration: {value!r}")
+        if len(numbers) > 3 or any(n < 0 for n in numbers) or any(n >= 60 for n in numbers[1:]):
+            raise ValueError(f"Invalid duration: {value!r}")
+        seconds = 0.0
+        for number in numbers:
+            seconds = seconds * 60 + number
+    else:
+        match = _SECONDS.match(str(value))
+        if not match:
+            raise ValueError(f"Invalid duration: {value!r}")
+        seconds = float(match.group(1))
+    if seconds < 0:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return round(seconds, 3)
+
+
+def parse_dimensions(metadata):
+    """(width, height) from the metadata, or None if it has neither form"""
+    if 'width' in metadata or 'height' in metadata:
+        try:
+            width, height = int(metadata['width']), int(metadata['height'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("width and height must both be integers")
+    else:
+        text = metadata.get('resolution', metadata.get('dimensions'))
+        if text is None:
+            return None
+        match = _RESOLUTION.match(str(text))
+        if not match:
+            raise ValueError(f"Invalid resolution: {text!r}")
+        width, height = int(match.group(1)), int(match.group(2))
+    if width <= 0 or height <= 0:
+        raise ValueError("width and height must be positive")
+    return width, height
+
+
+def thumbnail_size(width, height, box=THUMBNAIL_BOX):
+    """Size that fits `box` with the same aspect ratio, never larger than the original"""
+    scale = min(box[0] / width, box[1] / height, 1.0)
+    return {'width': max(1, round(width * scale)), 'height': max(1, round(height * scale))}
+
+
+def _describe_dimensions(dimensions):
+    width, height = dimensions
+    orientation = 'square' if width == height else 'landscape' if width > height else 'portrait'
+    return {
+        'width': width,
+        'height': height,
+        'aspect_ratio': round(width / height, 4),
+        'orientation': orientation,
+        'thumbnail': thumbnail_size(width, height),
+    }
+
+
+def process_image(metadata):
+    if 'file_size' not in metadata:
+        raise ValueError("Image posts require 'file_size' in metadata")
+    media = {'file_size_bytes': parse_size(metadata['file_size'])}
+    dimensions = parse_dimensions(metadata)
+    if dimensions:
+        media.update(_describe_dimensions(dimensions))
+    return media
+
+
+def process_video(metadata):
+    if 'duration' not in metadata:
+        raise ValueError("Video posts require 'duration' in metadata")
+    duration = parse_duration(metadata['duration'])
+    media = {
+        'duration_seconds': duration,
+        'poster_at': round(min(duration * POSTER_FRACTION, POSTER_MAX_SECONDS), 3),
+    }
+    if 'file_size' in metadata:
+        media['file_size_bytes'] = parse_size(metadata['file_size'])
+        if duration:
+            media['bitrate_kbps'] = round(media['file_size_bytes'] * 8 / duration / 1000, 1)
+    dimensions = parse_dimensions(metadata)
+    if dimensions:
+        media.update(_describe_dimensions(dimensions))
+    return media
+
+
+PROCESSORS = {
+    'image': process_image,
+    'video': process_video,
+}
+
+
+def process(post_type, metadata):
+    """metadata['media'] for a post of `post_type`"""
+    if not isinstance(metadata, dict):
+        raise ValueError("Metadata must be a JSON object (dictionary)")
+    return PROCESSORS[post_type](metadata)
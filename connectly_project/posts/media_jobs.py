@@ -0,0 +1,246 @@
+"""
+Media job queue: normalized metadata for image and video posts, computed off
+the request path.
+
+Creating a media post inserts a pending MediaJob in the same transaction, so
+no post is lost between commit and processing, and the request returns
+without waiting for it. The job table (in the main database) is the queue; no
+broker is involved. A runner claims pending jobs in batches with one UPDATE
+(each claim gets its own token), computes posts.media.process() for them on a
+pool of MEDIA_JOB_WORKERS processes (so the work spreads across cores), and
+writes the result to post.metadata['media'].
+
+Runners:
+- `python manage.py process_media` (any number of them, on any host that can
+  reach the database),
+- or, with MEDIA_JOBS_IN_PROCESS, a thread in each web process that is woken
+  whenever a media post commits.
+
+Invalid metadata fails a job at once. Unexpected errors and jobs whose runner
+died (running for longer than MEDIA_JOB_TIMEOUT seconds) are retried until
+MEDIA_JOB_MAX_ATTEMPTS.
+"""
+import atexit
+import multiprocessing
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from singletons.logger_singleton import LoggerSingleton
+from .cache import response_cache
+from .models import MediaJob, Post
+from . import media
+
+logger = LoggerSingleton().get_logger()
+
+MEDIA_TYPES = tuple(media.PROCESSORS)
+
+
+def enqueue(posts):
+    """Pending jobs for the media posts among `posts`; call inside the transaction that creates them"""
+    jobs = [MediaJob(post_id=post.pk) for post in posts if post.post_type in MEDIA_TYPES]
+    if jobs:
+        MediaJob.objects.bulk_create(jobs, ignore_conflicts=True)
+        transaction.on_commit(runner.wake)
+    return len(jobs)
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=settings.MEDIA_JOB_TIMEOUT)
+    return Q(status=MediaJob.PENDING) | Q(status=MediaJob.RUNNING, started_at__lt=stale)
+
+
+def claim(limit):
+    """Mark up to `limit` of the oldest claimable jobs as running for this caller and return them"""
+    now = timezone.now()
+    # Jobs abandoned by a dead runner too often give up
+    MediaJob.objects.filter(
+        _claimable(now), status=MediaJob.RUNNING, attempts__gte=settings.MEDIA_JOB_MAX_ATTEMPTS
+    ).update(status=MediaJob.FAILED, error='Timed out', finished_at=now)
+
+    token = uuid.uuid4().hex
+    ids = list(MediaJob.objects.filter(_claimable(now)).order_by('id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    # The condition is re-checked by the UPDATE, so concurrent runners never claim the same job
+    MediaJob.objects.filter(_claimable(now), pk__in=ids).update(
+        status=MediaJob.RUNNING, claimed_by=token, started_at=now, attempts=F('attempts') + 1
+    )
+    return list(MediaJob.objects.filter(pk__in=ids, claimed_by=token).select_related('post'))
+
+
+def _complete(job, result):
+    with transaction.atomic():
+        post = Post.objects.select_for_update().only('metadata').filter(pk=job.post_id).first()
+        if post is None:
+            return
+        Post.objects.filter(pk=post.pk).update(metadata={**post.metadata, 'media': result})
+        MediaJob.objects.filter(pk=job.pk, claimed_by=job.claimed_by).update(
+            status=MediaJob.DONE, error='', finished_at=timezone.now()
+        )
+        transaction.on_commit(lambda: response_cache.invalidate_post(job.post_id))
+
+
+def _fail(job, error, retry):
+    if retry and job.attempts < settings.MEDIA_JOB_MAX_ATTEMPTS:
+        changes = {'status': MediaJob.PENDING, 'claimed_by': '', 'started_at': None}
+    else:
+        changes = {'status': MediaJob.FAILED, 'finished_at': timezone.now()}
+    MediaJob.objects.filter(pk=job.pk, claimed_by=job.claimed_by).update(error=error, **changes)
+
+
+def run_once(executor=None, limit=None):
+    """
+    Claim and process one batch, on `executor` (a process pool) or inline.
+    Returns the number of jobs claimed. Raises BrokenProcessPool once the batch
+    is settled if the pool died.
+    """
+    jobs = claim(limit or settings.MEDIA_JOB_BATCH_SIZE)
+    if executor is None:
+        outcomes = []
+        for job in jobs:
+            try:
+                outcomes.append((job, media.process(job.post.post_type, job.post.metadata), None))
+            except Exception as e:
+                outcomes.append((job, None, e))
+    else:
+        futures = [(job, executor.submit(media.process, job.post.post_type, job.post.metadata)) for job in jobs]
+        outcomes = []
+        for job, future in futures:
+            try:
+                outcomes.append((job, future.result(), None))
+            except Exception as e:
+                outcomes.append((job, None, e))
+
+    broken = False
+    for job, result, error in outcomes:
+        if error is None:
+            _complete(job, result)
+        elif isinstance(error, ValueError):
+            _fail(job, str(error), retry=False)
+        else:
+            broken = broken or isinstance(error, BrokenProcessPool)
+            logger.error("Media job %s for post %s failed: %r", job.pk, job.post_id, error)
+            _fail(job, repr(error), retry=True)
+    if broken:
+        raise BrokenProcessPool("Media worker process died")
+    return len(jobs)
+
+
+class MediaJobRunner:
+    """Drains the job table with a process pool; optionally in a background thread (MEDIA_JOBS_IN_PROCESS)"""
+
+    def __init__(self, workers=None, batch_size=None):
+        self._workers = workers
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._executor = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = False
+        atexit.register(self.stop)
+
+    def executor(self):
+        """The worker pool, started on first use; None when MEDIA_JOB_WORKERS is 0 (process inline)"""
+        workers = settings.MEDIA_JOB_WORKERS if self._workers is None else self._workers
+        if workers < 1:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that runs threads can copy held locks
+                self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def drain(self):
+        """Process batches until no job is claimable; returns the number of jobs processed"""
+        total = 0
+        while True:
+            try:
+                claimed = run_once(self.executor(), self._batch_size)
+            except BrokenProcessPool:
+                logger.error("Media worker pool broke; starting a new one")
+                self._shutdown_executor()
+                continue
+            if not claimed:
+                return total
+            total += claimed
+
+    def wake(self):
+        """Called after a media post commits: have the in-process runner look for work"""
+        if not settings.MEDIA_JOBS_IN_PROCESS:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='media-job-runner', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                self._wakeup.clear()
+                try:
+                    self.drain()
+                except Exception:
+                    logger.exception("Media job runner failed; retrying in %ss", settings.MEDIA_JOB_POLL_INTERVAL)
+                # Also picks up jobs other processes left behind
+                self._wakeup.wait(settings.MEDIA_JOB_POLL_INTERVAL)
+        finally:
+            connections.close_all()
+
+    def _shutdown_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    def stop(self):
+        """Stop the background thread (after its current batch) and the worker processes"""
+        thread = self._thread
+        if thread is not None:
+            self._stopping = True
+            self._wakeup.set()
+            thread.join()
+            self._thread = None
+        self._shutdown_executor()
+
+
+runner = MediaJobRunner()
+
+
+def prune(days=None, batch_size=500):
+    """Delete jobs that finished successfully more than MEDIA_JOB_RETENTION_DAYS ago; returns the count"""
+    days = settings.MEDIA_JOB_RETENTION_DAYS if days is None else days
+    done = MediaJob.objects.filter(status=MediaJob.DONE, finished_at__lt=timezone.now() - timedelta(days=days))
+    deleted = 0
+    while True:
+        pks = list(done.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += MediaJob.objects.filter(pk__in=pks).delete()[0]
+
+
+def status(post):
+    """Job status payload for a media post"""
+    job = MediaJob.objects.filter(post=post).first()
+    media_result = post.metadata.get('media') if isinstance(post.metadata, dict) else None
+    if job:
+        job_status = job.status
+    else:
+        # Done jobs are pruned; the result stays in the metadata
+        job_status = MediaJob.DONE if media_result is not None else None
+    return {
+        'post_id': post.pk,
+        'status': job_status,
+        'attempts': job.attempts if job else 0,
+        'error': job.error if job else '',
+        'media': media_result,
+    }
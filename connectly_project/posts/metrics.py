@@ -0,0 +1,199 @@
+"""
+Per-request instrumentation.
+
+RequestMetricsMiddleware opens a RequestMetrics for every request. A database
+execute wrapper (installed on each new connection) adds query count and time
+to it, instrumented serializers add the time spent producing `.data`, and the
+middleware reports the totals as a structured log line, a Server-Timing header
+and an entry in the rolling per-endpoint histogram behind /posts/metrics/.
+
+The current RequestMetrics lives in a context variable, so queries issued from
+sync_to_async threads by the async views are attributed to their request too.
+Serializer time includes any queries the serializer triggers lazily, which is
+exactly where N+1 regressions show up.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+WINDOW_SLOTS = 10
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_time', 'serializer_time', '_serializing')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self._serializing = False
+
+
+def start():
+    """Begin collecting for the current request; returns (metrics, token for finish())"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def resume(metrics):
+    """Collect into `metrics` again (while a streaming body is produced); returns a token for finish()"""
+    return _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper: time every statement of the current request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.queries += 1
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Fires on every (re)connect of the same wrapper object, so only add it once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def serializer_timer():
+    """Count the enclosed block as serializer time; nested blocks are only counted once"""
+    metrics = _current.get()
+    if metrics is None or metrics._serializing:
+        yield
+        return
+    metrics._serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+        metrics._serializing = False
+
+
+def _empty_stats():
+    return {
+        'count': 0, 'errors': 0, 'latency_sum': 0.0, 'latency_max': 0.0,
+        'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'queries_sum': 0, 'queries_max': 0, 'db_sum': 0.0, 'serializer_sum': 0.0,
+    }
+
+
+class EndpointHistogram:
+    """
+    Latency histogram plus query/DB/serializer totals per endpoint over a rolling
+    window. The window is split into WINDOW_SLOTS time slots; whole slots expire.
+    """
+
+    def __init__(self, window_seconds=300):
+        self.window_seconds = window_seconds
+        self.slot_seconds = max(window_seconds / WINDOW_SLOTS, 1)
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def record(self, endpoint, status_code, total, queries, db_time, serializer_time):
+        total_ms = total * 1000
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if total_ms <= bound), len(LATENCY_BUCKETS_MS))
+        slot_id = int(time.time() // self.slot_seconds)
+        with self._lock:
+            slot = self._slots.get(slot_id)
+            if slot is None:
+                slot = self._slots[slot_id] = {}
+                self._expire(slot_id)
+            stats = slot.get(endpoint)
+            if stats is None:
+                stats = slot[endpoint] = _empty_stats()
+            stats['count'] += 1
+            stats['errors'] += status_code >= 500
+            stats['latency_sum'] += total_ms
+            stats['latency_max'] = max(stats['latency_max'], total_ms)
+            stats['buckets'][bucket] += 1
+            stats['queries_sum'] += queries
+            stats['queries_max'] = max(stats['queries_max'], queries)
+            stats['db_sum'] += db_time * 1000
+            stats['serializer_sum'] += serializer_time * 1000
+
+    def _expire(self, newest_slot_id):
+        oldest = newest_slot_id - WINDOW_SLOTS + 1
+        for slot_id in [slot_id for slot_id in self._slots if slot_id < oldest]:
+            del self._slots[slot_id]
+
+    def snapshot(self):
+        """Per-endpoint summary of the current window, slowest p95 first"""
+        oldest = int(time.time() // self.slot_seconds) - WINDOW_SLOTS + 1
+        merged = {}
+        with self._lock:
+            for slot_id, slot in self._slots.items():
+                if slot_id < oldest:
+                    continue
+                for endpoint, stats in slot.items():
+                    total = merged.setdefault(endpoint, _empty_stats())
+                    for key in ('count', 'errors', 'latency_sum', 'queries_sum', 'db_sum', 'serializer_sum'):
+                        total[key] += stats[key]
+                    total['latency_max'] = max(total['latency_max'], stats['latency_max'])
+                    total['queries_max'] = max(total['queries_max'], stats['queries_max'])
+                    total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+
+        endpoints = {endpoint: self._summarize(stats) for endpoint, stats in merged.items()}
+        return {
+            'window_seconds': self.window_seconds,
+            'buckets_ms': list(LATENCY_BUCKETS_MS) + ['+Inf'],
+            'endpoints': dict(sorted(endpoints.items(), key=lambda item: -item[1]['latency_ms']['p95'])),
+        }
+
+    @staticmethod
+    def _summarize(stats):
+        count = stats['count']
+
+        def percentile(pct):
+            # Upper bound of the bucket holding the rank; the open bucket reports the observed max
+            rank = max(1, round(pct / 100 * count))
+            seen = 0
+            for index, bucket_count in enumerate(stats['buckets']):
+                seen += bucket_count
+                if seen >= rank:
+                    if index < len(LATENCY_BUCKETS_MS):
+                        return min(LATENCY_BUCKETS_MS[index], round(stats['latency_max'], 2))
+                    return round(stats['latency_max'], 2)
+
+        return {
+            'count': count,
+            'errors': stats['errors'],
+            'latency_ms': {
+                'mean': round(stats['latency_sum'] / count, 2),
+                'p50': percentile(50),
+                'p95': percentile(95),
+                'p99': percentile(99),
+                'max': round(stats['latency_max'], 2),
+                'histogram': stats['buckets'],
+            },
+            'queries': {'mean': round(stats['queries_sum'] / count, 2), 'max': stats['queries_max']},
+            'db_ms': {'mean': round(stats['db_sum'] / count, 2)},
+            'serializer_ms': {'mean': round(stats['serializer_sum'] / count, 2)},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._slots.clear()
+
+
+histogram = EndpointHistogram(window_seconds=settings.REQUEST_METRICS_WINDOW)
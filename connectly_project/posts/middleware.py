@@ -0,0 +1,174 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from singletons.logger_singleton import LoggerSingleton
+from . import metrics, routers
+
+logger = LoggerSingleton().get_logger('requests')
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure query count, DB time, serializer time and total latency of each request.
+    Keep it first in MIDDLEWARE so the total covers the whole stack. Works under
+    WSGI and ASGI without forcing a sync/async switch. Streaming responses are
+    measured until their body ends, and get no Server-Timing header (it goes out
+    before the body).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        collected, token = metrics.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self.report(request, response, collected)
+
+    async def __acall__(self, request):
+        collected, token = metrics.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self.report(request, response, collected)
+
+    @staticmethod
+    def endpoint(request):
+        # The route template keeps the histogram to one entry per URL pattern
+        match = getattr(request, 'resolver_match', None)
+        route = f'/{match.route}' if match is not None else '<unmatched>'
+        return f'{request.method} {route}'
+
+    def report(self, request, response, collected):
+        if response.streaming:
+            # The body (and its queries) is produced while the server sends it: measure until it ends
+            response.streaming_content = self._measured_stream(request, response, collected)
+            return response
+        db_ms, serializer_ms, total_ms = self.record(request, response.status_code, collected)
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={db_ms};desc="{collected.queries} queries", '
+                f'ser;dur={serializer_ms};desc="serializers", total;dur={total_ms}'
+            )
+        return response
+
+    def _measured_stream(self, request, response, collected):
+        if response.is_async:
+            return self._ameasure(request, response.status_code, response.streaming_content, collected)
+        return self._measure(request, response.status_code, response.streaming_content, collected)
+
+    def _measure(self, request, status_code, content, collected):
+        try:
+            chunks = iter(content)
+            while True:
+                token = metrics.resume(collected)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    metrics.finish(token)
+                yield chunk
+        finally:
+            self.record(request, status_code, collected)
+
+    async def _ameasure(self, request, status_code, content, collected):
+        try:
+            chunks = aiter(content)
+            while True:
+                token = metrics.resume(collected)
+                try:
+                    chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    return
+                finally:
+                    metrics.finish(token)
+                yield chunk
+        finally:
+            self.record(request, status_code, collected)
+
+    def record(self, request, status_code, collected):
+        """Add the request to the histogram and log it; returns (db_ms, serializer_ms, total_ms)"""
+        total = time.perf_counter() - collected.started
+        endpoint = self.endpoint(request)
+        metrics.histogram.record(
+            endpoint, status_code, total, collected.queries, collected.db_time, collected.serializer_time
+        )
+
+        db_ms, serializer_ms, total_ms = (round(value * 1000, 2) for value in
+                                          (collected.db_time, collected.serializer_time, total))
+        logger.info(
+            "request endpoint=%s status=%s queries=%s db_ms=%s serializer_ms=%s total_ms=%s",
+            endpoint, status_code, collected.queries, db_ms, serializer_ms, total_ms,
+            extra={'request_metrics': {
+                'endpoint': endpoint,
+                'path': request.path,
+                'status': status_code,
+                'queries': collected.queries,
+                'db_ms': db_ms,
+                'serializer_ms': serializer_ms,
+                'total_ms': total_ms,
+            }},
+        )
+        return db_ms, serializer_ms, total_ms
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for the replica router: writes (unsafe methods) and any
+    request from a client that wrote within REPLICA_PIN_SECONDS read from the
+    primary. No-op without REPLICA_DATABASES.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        token = self.pin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.unpin(token)
+        self.remember(request)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+        token = self.pin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.unpin(token)
+        self.remember(request)
+        return response
+
+    @staticmethod
+    def pin(request):
+        writes = request.method not in SAFE_METHODS
+        return routers.pin(writes or routers.read_your_writes.wrote_recently(request))
+
+    @staticmethod
+    def remember(request):
+        if request.method not in SAFE_METHODS:
+            routers.read_your_writes.record_write(request)
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Like = apps.get_model('posts', 'Like')
+    Comment = apps.get_model('posts', 'Comment')
+
+    like_totals = dict(Like.objects.order_by().values_list('post').annotate(total=Count('pk')))
+    comment_totals = dict(Comment.objects.order_by().values_list('post').annotate(total=Count('pk')))
+    posts = []
+    for post in Post.objects.only('pk'):
+        post.like_count = like_totals.get(post.pk, 0)
+        post.comment_count = comment_totals.get(post.pk, 0)
+        posts.append(post)
+    Post.objects.bulk_update(posts, ['like_count', 'comment_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_alter_comment_options_like'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_follow_timelineentry_user_follower_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['created_at', 'id'], name='like_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import NotSupportedError, migrations
+
+
+def install_search_index(apps, schema_editor):
+    from posts import search
+    try:
+        search.backend(schema_editor.connection).install()
+    except NotSupportedError:
+        pass  # /posts/search/ reports it as unavailable
+
+
+def uninstall_search_index(apps, schema_editor):
+    from posts import search
+    try:
+        search.backend(schema_editor.connection).uninstall()
+    except NotSupportedError:
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_like_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-17 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_post_id', models.PositiveBigIntegerField(default=0)),
+                ('last_like_id', models.PositiveBigIntegerField(default=0)),
+                ('last_comment_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hot_score', serialize=False, to='posts.post')),
+                ('score', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score', '-post'], name='postscore_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def enqueue_existing_media(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaJob = apps.get_model('posts', 'MediaJob')
+    db = schema_editor.connection.alias
+    posts = Post.objects.using(db).filter(post_type__in=['image', 'video']).values_list('pk', flat=True)
+    MediaJob.objects.using(db).bulk_create((MediaJob(post_id=pk) for pk in posts.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_trending_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('claimed_by', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='media_job', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='mediajob_status_idx')],
+            },
+        ),
+        migrations.RunPython(enqueue_existing_media, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_scored_likes(apps, schema_editor):
+    """Likes the trending refresh already read count as scored"""
+    RankingCheckpoint = apps.get_model('posts', 'RankingCheckpoint')
+    Like = apps.get_model('posts', 'Like')
+    ScoredLike = apps.get_model('posts', 'ScoredLike')
+    db = schema_editor.connection.alias
+    checkpoint = RankingCheckpoint.objects.using(db).filter(name='trending').first()
+    if checkpoint is None:
+        return
+    pairs = Like.objects.using(db).filter(pk__lte=checkpoint.last_like_id).values_list('user_id', 'post_id')
+    ScoredLike.objects.using(db).bulk_create(
+        (ScoredLike(user_id=user_id, post_id=post_id) for user_id, post_id in pairs.iterator()), batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_task_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rankingcheckpoint',
+            name='gaps',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='ScoredLike',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.RunPython(mark_scored_likes, migrations.RunPython.noop),
+    ]
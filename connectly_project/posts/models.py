@@ -1,16 +1,51 @@
 from django.db import models
+from django.db.models import F, Prefetch, Q
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 
 class User(AbstractUser):
     # AbstractUser already provides: username, password, email, first_name, last_name, is_staff, is_active, date_joined
     # We keep created_at for compatibility with existing code
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized so the feed can tell fan-out-on-write authors from fan-out-on-read ones
+    follower_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.username
 
 
+class PostQuerySet(models.QuerySet):
+    def with_comments(self):
+        """Prefetch comments (and their authors) in a single extra query"""
+        return self.prefetch_related(
+            Prefetch('comments', queryset=Comment.objects.select_related('author'))
+        )
+
+    def for_detail(self):
+        """Queryset used by single-post views: author joined in the same query"""
+        return self.select_related('author')
+
+    def for_listing(self):
+        """Queryset used by list views: detail data plus prefetched comments"""
+        return self.for_detail().with_comments()
+
+    def adjust_counters(self, likes=0, comments=0):
+        """
+        Atomically shift the denormalized counters with F() expressions.
+        Call inside the same transaction that inserts or deletes the Like/Comment row.
+        """
+        updates = {}
+        if likes:
+            updates['like_count'] = Greatest(F('like_count') + likes, 0)
+        if comments:
+            updates['comment_count'] = Greatest(F('comment_count') + comments, 0)
+        if not updates:
+            return 0
+        return self.update(**updates)
+
+
 class Post(models.Model):
     POST_TYPES = [
         ('text', 'Text'),
@@ -24,19 +59,22 @@ class Post(models.Model):
     metadata = models.JSONField(default=dict, blank=True)
     author = models.ForeignKey(User, related_name='posts', on_delete=models.CASCADE, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized counters, kept in sync by the like/comment views (see reconcile_counters)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
 
-    def __str__(self):
-        return f"{self.title} by {self.author.username if self.author else 'Unknown'} at {self.created_at}"
+    objects = PostQuerySet.as_manager()
 
-    @property
-    def like_count(self):
-        """Returns the total number of likes for this post"""
-        return self.likes.count()
+    class Meta:
+        indexes = [
+            # Keyset pagination of the news feed: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['created_at', 'id'], name='post_created_id_idx'),
+            # A single author's posts, newest first
+            models.Index(fields=['author', 'created_at'], name='post_author_created_idx'),
+        ]
 
-    @property
-    def comment_count(self):
-        """Returns the total number of comments for this post"""
-        return self.comments.count()
+    def __str__(self):
+        return f"{self.title} by {self.author.username if self.author else 'Unknown'} at {self.created_at}"
 
 
 class Comment(models.Model):
@@ -47,9 +85,16 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']  # Newest comments first
+        indexes = [
+            # Comments of one post, newest first (page-number and keyset pagination)
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_id_idx'),
+            # Global comment listing and a single author's comments, newest first
+            models.Index(fields=['created_at', 'id'], name='comment_created_id_idx'),
+            models.Index(fields=['author', 'created_at'], name='comment_author_created_idx'),
+        ]
 
     def __str__(self):
-        return f"Comment by {self.author.username} on Post {self.post.id}"
+        return f"Comment by {self.author.username} on Post {self.post_id}"
 
 
 class Like(models.Model):
@@ -60,8 +105,163 @@ class Like(models.Model):
 
     class Meta:
         # Ensure a user can only like a post once
-        unique_together = ('user', 'post')
+        unique_together = ('user', 'post')  # Also serves (user, post) lookups
         ordering = ['-created_at']
+        indexes = [
+            # Likes of one post, newest first
+            models.Index(fields=['post', 'created_at'], name='like_post_created_idx'),
+            # created_at range scans (exports)
+            models.Index(fields=['created_at', 'id'], name='like_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} likes {self.post.title}"
+
+
+class Follow(models.Model):
+    """Directed follow edge: `follower` sees posts by `followee` in their home timeline"""
+    follower = models.ForeignKey(User, related_name='following', on_delete=models.CASCADE)
+    followee = models.ForeignKey(User, related_name='followers', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('follower', 'followee')
+        indexes = [
+            # Fan-out on write walks every follower of the post's author
+            models.Index(fields=['followee', 'follower'], name='follow_followee_follower_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower.username} follows {self.followee.username}"
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline row, written when a post is fanned out to a follower.
+    created_at mirrors Post.created_at so a timeline page is one index range read.
+    """
+    owner = models.ForeignKey(User, related_name='timeline_entries', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='timeline_entries', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', 'created_at', 'post'], name='timeline_owner_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.owner_id}'s timeline"
+
+
+class PostScore(models.Model):
+    """
+    Trending score of a post, maintained incrementally by posts/trending.py.
+    Higher is hotter; the index makes the hot feed one range scan.
+    """
+    post = models.OneToOneField(Post, primary_key=True, related_name='hot_score', on_delete=models.CASCADE)
+    score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-post'], name='postscore_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} scores {self.score:.3f}"
+
+
+class RankingCheckpoint(models.Model):
+    """How far the trending refresh has read each event table (last processed primary key)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_post_id = models.PositiveBigIntegerField(default=0)
+    last_like_id = models.PositiveBigIntegerField(default=0)
+    last_comment_id = models.PositiveBigIntegerField(default=0)
+    # Ids below the checkpoints not seen yet, per event kind: {"like": {"<id>": <unix time first missed>}}
+    gaps = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} checkpoint"
+
+
+class ScoredLike(models.Model):
+    """A (user, post) like already counted in the trending scores; liking again after an unlike adds nothing"""
+    user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='+', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('user', 'post')
+
+    def __str__(self):
+        return f"Like of post {self.post_id} by user {self.user_id} scored"
+
+
+class MediaJob(models.Model):
+    """
+    Media metadata processing for an image or video post (posts/media_jobs.py).
+    Pending jobs are claimed by a worker, which sets claimed_by and started_at.
+    """
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    post = models.OneToOneField(Post, related_name='media_job', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest jobs of a status
+            models.Index(fields=['status', 'id'], name='mediajob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Media job for post {self.post_id}: {self.status}"
+
+
+class TaskRun(models.Model):
+    """
+    Run log of the maintenance scheduler (posts/scheduler.py). The constraint
+    allows one running row per task, which is what keeps runs from overlapping
+    across threads and processes.
+    """
+    RUNNING, SUCCEEDED, FAILED, SKIPPED = 'running', 'succeeded', 'failed', 'skipped'
+    STATUSES = [
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (SKIPPED, 'Skipped'),
+    ]
+
+    task = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUSES, default=RUNNING)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # The task's return value (counts of rows processed, ...)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # hostname:pid of the scheduler that ran it
+    host = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task'], condition=Q(status='running'), name='taskrun_one_running'),
+        ]
+        indexes = [
+            # Latest run of each task
+            models.Index(fields=['task', 'started_at'], name='taskrun_task_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} at {self.started_at}: {self.status}"
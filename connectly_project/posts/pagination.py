@@ -0,0 +1,173 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from singletons.config_manager import ConfigManager
+
+
+def keyset_filter(position, created_field='created_at', id_field='id'):
+    """Rows strictly after `position` in (created_at DESC, id DESC) order (or another leading key)"""
+    key, pk = position
+    # The leading range on the key lets the database seek straight into the index
+    return Q(**{f'{created_field}__lte': key}) & (
+        Q(**{f'{created_field}__lt': key}) | Q(**{f'{id_field}__lt': pk})
+    )
+
+
+class ConfigPageSizeMixin:
+    """Default page size read from ConfigManager's DEFAULT_PAGE_SIZE on every request"""
+    _page_size = None
+
+    @property
+    def page_size(self):
+        if self._page_size is not None:
+            return self._page_size
+        return ConfigManager().get_setting('DEFAULT_PAGE_SIZE')
+
+    @page_size.setter
+    def page_size(self, value):
+        # The size chosen for the current request
+        self._page_size = value
+
+
+class KeysetPagination(ConfigPageSizeMixin, BasePagination):
+    """
+    Opaque cursor pagination keyed on (created_at, id), newest first.
+
+    Each page is a single indexed range read: no OFFSET scan and no COUNT(*).
+    Clients opt in with ?pagination=cursor and then follow the `next` link.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    @classmethod
+    def is_requested(cls, request):
+        """Whether the client asked for cursor mode instead of page numbers"""
+        params = request.query_params
+        return cls.cursor_query_param in params or params.get(cls.mode_query_param) == 'cursor'
+
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = queryset.order_by(*self.ordering)
+
+        def fetch(position, limit):
+            page = queryset
+            if position is not None:
+                page = page.filter(self.position_filter(position))
+            return list(page[:limit])
+
+        return self.paginate_fetch(fetch, request)
+
+    def paginate_fetch(self, fetch, request):
+        """
+        Paginate any newest-first source.
+        fetch(position, limit) returns up to `limit` objects with created_at/pk older than `position`.
+        """
+        position = self._start(request)
+        return self._finish(fetch(position, self.page_size + 1))
+
+    async def apaginate_fetch(self, afetch, request):
+        """Async counterpart of paginate_fetch; afetch is awaited"""
+        position = self._start(request)
+        return self._finish(await afetch(position, self.page_size + 1))
+
+    def _start(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        return self.decode_cursor(request)
+
+    def _finish(self, results):
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = self.position(results[-1]) if self.has_next else None
+        return results
+
+    def position(self, obj):
+        """The keyset position of an object: the next page starts after it"""
+        return obj.created_at, obj.pk
+
+    def position_filter(self, position):
+        return keyset_filter(position)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @staticmethod
+    def dump_key(created_at):
+        return created_at.isoformat()
+
+    @staticmethod
+    def load_key(text):
+        return datetime.fromisoformat(text)
+
+    def encode_cursor(self, key, pk):
+        raw = f"{self.dump_key(key)}|{pk}".encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8')
+            key, pk = raw.split('|')
+            return self.load_key(key), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class HotKeysetPagination(KeysetPagination):
+    """
+    Cursor pagination for ?sort=hot, keyed on (score, post id), hottest first.
+    The queryset annotates each post's score as `hot` (see trending.hot_posts);
+    a page is one range scan of postscore_score_idx, with no COUNT(*).
+    """
+    ordering = ('-hot_score__score', '-hot_score__post')
+
+    def position(self, obj):
+        return obj.hot, obj.pk
+
+    def position_filter(self, position):
+        return keyset_filter(position, 'hot_score__score', 'hot_score__post')
+
+    # repr() round-trips a float exactly
+    dump_key = staticmethod(repr)
+    load_key = staticmethod(float)
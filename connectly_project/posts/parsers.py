@@ -0,0 +1,32 @@
+import json
+
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON (one object per line) lazily.
+
+    request.data is a generator, so large uploads are consumed line by line.
+    A line that isn't valid JSON is yielded as a ValueError so callers can
+    report it per item instead of rejecting the whole stream.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        return self._iter_lines(stream, encoding)
+
+    @staticmethod
+    def _iter_lines(stream, encoding):
+        if stream is None:
+            return
+        for line_no, raw in enumerate(stream, start=1):
+            line = raw.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"Invalid JSON on line {line_no}: {e}")
@@ -0,0 +1,108 @@
+"""
+Read-replica routing.
+
+ReplicaRouter sends reads to one of the REPLICA_DATABASES aliases and every
+write to `default`. Reads go to `default` instead when replica lag could show
+a client stale data:
+
+- inside a transaction on `default` (read-modify-write code),
+- once the current request has written anything,
+- for the whole of a request from a client that wrote within the last
+  REPLICA_PIN_SECONDS (read-your-writes; see ReplicaPinningMiddleware),
+- for models in PRIMARY_ONLY_APPS (tokens are used right after login),
+- outside a request: background threads, the scheduler and management
+  commands read back what they just wrote (claimed jobs, checkpoints).
+
+The pinned state lives in a context variable that ReplicaPinningMiddleware
+sets for the duration of each request, so it follows requests into the
+sync_to_async threads of the async views and never outlives them.
+"""
+import contextvars
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Apps whose rows are read right after being written by another request
+PRIMARY_ONLY_APPS = {'authtoken'}
+
+# True/False inside a request (see ReplicaPinningMiddleware); None outside one
+_pinned = contextvars.ContextVar('replica_pinned', default=None)
+
+
+def pin(value=True):
+    """
+    Start a request scope whose reads go to the primary (value=True) or to the
+    replicas until it writes (value=False); returns a token for unpin()
+    """
+    return _pinned.set(value)
+
+
+def unpin(token):
+    _pinned.reset(token)
+
+
+def is_pinned():
+    """Whether the current request reads from the primary (False outside requests)"""
+    return bool(_pinned.get())
+
+
+def _replicas():
+    return settings.REPLICA_DATABASES
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        if (not replicas or _pinned.get() is not False or model._meta.app_label in PRIMARY_ONLY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if _replicas() and _pinned.get() is False:
+            # Later reads in this request must see this write
+            _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in _replicas():
+            return False
+        return None
+
+
+class ReadYourWrites:
+    """Remembers, per client, when it last wrote (cache alias `default`)"""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @staticmethod
+    def client_key(request):
+        """Key for the requesting client: its Authorization header or session cookie; None if anonymous"""
+        credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not credential:
+            return None
+        return 'replica_pin:' + hashlib.sha256(credential.encode('utf-8')).hexdigest()
+
+    def wrote_recently(self, request):
+        key = self.client_key(request)
+        return key is not None and caches[self.alias].get(key) is not None
+
+    def record_write(self, request):
+        key = self.client_key(request)
+        if key is not None:
+            caches[self.alias].set(key, True, settings.REPLICA_PIN_SECONDS)
+
+
+read_your_writes = ReadYourWrites()
@@ -0,0 +1,353 @@
+"""
+Scheduler for periodic maintenance (counter reconciliation, trending refresh,
+search index rebuilds, pruning; see posts/maintenance.py).
+
+Schedules are either intervals ("every 30s", "every 5m", "every 2h",
+"every 1d") or five-field cron expressions in TIME_ZONE ("30 3 * * *",
+"*/15 * * * 1-5", "@daily"). TASKS holds each task's default schedule;
+the SCHEDULED_TASKS entry of ConfigManager overrides it per task name (null
+disables the task) and is re-read on every tick, so schedules can change on a
+running scheduler.
+
+Every run is a TaskRun row. A task is due at the next scheduled time after
+its last run, so a restarted scheduler carries on where the previous one
+stopped, and several schedulers (one per web process with
+SCHEDULER_IN_PROCESS, or `manage.py run_scheduler` on several hosts) share
+the same timetable. Runs never overlap: a unique constraint allows one
+running row per task, and a scheduler that loses the race logs a skipped run.
+A running row older than the task's timeout is taken to belong to a dead
+scheduler and marked failed.
+
+Due tasks run on a pool of SCHEDULER_WORKERS threads, so a long task does not
+hold up the short ones.
+"""
+import atexit
+import os
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from singletons.config_manager import ConfigManager
+from singletons.logger_singleton import LoggerSingleton
+from .models import TaskRun
+from . import maintenance
+
+logger = LoggerSingleton().get_logger()
+
+HOST = f'{socket.gethostname()}:{os.getpid()}'
+DEFAULT_TIMEOUT = 3600
+
+_INTERVAL = re.compile(r'^every\s+(\d+)\s*([smhd]?)$', re.IGNORECASE)
+_INTERVAL_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+}
+
+
+class Interval:
+    """Every `seconds` seconds after the previous run; a task that never ran is due at once"""
+
+    def __init__(self, seconds, spec=None):
+        if seconds < 1:
+            raise ValueError("Interval must be at least one second")
+        self.seconds = seconds
+        self.spec = spec or f'every {seconds}s'
+
+    def first_run(self, since):
+        return since
+
+    def next_after(self, moment):
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return self.spec
+
+
+class Cron:
+    """minute hour day-of-month month day-of-week, evaluated in TIME_ZONE (day-of-week 0 or 7 is Sunday)"""
+
+    # (low, high) of each field
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, spec):
+        self.spec = spec
+        fields = CRON_ALIASES.get(spec.strip().lower(), spec).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron schedule needs 5 fields: {spec!r}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(text, low, high, spec) for text, (low, high) in zip(fields, self.FIELDS)
+        )
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        # As in cron: when both day fields are restricted, either one matching is enough
+        self._day_or_weekday = not fields[2].startswith('*') and not fields[4].startswith('*')
+        # Rejects schedules such as February 30th
+        self.next_after(timezone.now())
+
+    @staticmethod
+    def _parse_field(text, low, high, spec):
+        values = set()
+        for part in text.split(','):
+            span, slash, step = part.partition('/')
+            try:
+                step = int(step) if slash else 1
+                if span == '*':
+                    start, end = low, high
+                elif '-' in span:
+                    start, end = (int(bound) for bound in span.split('-', 1))
+                else:
+                    start = int(span)
+                    end = high if slash else start
+            except ValueError:
+                raise ValueError(f"Invalid cron field {text!r} in {spec!r}")
+            if step < 1 or not low <= start <= end <= high:
+                raise ValueError(f"Invalid cron field {text!r} in {spec!r}")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        return (day or weekday) if self._day_or_weekday else (day and weekday)
+
+    def first_run(self, since):
+        return self.next_after(since)
+
+    def next_after(self, moment):
+        # Walk local wall-clock time, skipping whole months/days/hours that can't match
+        local = timezone.localtime(moment).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        last_year = local.year + 5
+        while local.year <= last_year:
+            if local.month not in self.months:
+                local = (local.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(local):
+                local = local.replace(hour=0, minute=0) + timedelta(days=1)
+            elif local.hour not in self.hours:
+                local = local.replace(minute=0) + timedelta(hours=1)
+            elif local.minute not in self.minutes:
+                local += timedelta(minutes=1)
+            else:
+                return timezone.make_aware(local)
+        raise ValueError(f"Cron schedule never fires: {self.spec!r}")
+
+    def __str__(self):
+        return self.spec
+
+
+@lru_cache(maxsize=64)
+def parse_schedule(spec):
+    """Interval or Cron for a schedule string; raises ValueError if it is invalid"""
+    if not isinstance(spec, str):
+        raise ValueError(f"Schedule must be a string: {spec!r}")
+    match = _INTERVAL.match(spec.strip())
+    if match:
+        return Interval(int(match.group(1)) * _INTERVAL_UNITS[match.group(2).lower()], spec)
+    return Cron(spec)
+
+
+class Task:
+    def __init__(self, name, func, schedule, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.func = func
+        # Default schedule string; SCHEDULED_TASKS may override it
+        self.schedule = schedule
+        # Seconds after which a running row is considered abandoned
+        self.timeout = timeout
+
+
+TASKS = {}
+
+
+def register(name, func, schedule, timeout=DEFAULT_TIMEOUT):
+    """Add a task (or replace one) with its default schedule (None: only run on demand)"""
+    if schedule is not None:
+        parse_schedule(schedule)
+    TASKS[name] = Task(name, func, schedule, timeout)
+
+
+register('refresh_trending', maintenance.refresh_trending, 'every 1m', timeout=600)
+register('process_media', maintenance.process_media, 'every 1m', timeout=1800)
+register('reconcile_counters', maintenance.reconcile_counters, '30 3 * * *')
+# One long transaction that blocks SQLite writers, and the triggers keep the index in sync: on demand only
+register('rebuild_search_index', maintenance.rebuild_search_index, None, timeout=4 * 3600)
+register('prune_task_runs', maintenance.prune_task_runs, '0 5 * * *')
+register('prune_media_jobs', maintenance.prune_media_jobs, '15 5 * * *')
+
+
+def schedules():
+    """{task name: schedule} of the enabled tasks, with SCHEDULED_TASKS applied"""
+    overrides = ConfigManager().get_setting('SCHEDULED_TASKS') or {}
+    result = {}
+    for name, task in TASKS.items():
+        spec = overrides.get(name, task.schedule)
+        if spec is None:
+            continue
+        try:
+            result[name] = parse_schedule(spec)
+        except ValueError as e:
+            logger.error("Task %s is disabled: %s", name, e)
+    return result
+
+
+def last_runs(names=None):
+    """{task name: start time of its latest run} from the run log"""
+    runs = TaskRun.objects.all()
+    if names is not None:
+        runs = runs.filter(task__in=names)
+    return dict(runs.order_by().values_list('task').annotate(last=Max('started_at')))
+
+
+def run_task(name):
+    """
+    Run a task now unless another run of it is in progress. Returns the
+    TaskRun: succeeded, failed, or skipped because of the running one.
+    """
+    task = TASKS[name]
+    now = timezone.now()
+    TaskRun.objects.filter(
+        task=name, status=TaskRun.RUNNING, started_at__lt=now - timedelta(seconds=task.timeout)
+    ).update(status=TaskRun.FAILED, finished_at=now, error=f'Abandoned: still running after {task.timeout}s')
+    try:
+        with transaction.atomic():
+            run = TaskRun.objects.create(task=name, status=TaskRun.RUNNING, started_at=now, host=HOST)
+    except IntegrityError:
+        logger.info("Skipping task %s: the previous run is still in progress", name)
+        return TaskRun.objects.create(
+            task=name, status=TaskRun.SKIPPED, started_at=now, finished_at=now, host=HOST,
+            error='Previous run still in progress',
+        )
+
+    try:
+        run.result = task.func()
+        run.status = TaskRun.SUCCEEDED
+    except Exception as e:
+        logger.exception("Task %s failed", name)
+        run.status, run.error = TaskRun.FAILED, f'{type(e).__name__}: {e}'
+    run.finished_at = timezone.now()
+    # Unless it was declared abandoned meanwhile
+    TaskRun.objects.filter(pk=run.pk, status=TaskRun.RUNNING).update(
+        status=run.status, result=run.result, error=run.error, finished_at=run.finished_at
+    )
+    logger.info("Task %s %s in %.2fs", name, run.status, (run.finished_at - run.started_at).total_seconds())
+    return run
+
+
+class Scheduler:
+    """Submits due tasks to a thread pool; tick() from a loop, or start() a background thread"""
+
+    def __init__(self, workers=None):
+        self._workers = workers
+        self._executor = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.started_at = None
+        atexit.register(self.stop)
+
+    def _executor_for_submit(self):
+        with self._lock:
+            if self._executor is None:
+                workers = self._workers or settings.SCHEDULER_WORKERS
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scheduler')
+            return self._executor
+
+    def next_runs(self, now=None):
+        """{task name: when it is next due} for the enabled tasks"""
+        now = now or timezone.now()
+        if self.started_at is None:
+            self.started_at = now
+        plan = schedules()
+        last = last_runs(plan)
+        return {
+            name: schedule.next_after(last[name]) if name in last else schedule.first_run(self.started_at)
+            for name, schedule in plan.items()
+        }
+
+    def tick(self, now=None):
+        """Submit the tasks that are due and not already running here; returns their names"""
+        now = now or timezone.now()
+        submitted = []
+        for name, due in self.next_runs(now).items():
+            with self._lock:
+                if due > now or name in self._inflight:
+                    continue
+            future = self._executor_for_submit().submit(self._run, name)
+            with self._lock:
+                self._inflight[name] = future
+            future.add_done_callback(lambda _, name=name: self._done(name))
+            submitted.append(name)
+        return submitted
+
+    def _done(self, name):
+        with self._lock:
+            self._inflight.pop(name, None)
+
+    @staticmethod
+    def _run(name):
+        try:
+            return run_task(name)
+        finally:
+            # Pool threads outlive the task; don't leave their connections open
+            connections.close_all()
+
+    def wait(self):
+        """Block until the submitted tasks have finished"""
+        with self._lock:
+            futures = list(self._inflight.values())
+        for future in futures:
+            future.result()
+
+    def start(self):
+        """Tick every SCHEDULER_POLL_INTERVAL seconds in a background thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.tick()
+                except Exception:
+                    logger.exception("Scheduler tick failed")
+                close_old_connections()
+                self._stop.wait(settings.SCHEDULER_POLL_INTERVAL)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        """Stop ticking and wait for the running tasks"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+            self._thread = None
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+scheduler = Scheduler()
+
+
+def start_in_process():
+    """Called by wsgi.py/asgi.py: run the scheduler inside the web process when SCHEDULER_IN_PROCESS is set"""
+    if settings.SCHEDULER_IN_PROCESS:
+        scheduler.start()
@@ -0,0 +1,228 @@
+"""
+Full-text search over Post.title/content and Comment.text.
+
+SQLite: FTS5 external-content tables (posts_post_fts, posts_comment_fts) that
+triggers on the base tables keep in sync on every INSERT, DELETE and UPDATE of
+the indexed columns, so bulk_create() and raw SQL writes are indexed too.
+Results are ranked with bm25() (post titles weigh more than bodies).
+
+PostgreSQL: GIN indexes on to_tsvector() of the same columns, ranked with
+ts_rank(). Nothing to keep in sync: the index is maintained by PostgreSQL.
+
+Queries are parsed into plain terms that must all match; a trailing `*` makes
+a term a prefix (`djang*`). Lookups go through the inverted index, so their cost
+depends on the number of matches, not the size of the tables.
+
+install() runs from migration 0008. Rebuilding a table in a later migration
+(which SQLite does for most ALTERs) drops its triggers, so after every
+`migrate` a post_migrate handler re-creates missing index tables and triggers
+and rebuilds the index from the base tables.
+
+A SQLite build without FTS5 raises NotSupportedError (the migration goes on
+without the index and /posts/search/ answers 501).
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import NotSupportedError, OperationalError, connections, router, transaction
+from django.db.migrations.recorder import MigrationRecorder
+
+from singletons.logger_singleton import LoggerSingleton
+from .models import Comment, Post
+
+logger = LoggerSingleton().get_logger()
+
+KINDS = ('posts', 'comments')
+INSTALL_MIGRATION = ('posts', '0008_search_index')
+MAX_TERMS = 10
+_TERM = re.compile(r'\w+\*?')
+
+# kind -> (base table, indexed columns, FTS5 bm25 weights)
+_SQLITE_INDEXES = {
+    'posts': ('posts_post', ('title', 'content'), (10.0, 1.0)),
+    'comments': ('posts_comment', ('text',), (1.0,)),
+}
+# kind -> (base table, tsvector expression, GIN index name)
+_POSTGRES_INDEXES = {
+    'posts': ('posts_post', "to_tsvector('english', title || ' ' || content)", 'posts_post_search_idx'),
+    'comments': ('posts_comment', "to_tsvector('english', text)", 'posts_comment_search_idx'),
+}
+
+
+def parse_query(text):
+    """[(term, is_prefix), ...] from free text; punctuation and FTS operators are dropped"""
+    terms = []
+    for match in _TERM.findall(text or '')[:MAX_TERMS]:
+        prefix = match.endswith('*')
+        terms.append((match.rstrip('*').lower(), prefix))
+    return terms
+
+
+@contextmanager
+def _fts5_required():
+    # "no such module: fts5" when creating the index, "no such table: ..._fts" when it couldn't be
+    try:
+        yield
+    except OperationalError as e:
+        if 'fts5' not in str(e) and '_fts' not in str(e):
+            raise
+        raise NotSupportedError("Full-text search needs SQLite with FTS5") from e
+
+
+class SQLiteSearch:
+    TRIGGERS = ('ai', 'ad', 'au')
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def installed(self):
+        """Whether every index table and sync trigger exists"""
+        expected = set()
+        for table, _, _ in _SQLITE_INDEXES.values():
+            expected.add(f'{table}_fts')
+            expected.update(f'{table}_fts_{suffix}' for suffix in self.TRIGGERS)
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+            return expected <= {name for name, in cursor.fetchall()}
+
+    def ensure_installed(self):
+        """Re-create what is missing (say, triggers dropped with a rebuilt table); True if it had to"""
+        if self.installed():
+            return False
+        self.install()
+        return True
+
+    def install(self):
+        with self.connection.cursor() as cursor, _fts5_required():
+            for table, columns, _ in _SQLITE_INDEXES.values():
+                fts = f'{table}_fts'
+                cols = ', '.join(columns)
+                new = ', '.join(f'new.{column}' for column in columns)
+                old = ', '.join(f'old.{column}' for column in columns)
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{cols}, content='{table}', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+                )
+                # Only the indexed columns: counter updates on posts_post don't touch the index
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+                    f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+                )
+        self.rebuild()
+
+    def uninstall(self):
+        with self.connection.cursor() as cursor:
+            for table, _, _ in _SQLITE_INDEXES.values():
+                for suffix in self.TRIGGERS:
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            for table, _, _ in _SQLITE_INDEXES.values():
+                cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+                cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('optimize')")
+
+    def search(self, kind, terms, limit, offset=0):
+        table, columns, weights = _SQLITE_INDEXES[kind]
+        fts = f'{table}_fts'
+        match = ' '.join('"{}"{}'.format(term, '*' if prefix else '') for term, prefix in terms)
+        bm25 = f"bm25({fts}, {', '.join(str(weight) for weight in weights)})"
+        sql = (
+            f"SELECT rowid, snippet({fts}, -1, '[', ']', '...', 12), {bm25} FROM {fts} "
+            f"WHERE {fts} MATCH %s ORDER BY {bm25} LIMIT %s OFFSET %s"
+        )
+        with self.connection.cursor() as cursor, _fts5_required():
+            cursor.execute(sql, [match, limit, offset])
+            # bm25() is lower for better matches; report higher-is-better scores
+            return [(pk, snippet, -score) for pk, snippet, score in cursor.fetchall()]
+
+
+class PostgresSearch:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def install(self):
+        with self.connection.cursor() as cursor:
+            for table, vector, index in _POSTGRES_INDEXES.values():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} USING GIN (({vector}))")
+
+    def ensure_installed(self):
+        # CREATE INDEX IF NOT EXISTS; PostgreSQL keeps existing indexes current
+        self.install()
+        return False
+
+    def uninstall(self):
+        with self.connection.cursor() as cursor:
+            for _, _, index in _POSTGRES_INDEXES.values():
+                cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            for _, _, index in _POSTGRES_INDEXES.values():
+                cursor.execute(f"REINDEX INDEX {index}")
+
+    def search(self, kind, terms, limit, offset=0):
+        table, vector, _ = _POSTGRES_INDEXES[kind]
+        query = ' & '.join(term + (':*' if prefix else '') for term, prefix in terms)
+        document = 'title || \' \' || content' if kind == 'posts' else 'text'
+        sql = (
+            f"SELECT id, ts_headline('english', {document}, q, 'StartSel=[, StopSel=], MaxFragments=1'), "
+            f"ts_rank({vector}, q) AS score FROM {table}, to_tsquery('english', %s) q "
+            f"WHERE {vector} @@ q ORDER BY score DESC LIMIT %s OFFSET %s"
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [query, limit, offset])
+            return cursor.fetchall()
+
+
+_BACKENDS = {'sqlite': SQLiteSearch, 'postgresql': PostgresSearch}
+
+
+def backend(connection):
+    try:
+        return _BACKENDS[connection.vendor](connection)
+    except KeyError:
+        raise NotSupportedError(f"Full-text search is not available on {connection.vendor}")
+
+
+def search(kind, text, limit=20, offset=0):
+    """
+    Ranked matches of `text` among posts or comments: a list of
+    (object, snippet with [matches] marked, score), best first.
+    """
+    terms = parse_query(text)
+    if not terms:
+        return []
+    model = Post if kind == 'posts' else Comment
+    connection = connections[router.db_for_read(model)]
+    hits = backend(connection).search(kind, terms, limit, offset)
+    queryset = Post.objects.for_detail() if kind == 'posts' else Comment.objects.select_related('author')
+    objects = queryset.using(connection.alias).in_bulk([pk for pk, _, _ in hits])
+    # A row deleted between the two queries is skipped
+    return [(objects[pk], snippet, score) for pk, snippet, score in hits if pk in objects]
+
+
+def reinstall_after_migrate(sender, using, **kwargs):
+    """post_migrate: repair the index of `using` once migration 0008 is applied"""
+    connection = connections[using]
+    if not router.allow_migrate_model(using, Post):
+        return
+    if INSTALL_MIGRATION not in MigrationRecorder(connection).applied_migrations():
+        return
+    try:
+        with transaction.atomic(using=using):
+            if backend(connection).ensure_installed():
+                logger.warning("Search index on %s was incomplete (dropped triggers?); re-installed and rebuilt", using)
+    except NotSupportedError:
+        pass  # /posts/search/ reports it as unavailable
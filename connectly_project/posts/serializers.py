@@ -1,34 +1,170 @@
 from rest_framework import serializers
 from .models import User, Post, Comment, Like
+from .metrics import serializer_timer
+from . import likes
 
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedDataMixin:
+    """Record the time spent producing .data as the request's serializer time"""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class InstrumentedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class InstrumentedModelSerializer(TimedDataMixin, serializers.ModelSerializer):
+    pass
+
+
+# What ?expand=post embeds in a comment
+EMBEDDED_POST_FIELDS = ['id', 'title', 'like_count', 'comment_count']
+
+
+def sparse_fieldset(request):
+    """The `fields` / `expand` serializer arguments requested with ?fields=a,b and ?expand=c"""
+    def names(param):
+        return [name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()]
+    return {'fields': names('fields') or None, 'expand': names('expand')}
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets for model serializers.
+
+    fields=[...] keeps only those fields; expand=[...] adds the Meta.expandable
+    fields (factories of nested serializers or related lists) that are left out
+    by default. List output (many=True) is compact: Meta.compact_exclude fields
+    are dropped unless requested.
+
+    narrow() applies the same selection to a queryset: only the columns the
+    selected fields read (Meta.field_paths, default: the field's own name) are
+    loaded, and joins/prefetches (Meta.prefetch) happen only when needed.
+    """
+
+    def __init__(self, *args, fields=None, expand=(), compact=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable = getattr(self.Meta, 'expandable', {})
+        names = self.select_fields(fields, expand, compact)
+        for name in expand:
+            self.fields[name] = expandable[name]()
+        for name in list(self.fields):
+            if name not in names:
+                self.fields.pop(name)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs.setdefault('compact', True)
+        return super().many_init(*args, **kwargs)
+
+    @classmethod
+    def select_fields(cls, fields=None, expand=(), compact=False):
+        """Names of the fields to output; unknown names are a ValidationError (400)"""
+        meta = cls.Meta
+        expandable = getattr(meta, 'expandable', {})
+        errors = {}
+        unknown = sorted(set(expand) - expandable.keys())
+        if unknown:
+            errors['expand'] = [f"Unknown: {', '.join(unknown)}. Expandable: {', '.join(expandable) or 'none'}"]
+        if fields:
+            unknown = sorted(set(fields) - set(meta.fields) - expandable.keys())
+            if unknown:
+                available = [*meta.fields, *(name for name in expandable if name not in meta.fields)]
+                errors['fields'] = [f"Unknown: {', '.join(unknown)}. Available: {', '.join(available)}"]
+            names = [name for name in meta.fields if name in fields]
+        else:
+            excluded = set(getattr(meta, 'compact_exclude', ())) if compact else set()
+            names = [name for name in meta.fields if name not in excluded]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return names + [name for name in expand if name not in names]
+
+    @classmethod
+    def narrow(cls, queryset, fields=None, expand=(), compact=True):
+        """`queryset` restricted with .only() / select_related / prefetch to what the output reads"""
+        names = cls.select_fields(fields, expand, compact)
+        paths = getattr(cls.Meta, 'field_paths', {})
+        expanded_paths = getattr(cls.Meta, 'expanded_paths', {})
+        prefetches = getattr(cls.Meta, 'prefetch', {})
+        model = cls.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+
+        only = {model._meta.pk.name, *getattr(cls.Meta, 'required_paths', ())}
+        for name in names:
+            if name in expand and name in expanded_paths:
+                only.update(expanded_paths[name])
+            else:
+                only.update(paths.get(name, (name,) if name in concrete else ()))
+        related = {path.rsplit('__', 1)[0] for path in only if '__' in path}
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if related:
+            # The foreign keys themselves must be loaded to follow them
+            queryset = queryset.select_related(*related)
+            only |= related
+        for name in names:
+            if name in prefetches:
+                queryset = getattr(queryset, prefetches[name])()
+        return queryset.only(*only)
+
+
+class UserSerializer(SparseFieldsMixin, InstrumentedModelSerializer):
     class Meta:
+        list_serializer_class = InstrumentedListSerializer
         model = User
         fields = ['id', 'username', 'email', 'created_at']  # Exclude sensitive fields like password
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsMixin, InstrumentedModelSerializer):
     comments = serializers.StringRelatedField(many=True, read_only=True)
-    like_count = serializers.IntegerField(read_only=True)
+    like_count = serializers.SerializerMethodField()
     comment_count = serializers.IntegerField(read_only=True)
     author_username = serializers.CharField(source='author.username', read_only=True)
 
     class Meta:
+        list_serializer_class = InstrumentedListSerializer
         model = Post
         fields = ['id', 'title', 'content', 'post_type', 'metadata', 'author', 'author_username', 
                   'created_at', 'like_count', 'comment_count', 'comments']
+        # Feed and list pages leave the comments out unless ?expand=comments
+        compact_exclude = ['comments']
+        expandable = {
+            'comments': lambda: serializers.StringRelatedField(many=True, read_only=True),
+            'author': lambda: UserSerializer(read_only=True),
+        }
+        field_paths = {'author_username': ('author__username',)}
+        expanded_paths = {'author': tuple(f'author__{name}' for name in UserSerializer.Meta.fields)}
+        required_paths = ('created_at',)  # keyset cursors
+        prefetch = {'comments': 'with_comments'}
+
+    def get_like_count(self, post):
+        return likes.like_count(post)
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, InstrumentedModelSerializer):
     author_username = serializers.CharField(source='author.username', read_only=True)
     post_title = serializers.CharField(source='post.title', read_only=True)
     text = serializers.CharField(required=True, allow_blank=True)  # Allow blank so custom validation runs
 
     class Meta:
+        list_serializer_class = InstrumentedListSerializer
         model = Comment
         fields = ['id', 'text', 'author', 'author_username', 'post', 'post_title', 'created_at']
         read_only_fields = ['author', 'created_at']
+        expandable = {
+            'author': lambda: UserSerializer(read_only=True),
+            'post': lambda: PostSerializer(read_only=True, fields=EMBEDDED_POST_FIELDS),
+        }
+        field_paths = {'author_username': ('author__username',), 'post_title': ('post__title',)}
+        expanded_paths = {
+            'author': tuple(f'author__{name}' for name in UserSerializer.Meta.fields),
+            'post': tuple(f'post__{name}' for name in ('id', 'title', 'like_count', 'comment_count')),
+        }
+        required_paths = ('created_at',)
 
     def validate_text(self, value):
         """Ensure comment text is not empty or only whitespace"""
@@ -42,11 +178,12 @@ class CommentSerializer(serializers.ModelSerializer):
         return value
 
 
-class LikeSerializer(serializers.ModelSerializer):
+class LikeSerializer(InstrumentedModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
     post_title = serializers.CharField(source='post.title', read_only=True)
 
     class Meta:
+        list_serializer_class = InstrumentedListSerializer
         model = Like
         fields = ['id', 'user', 'user_username', 'post', 'post_title', 'created_at']
         read_only_fields = ['user', 'created_at']
@@ -0,0 +1,68 @@
+"""
+Domain events for the posts app.
+
+Write paths call the notify_* helpers; the signals are sent only once the
+surrounding transaction commits, so receivers never observe rolled-back rows.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .cache import response_cache
+from .like_buffer import like_buffer
+from .models import Post, Comment, User
+
+# Sent with posts=[Post, ...] after new posts are committed
+posts_created = Signal()
+# Sent with post_id=<int> and kind='like' | 'unlike' | 'comment' after a like/comment change is committed
+post_interaction = Signal()
+
+
+def notify_posts_created(posts):
+    posts = list(posts)
+    transaction.on_commit(lambda: posts_created.send(sender=Post, posts=posts))
+
+
+def notify_interaction(post_id, kind):
+    transaction.on_commit(lambda: post_interaction.send(sender=Post, post_id=post_id, kind=kind))
+
+
+@receiver(posts_created)
+def invalidate_feed_on_create(sender, posts, **kwargs):
+    response_cache.invalidate_feed()
+
+
+@receiver(post_interaction)
+def invalidate_post_on_interaction(sender, post_id, kind, **kwargs):
+    response_cache.invalidate_post(post_id)
+    # Feed pages show like and comment counts too
+    response_cache.invalidate_feed()
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_on_post_delete(sender, instance, **kwargs):
+    response_cache.invalidate_post(instance.pk)
+    response_cache.invalidate_feed()
+    like_buffer.forget(instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_on_comment_delete(sender, instance, **kwargs):
+    response_cache.invalidate_post(instance.post_id)
+    response_cache.invalidate_feed()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_on_delete(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_tokens_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    # Deactivation, permission or profile changes must not be served from the token cache.
+    # Logins only touch last_login, which nothing reads from request.user.
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    token_cache.invalidate_user(instance.pk)
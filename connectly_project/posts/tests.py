@@ -1,8 +1,53 @@
-from django.test import TestCase, override_settings
+from io import StringIO
+import contextvars
+import csv
+import importlib
+import json
+import logging
+import os
+import queue
+import tempfile
+import re
+import sqlite3
+import threading
+import time
+import types
+from datetime import timedelta
+from unittest import mock, skipUnless
+from asgiref.sync import sync_to_async
+from django.contrib.auth import user_login_failed
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import OperationalError, connection, connections, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import include, path
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase, APIClient
 from rest_framework.authtoken.models import Token
 from rest_framework import status
-from .models import Post, User
+from .models import (
+    Post, User, Comment, Like, Follow, TimelineEntry, PostScore, RankingCheckpoint, MediaJob, TaskRun,
+)
+from .authentication import token_cache
+from .cache import response_cache
+from .like_buffer import like_buffer
+from .middleware import ReplicaPinningMiddleware
+from . import (
+    benchmarking, likes, login, media, media_jobs, metrics, routers, scheduler, search, throttling, trending,
+    urls as posts_urls, views,
+)
+from .async_views import async_urlpatterns
+from connectly_project import settings as project_settings
+from singletons.config_manager import ConfigManager
+from singletons.logger_singleton import (
+    BatchedStreamHandler, BatchingQueueListener, JsonFormatter, LazyQueueHandler, LoggerSingleton, SamplingFilter,
+)
 from factories.post_factory import PostFactory
 
 
@@ -231,3 +276,2159 @@ class CreatePostViewTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['post_type'], 'text')
 
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostListingQueryCountTestCase(APITestCase):
+    """Listing endpoints must run a fixed number of queries regardless of page size"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='reader', password='readpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        for i in range(30):
+            post = PostFactory.create_post(post_type='text', title=f'Post {i}', content='Body', author=self.user)
+            Like.objects.create(user=self.user, post=post)
+            Comment.objects.create(text=f'Comment {i}', author=self.user, post=post)
+            Post.objects.filter(pk=post.pk).adjust_counters(likes=1, comments=1)
+
+    def test_feed_query_count_is_constant(self):
+        """Test that the news feed query count doesn't grow with the page size"""
+        self.client.get('/posts/feed/?page_size=1')
+        # pagination count and page of posts (the token lookup is cached by now)
+        with self.assertNumQueries(2):
+            response = self.client.get('/posts/feed/?page_size=5')
+        self.assertEqual(len(response.data['results']), 5)
+        with self.assertNumQueries(2):
+            response = self.client.get('/posts/feed/?page_size=25')
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertEqual(response.data['results'][0]['like_count'], 1)
+        self.assertEqual(response.data['results'][0]['comment_count'], 1)
+        # plus one query for the prefetched comments
+        with self.assertNumQueries(3):
+            response = self.client.get('/posts/feed/?page_size=25&expand=comments')
+        self.assertEqual(len(response.data['results'][0]['comments']), 1)
+
+    def test_post_list_query_count_is_constant(self):
+        """Test that listing every post runs token lookup and posts queries only (comments on request)"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/posts/')
+        self.assertEqual(len(response.data), 30)
+        # posts and prefetched comments (the token lookup is cached by now)
+        with self.assertNumQueries(2):
+            response = self.client.get('/posts/?expand=comments')
+        self.assertEqual(len(response.data[0]['comments']), 1)
+
+    def test_post_detail_counts(self):
+        """Test that post detail returns counts in a single post query"""
+        post = Post.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/posts/{post.id}/')
+        self.assertEqual(response.data['like_count'], 1)
+        self.assertEqual(response.data['comment_count'], 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostCounterTestCase(APITestCase):
+    """Test cases for the denormalized like/comment counters on Post"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='counter', password='counterpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = PostFactory.create_post(post_type='text', title='Counted', author=self.user)
+
+    def test_like_and_unlike_update_like_count(self):
+        """Test that liking and unliking keeps like_count in sync"""
+        self.client.post(f'/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        # A duplicate like must not bump the counter
+        response = self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        self.client.delete(f'/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comment_endpoints_update_comment_count(self):
+        """Test that both comment endpoints bump comment_count"""
+        self.client.post(f'/posts/{self.post.id}/comment/', {'text': 'First'}, format='json')
+        self.client.post('/posts/comments/', {'text': 'Second', 'post': self.post.id}, format='json')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+    def test_reconcile_counters_fixes_drift(self):
+        """Test that the reconcile_counters command repairs drifted counters"""
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=3)
+
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.post.comment_count, 0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class KeysetPaginationTestCase(APITestCase):
+    """Test cases for ?pagination=cursor on the feed and comment lists"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='scroller', password='scrollpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.posts = [
+            PostFactory.create_post(post_type='text', title=f'Post {i}', author=self.user)
+            for i in range(7)
+        ]
+
+    def _walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_feed_cursor_walk_returns_every_post_once(self):
+        """Test that following `next` links visits each post exactly once, newest first"""
+        seen = self._walk('/posts/feed/?pagination=cursor&page_size=3')
+        self.assertEqual(seen, [post.id for post in reversed(self.posts)])
+
+    def test_feed_cursor_page_skips_count_query(self):
+        """Test that a cursor page runs the page query only (token lookup cached)"""
+        first = self.client.get('/posts/feed/?pagination=cursor&page_size=2')
+        with self.assertNumQueries(1):
+            self.client.get(first.data['next'])
+
+    def test_comments_cursor_walk(self):
+        """Test cursor pagination of a post's comments"""
+        post = self.posts[0]
+        comments = [Comment.objects.create(text=f'c{i}', author=self.user, post=post) for i in range(5)]
+        seen = self._walk(f'/posts/{post.id}/comments/?pagination=cursor&page_size=2')
+        self.assertEqual(seen, [comment.id for comment in reversed(comments)])
+
+    def test_invalid_cursor_returns_404(self):
+        """Test that a tampered cursor is rejected"""
+        response = self.client.get('/posts/feed/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+@override_settings(SECURE_SSL_REDIRECT=False)
+class QueryPlanTestCase(APITestCase):
+    """Every query issued by the read views must be served from an index"""
+
+    # Plan rows like "SCAN posts_post" (no USING ...) mean a full table scan
+    FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='planner', password='planpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        for i in range(5):
+            self.post = PostFactory.create_post(post_type='text', title=f'Post {i}', author=self.user)
+            Comment.objects.create(text=f'Comment {i}', author=self.user, post=self.post)
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedQueries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for query in ctx.captured_queries:
+            plan = self._plan(query['sql'])
+            for step in plan:
+                self.assertIsNone(self.FULL_SCAN.match(step), f"Full table scan for {url}: {query['sql']}\n{plan}")
+            if 'ORDER BY' in query['sql'] and 'LIMIT' in query['sql']:
+                # A page of results must be read in index order, not sorted afterwards
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f"Sort without index for {url}: {query['sql']}")
+        return response
+
+    def test_news_feed_page_number(self):
+        """Test the page-number feed reads posts in index order"""
+        self.assertIndexedQueries('/posts/feed/?page=1&page_size=2')
+
+    def test_news_feed_cursor(self):
+        """Test the first and a follow-up cursor page of the feed"""
+        response = self.assertIndexedQueries('/posts/feed/?pagination=cursor&page_size=2')
+        self.assertIndexedQueries(response.data['next'])
+
+    def test_post_detail(self):
+        """Test post detail looks the post up by primary key"""
+        self.assertIndexedQueries(f'/posts/{self.post.id}/')
+
+    def test_post_comments_page_number(self):
+        """Test a page of one post's comments uses the (post, created_at, id) index"""
+        self.assertIndexedQueries(f'/posts/{self.post.id}/comments/?page=1')
+
+    def test_post_comments_cursor(self):
+        """Test cursor pagination of one post's comments"""
+        self.assertIndexedQueries(f'/posts/{self.post.id}/comments/?pagination=cursor')
+
+    def test_comment_list(self):
+        """Test the global comment list reads comments in index order"""
+        self.assertIndexedQueries('/posts/comments/')
+
+    def test_following_feed(self):
+        """Test a home timeline page is a range read on the timeline index"""
+        self.assertIndexedQueries('/posts/feed/?scope=following&page_size=2')
+
+    def test_like_lookup(self):
+        """Test that the (user, post) like lookup uses the unique index"""
+        queryset = Like.objects.filter(user=self.user, post=self.post)
+        plan = self._plan(str(queryset.query))
+        self.assertTrue(any('USING' in step and 'INDEX' in step for step in plan), plan)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class HomeTimelineTestCase(APITestCase):
+    """Test cases for follows, fan-out on write and the ?scope=following feed"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='follower', password='followpass123')
+        self.author = User.objects.create_user(username='author', password='authorpass123')
+        self.stranger = User.objects.create_user(username='stranger', password='strangerpass123')
+        self.token = Token.objects.create(user=self.reader)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.config = ConfigManager()
+
+    def tearDown(self):
+        self.config.clear_setting('FANOUT_FOLLOWER_LIMIT')
+
+    def _feed_ids(self, url='/posts/feed/?scope=following&page_size=2'):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_follow_backfills_and_fans_out_new_posts(self):
+        """Test that following copies recent posts and new posts are pushed on create"""
+        old = PostFactory.create_post(post_type='text', title='Before follow', author=self.author)
+        response = self.client.post(f'/posts/users/{self.author.id}/follow/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        new = PostFactory.create_post(post_type='text', title='After follow', author=self.author)
+        PostFactory.create_post(post_type='text', title='Not followed', author=self.stranger)
+
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post=new).exists())
+        self.assertEqual(self._feed_ids(), [new.id, old.id])
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, 1)
+
+    def test_posts_created_through_the_api_are_fanned_out(self):
+        """Test that POST /posts/ pushes the post into the followers' home timelines"""
+        self.client.post(f'/posts/users/{self.author.id}/follow/')
+        author_client = APIClient()
+        author_client.force_authenticate(user=self.author)
+        response = author_client.post('/posts/', {
+            'title': 'Via the API', 'content': 'Hello', 'post_type': 'text', 'metadata': {}, 'author': self.author.id,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._feed_ids(), [response.data['id']])
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.author, post_id=response.data['id']).exists())
+
+    def test_popular_authors_are_merged_on_read(self):
+        """Test that authors above the fan-out limit are pulled into the feed at read time"""
+        self.client.post(f'/posts/users/{self.author.id}/follow/')
+        mine = PostFactory.create_post(post_type='text', title='Mine', author=self.reader)
+        self.config.set_setting('FANOUT_FOLLOWER_LIMIT', 0)
+        celebrity = PostFactory.create_post(post_type='text', title='Viral', author=self.author)
+
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader, post=celebrity).exists())
+        self.assertEqual(self._feed_ids(), [celebrity.id, mine.id])
+
+    def test_unfollow_removes_timeline_entries(self):
+        """Test that unfollowing drops the author's posts from the home timeline"""
+        self.client.post(f'/posts/users/{self.author.id}/follow/')
+        PostFactory.create_post(post_type='text', title='Gone soon', author=self.author)
+        response = self.client.delete(f'/posts/users/{self.author.id}/follow/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._feed_ids(), [])
+        self.assertFalse(Follow.objects.exists())
+
+    def test_cannot_follow_twice_or_self(self):
+        """Test duplicate and self follows are rejected"""
+        self.client.post(f'/posts/users/{self.author.id}/follow/')
+        response = self.client.post(f'/posts/users/{self.author.id}/follow/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(f'/posts/users/{self.reader.id}/follow/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ResponseCacheTestCase(APITestCase):
+    """Test cases for the versioned response cache on detail, feed and comment pages"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        response_cache.reset_stats()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cached', password='cachedpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = PostFactory.create_post(post_type='text', title='Popular', author=self.user)
+
+    def test_second_read_is_served_from_cache(self):
+        """Test that repeated reads don't touch the database (token lookup cached too)"""
+        for url in [f'/posts/{self.post.id}/', f'/posts/{self.post.id}/comments/', '/posts/feed/']:
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+
+    def test_like_and_comment_invalidate_post_detail(self):
+        """Test that likes and comments bump the post version"""
+        self.client.get(f'/posts/{self.post.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(self.client.get(f'/posts/{self.post.id}/').data['like_count'], 1)
+
+        self.client.get(f'/posts/{self.post.id}/comments/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/posts/{self.post.id}/comment/', {'text': 'Fresh'}, format='json')
+        self.assertEqual(self.client.get(f'/posts/{self.post.id}/comments/').data['count'], 1)
+
+    def test_likes_and_comments_invalidate_the_feed(self):
+        """Test that feed pages, which embed the counts, are not served stale after interactions"""
+        self.assertEqual(self.client.get('/posts/feed/').data['results'][0]['like_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(self.client.get('/posts/feed/').data['results'][0]['like_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/posts/{self.post.id}/comment/', {'text': 'Counted'}, format='json')
+        self.assertEqual(self.client.get('/posts/feed/').data['results'][0]['comment_count'], 1)
+
+    def test_evicted_versions_do_not_revive_stale_entries(self):
+        """Test a version evicted from the LRU restarts at a value no cached entry was keyed on"""
+        self.assertEqual(self.client.get(f'/posts/{self.post.id}/').data['like_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(self.client.get(f'/posts/{self.post.id}/').data['like_count'], 1)
+
+        caches['responses'].delete(f'post:{self.post.id}:v')
+        self.assertEqual(self.client.get(f'/posts/{self.post.id}/').data['like_count'], 1)
+
+    def test_new_post_invalidates_feed(self):
+        """Test that creating a post starts a new feed generation"""
+        self.assertEqual(self.client.get('/posts/feed/').data['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            PostFactory.create_post(post_type='text', title='Newer', author=self.user)
+        self.assertEqual(self.client.get('/posts/feed/').data['count'], 2)
+
+    def test_stats_endpoint_is_admin_only(self):
+        """Test that hit-rate counters are exposed to staff users only"""
+        self.client.get(f'/posts/{self.post.id}/')
+        self.client.get(f'/posts/{self.post.id}/')
+        response = self.client.get('/posts/cache/stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/posts/cache/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['endpoints']['detail'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkCreatePostsTestCase(APITestCase):
+    """Test cases for PostFactory.create_posts and the /posts/bulk/ endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='importer', password='importpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_create_posts_writes_in_batches(self):
+        """Test that the INSERT count depends on the batch size, not the item count"""
+        items = ({'title': f'Imported {i}'} for i in range(20))
+        with CaptureQueriesContext(connection) as ctx:
+            created, errors = PostFactory.create_posts(items, author=self.user, batch_size=10)
+        self.assertEqual(len(created), 20)
+        self.assertEqual(errors, [])
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "posts_post"')]
+        self.assertEqual(len(inserts), 2)
+        self.assertTrue(all(post.pk for post in created))
+
+    def test_create_posts_reports_errors_per_item(self):
+        """Test that invalid items are skipped and reported with their index"""
+        items = [
+            {'title': 'Fine'},
+            {'post_type': 'image', 'title': 'No size'},
+            {'content': 'No title'},
+            'not an object',
+            {'post_type': 'video', 'title': 'Clip', 'metadata': {'duration': 30}},
+        ]
+        created, errors = PostFactory.create_posts(items, author=self.user)
+        self.assertEqual([post.title for post in created], ['Fine', 'Clip'])
+        self.assertEqual([error['index'] for error in errors], [1, 2, 3])
+        self.assertIn('file_size', errors[0]['error'])
+        self.assertIn('title', errors[1]['error'])
+
+    def test_bulk_endpoint_accepts_json_array(self):
+        """Test bulk creation from a JSON array"""
+        data = [{'title': 'One'}, {'title': 'Two', 'post_type': 'bogus'}]
+        response = self.client.post('/posts/bulk/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'], [{'index': 1, 'error': 'Invalid post type'}])
+        self.assertEqual(Post.objects.get(id=response.data['post_ids'][0]).author, self.user)
+
+    def test_bulk_endpoint_accepts_ndjson(self):
+        """Test bulk creation from an NDJSON stream with a malformed line"""
+        body = '{"title": "Line one"}\n{not json}\n\n{"title": "Line three"}\n'
+        response = self.client.post('/posts/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertIn('Invalid JSON on line 2', response.data['errors'][0]['error'])
+
+    def test_bulk_endpoint_rejects_object_payload(self):
+        """Test that a single JSON object is rejected"""
+        response = self.client.post('/posts/bulk/', {'title': 'Alone'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StreamingExportTestCase(APITestCase):
+    """Test cases for the streaming NDJSON/CSV exports"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='exporter', password='exportpass123', is_staff=True)
+        self.token = Token.objects.create(user=self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.posts = [PostFactory.create_post(post_type='text', title=f'Export {i}', author=self.admin) for i in range(3)]
+        Comment.objects.create(text='Exported comment', author=self.admin, post=self.posts[0])
+
+    def _body(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_export_of_posts(self):
+        """Test posts are streamed one JSON object per line, oldest first"""
+        response = self.client.get('/posts/export/posts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in self._body(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [post.id for post in self.posts])
+
+    def test_csv_export_with_date_range(self):
+        """Test CSV output and that the created_at range filter is applied"""
+        response = self.client.get('/posts/export/comments/?output=csv&since=2000-01-01')
+        rows = list(csv.reader(self._body(response).splitlines()))
+        self.assertEqual(rows[0], ['id', 'text', 'author_id', 'post_id', 'created_at'])
+        self.assertEqual(rows[1][1], 'Exported comment')
+
+        response = self.client.get('/posts/export/comments/?until=2000-01-01')
+        self.assertEqual(self._body(response), '')
+
+    def test_export_validation_and_permissions(self):
+        """Test bad parameters are rejected and non-staff users are forbidden"""
+        self.assertEqual(self.client.get('/posts/export/users/').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/posts/export/posts/?since=yesterday').status_code, status.HTTP_400_BAD_REQUEST)
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertEqual(self.client.get('/posts/export/posts/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_data_command(self):
+        """Test the management command streams the same rows"""
+        out = StringIO()
+        call_command('export_data', 'likes', stdout=out)
+        self.assertEqual(out.getvalue(), '')
+        call_command('export_data', 'posts', '--output', 'csv', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+    def test_comment_list_streams_json_array(self):
+        """Test the comment list keeps its JSON array format while streaming"""
+        response = self.client.get('/posts/comments/')
+        data = json.loads(self._body(response))
+        self.assertEqual(data[0]['text'], 'Exported comment')
+        self.assertEqual(data[0]['post_title'], 'Export 0')
+
+    def test_get_users_streams_json_array(self):
+        """Test the function-based user list streams a JSON array"""
+        request = RequestFactory().get('/users/')
+        data = json.loads(b''.join(views.get_users(request).streaming_content))
+        self.assertEqual([user['username'] for user in data], ['exporter'])
+
+
+ASYNC_URLCONF = types.ModuleType('async_test_urls')
+ASYNC_URLCONF.urlpatterns = [path('posts/', include(async_urlpatterns(posts_urls.urlpatterns)))]
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AsyncViewsTestCase(TestCase):
+    """Test cases for the async feed, detail, comments and like views"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.user = User.objects.create_user(username='asyncuser', password='asyncpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = {'headers': {'Authorization': 'Token ' + self.token.key}}
+        self.posts = [PostFactory.create_post(post_type='text', title=f'Async {i}', author=self.user) for i in range(12)]
+        Comment.objects.create(text='Async comment', author=self.user, post=self.posts[0])
+        Post.objects.filter(pk=self.posts[0].pk).adjust_counters(comments=1)
+
+    async def _both(self, url):
+        """The same GET through the DRF view and the async view, each with a cold cache"""
+        sync_response = await self.async_client.get(url, **self.auth)
+        caches['responses'].clear()
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            async_response = await self.async_client.get(url, **self.auth)
+        return sync_response, async_response
+
+    async def test_read_endpoints_match_sync_views(self):
+        """Test the async views return the same status and payload as the DRF views"""
+        post_id = self.posts[0].id
+        await sync_to_async(trending.refresh)()
+        for url in [
+            '/posts/feed/', '/posts/feed/?page=2', '/posts/feed/?sort=hot&page_size=5', '/posts/feed/?page=99', '/posts/feed/?pagination=cursor&page_size=5',
+            f'/posts/{post_id}/', '/posts/999999/',
+            f'/posts/{post_id}/comments/', f'/posts/{post_id}/comments/?pagination=cursor', '/posts/999999/comments/',
+            '/posts/feed/?fields=id,title&expand=comments', '/posts/feed/?pagination=cursor&expand=author',
+            f'/posts/{post_id}/comments/?fields=text&expand=post', '/posts/feed/?fields=secret',
+        ]:
+            with self.subTest(url=url):
+                sync_response, async_response = await self._both(url)
+                self.assertEqual(async_response.status_code, sync_response.status_code)
+                self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_cursor_feed_follows_next_links(self):
+        """Test keyset pages from the async feed cover every post exactly once"""
+        seen, url = [], '/posts/feed/?pagination=cursor&page_size=5'
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            while url:
+                data = (await self.async_client.get(url, **self.auth)).json()
+                seen.extend(post['id'] for post in data['results'])
+                url = data['next']
+        self.assertEqual(seen, [post.id for post in reversed(self.posts)])
+
+    async def test_hot_feed_follows_next_links(self):
+        """Test the async hot feed pages through every scored post, hottest first"""
+        await sync_to_async(trending.refresh)()
+        seen, url = [], '/posts/feed/?sort=hot&page_size=5'
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            while url:
+                data = (await self.async_client.get(url, **self.auth)).json()
+                seen.extend(post['id'] for post in data['results'])
+                url = data['next']
+        self.assertEqual(seen, [pk async for pk in trending.hot_posts().values_list('pk', flat=True)])
+
+    async def test_like_and_unlike(self):
+        """Test async like/unlike keep the counter in step and reject duplicates"""
+        url = f'/posts/{self.posts[1].id}/like/'
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            self.assertEqual((await self.async_client.post(url, **self.auth)).status_code, status.HTTP_201_CREATED)
+            self.assertEqual((await self.async_client.post(url, **self.auth)).status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual((await Post.objects.aget(pk=self.posts[1].pk)).like_count, 1)
+            self.assertEqual((await self.async_client.delete(url, **self.auth)).status_code, status.HTTP_200_OK)
+            self.assertEqual((await self.async_client.delete(url, **self.auth)).status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual((await Post.objects.aget(pk=self.posts[1].pk)).like_count, 0)
+
+    async def test_token_required(self):
+        """Test missing or unknown tokens get DRF-style 401s"""
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            response = await self.async_client.get('/posts/feed/')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(response['WWW-Authenticate'], 'Token')
+            response = await self.async_client.get('/posts/feed/', headers={'Authorization': 'Token nope'})
+            self.assertEqual(response.json(), {'detail': 'Invalid token.'})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BenchmarkSuiteTestCase(TestCase):
+    """Test cases for the bench_api scenarios and baseline comparison"""
+
+    def test_every_route_has_a_scenario(self):
+        """Test new routes cannot be added without a benchmark scenario"""
+        self.assertEqual(benchmarking.uncovered_routes(), [])
+
+    def test_seed_is_deterministic(self):
+        """Test seeding the same arguments twice produces the same content"""
+        def snapshot():
+            return list(Comment.objects.order_by('pk').values_list('text', 'author__username', 'post__title'))
+
+        benchmarking.seed(users=3, posts_per_user=2, comments_per_post=2, likes_per_post=1, follows_per_user=1)
+        first = snapshot()
+        self.assertEqual(Post.objects.filter(post_type='text').count(), 6)
+        self.assertEqual(Post.objects.filter(post_type='image', metadata__has_key='media').count(), 10)
+        self.assertEqual(Post.objects.filter(like_count=1, comment_count=2).count(), 6)
+        Comment.objects.all().delete()
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        benchmarking.seed(users=3, posts_per_user=2, comments_per_post=2, likes_per_post=1, follows_per_user=1)
+        self.assertEqual(snapshot(), first)
+
+    def test_suite_runs_every_scenario_without_errors(self):
+        """Test one pass over all scenarios succeeds and records latency and query counts"""
+        dataset = benchmarking.seed(users=3, posts_per_user=2, comments_per_post=1, likes_per_post=1, follows_per_user=1)
+        results = benchmarking.run_suite(dataset, iterations=1, warmup=0)
+        self.assertEqual(set(results), {label for label, *_ in benchmarking.SCENARIOS})
+        for label, result in results.items():
+            with self.subTest(scenario=label):
+                self.assertEqual(result['errors'], 0, result['statuses'])
+                self.assertIsNotNone(result['p95_ms'])
+                if result['method'] != 'GET':
+                    self.assertGreaterEqual(result['queries_per_request']['max'], 1)
+
+        # The tokens are cached now: reads no longer look them up
+        reads = [label for label, _, method, _, _ in benchmarking.SCENARIOS if method == 'get']
+        with CaptureQueriesContext(connection) as queries:
+            results = benchmarking.run_suite(dataset, iterations=1, warmup=0, only=reads)
+        self.assertEqual(set(results), set(reads))
+        self.assertFalse([query['sql'] for query in queries if 'authtoken_token' in query['sql']])
+
+    def test_compare_flags_slower_or_chattier_scenarios(self):
+        """Test regressions are reported for p95 growth beyond tolerance and extra queries"""
+        def report(p95, queries):
+            return {'scenarios': {'feed.page': {
+                'p50_ms': 5.0, 'p95_ms': p95, 'p99_ms': p95, 'throughput_rps': 100.0,
+                'queries_per_request': {'mean': queries, 'max': queries},
+            }}}
+
+        baseline = report(10.0, 3)
+        self.assertEqual(benchmarking.compare(report(11.0, 3), baseline)['regressions'], [])
+        self.assertEqual(benchmarking.compare(report(20.0, 3), baseline)['regressions'], ['feed.page'])
+        self.assertEqual(benchmarking.compare(report(10.0, 4), baseline)['regressions'], ['feed.page'])
+        self.assertTrue(benchmarking.compare(report(10.0, 3), {'scenarios': {}})['scenarios'][0]['new'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RequestMetricsTestCase(APITestCase):
+    """Test cases for the per-request metrics middleware and endpoint"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        metrics.histogram.reset()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='metrics', password='metricspass123', is_staff=True)
+        self.token = Token.objects.create(user=self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        PostFactory.create_post(post_type='text', title='Measured', author=self.admin)
+
+    def _timings(self, response):
+        return {
+            name: float(duration)
+            for name, duration in re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])
+        }
+
+    def test_server_timing_reports_queries_and_phases(self):
+        """Test the header counts every query and splits db, serializer and total time"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/posts/feed/')
+        self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+        timings = self._timings(response)
+        self.assertEqual(set(timings), {'db', 'ser', 'total'})
+        self.assertGreater(timings['ser'], 0)
+        self.assertLessEqual(timings['db'], timings['total'])
+
+    @override_settings(REQUEST_METRICS_SERVER_TIMING=False)
+    def test_server_timing_can_be_disabled(self):
+        """Test the header is omitted when turned off"""
+        self.assertNotIn('Server-Timing', self.client.get('/posts/feed/'))
+
+    def test_metrics_endpoint_aggregates_by_route(self):
+        """Test requests are grouped by route template in the admin-only histogram"""
+        post_id = Post.objects.get().id
+        self.client.get(f'/posts/{post_id}/')
+        self.client.get('/posts/999999/')
+        data = self.client.get('/posts/metrics/').data
+        detail = data['endpoints']['GET /posts/<int:pk>/']
+        self.assertEqual(detail['count'], 2)
+        self.assertEqual(sum(detail['latency_ms']['histogram']), 2)
+        self.assertGreaterEqual(detail['queries']['max'], 1)
+
+        self.client.delete('/posts/metrics/')
+        self.assertNotIn('GET /posts/<int:pk>/', self.client.get('/posts/metrics/').data['endpoints'])
+
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertEqual(self.client.get('/posts/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_streaming_bodies_are_measured(self):
+        """Test queries run while a streamed body is produced count, recorded once the body ends"""
+        response = self.client.get('/posts/export/posts/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('GET /posts/export/<str:kind>/', metrics.histogram.snapshot()['endpoints'])
+        with CaptureQueriesContext(connection) as queries:
+            b''.join(response.streaming_content)
+        stats = metrics.histogram.snapshot()['endpoints']['GET /posts/export/<str:kind>/']
+        self.assertEqual(stats['count'], 1)
+        self.assertGreaterEqual(stats['queries']['max'], len(queries))
+        self.assertGreaterEqual(len(queries), 1)
+
+    async def test_async_views_attribute_queries_from_worker_threads(self):
+        """Test queries run through sync_to_async still count towards the request"""
+        post_id = (await Post.objects.aget()).id
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            response = await self.async_client.post(
+                f'/posts/{post_id}/like/', headers={'Authorization': 'Token ' + self.token.key}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+    def test_histogram_percentiles(self):
+        """Test percentiles come from bucket bounds and the open bucket reports the max"""
+        histogram = metrics.EndpointHistogram(window_seconds=60)
+        for total in [0.001] * 90 + [0.2] * 9 + [9.0]:
+            histogram.record('GET /x/', 200, total, queries=2, db_time=0.0, serializer_time=0.0)
+        summary = histogram.snapshot()['endpoints']['GET /x/']['latency_ms']
+        self.assertEqual((summary['p50'], summary['p95'], summary['p99']), (5, 250, 250))
+        self.assertEqual(summary['max'], 9000.0)
+        histogram.record('GET /x/', 500, 9.5, queries=2, db_time=0.0, serializer_time=0.0)
+        self.assertEqual(histogram.snapshot()['endpoints']['GET /x/']['errors'], 1)
+
+
+class LoggingPipelineTestCase(TestCase):
+    """Test cases for the queued, batched JSON logging pipeline"""
+
+    class CountingStream(StringIO):
+        writes = 0
+
+        def write(self, text):
+            self.writes += 1
+            return super().write(text)
+
+    def setUp(self):
+        self.stream = self.CountingStream()
+        self.queue = queue.SimpleQueue()
+        writer = BatchedStreamHandler(self.stream, capacity=3)
+        writer.setFormatter(JsonFormatter())
+        self.listener = BatchingQueueListener(self.queue, writer, flush_interval=0.05)
+        self.listener.start()
+        self.addCleanup(self.listener.stop)
+
+        self.handler = LazyQueueHandler(self.queue)
+        self.handler.addFilter(SamplingFilter())
+        self.logger = logging.getLogger('connectly_test')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def _lines(self):
+        self.listener.stop()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_records_are_json_with_extra_fields(self):
+        """Test messages are formatted lazily and `extra` fields become JSON keys"""
+        self.logger.info("Retrieved %s posts", 3, extra={'request_metrics': {'queries': 2}})
+        record = self._lines()[0]
+        self.assertEqual(record['message'], 'Retrieved 3 posts')
+        self.assertEqual(record['level'], 'INFO')
+        self.assertEqual(record['logger'], 'connectly_test')
+        self.assertEqual(record['request_metrics'], {'queries': 2})
+
+    def test_records_are_written_in_batches(self):
+        """Test full batches share one write and idle partial batches are still flushed"""
+        for i in range(7):
+            self.logger.info("line %s", i)
+        self.assertEqual(len(self._lines()), 7)
+        self.assertEqual(self.stream.writes, 3)
+
+    def test_prepare_leaves_formatting_to_the_listener(self):
+        """Test the request thread enqueues the record without merging its arguments"""
+        record = logging.makeLogRecord({'msg': 'post %s', 'args': (5,)})
+        prepared = self.handler.prepare(record)
+        self.assertEqual((prepared.msg, prepared.args), ('post %s', (5,)))
+
+    def test_sampling_keeps_one_in_n_info_records(self):
+        """Test sampled loggers keep every Nth INFO record but all warnings"""
+        config = ConfigManager()
+        config.set_setting('LOG_SAMPLE_RATES', {'connectly_test': 0.25})
+        self.addCleanup(config.clear_setting, 'LOG_SAMPLE_RATES')
+
+        for i in range(8):
+            self.logger.info("hit %s", i)
+        self.logger.warning("slow")
+        self.assertEqual([line['message'] for line in self._lines()], ['hit 0', 'hit 4', 'slow'])
+
+    def test_singleton_flush_waits_for_the_writer(self):
+        """Test LoggerSingleton.flush returns once queued records are written"""
+        logger = LoggerSingleton()
+        self.assertIs(logger.get_logger('access').parent, logger.get_logger())
+        self.assertTrue(logger.flush())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CachedTokenAuthenticationTestCase(APITestCase):
+    """Test cases for the token -> user lookup cache"""
+
+    def setUp(self):
+        caches['auth'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='tokenuser', password='tokenpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_repeat_requests_skip_the_token_query(self):
+        """Test the Token/User join runs once, then authentication costs no queries"""
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/posts/users/me/').status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get('/posts/users/me/')
+        self.assertEqual(response.data['username'], 'tokenuser')
+
+    def test_deleted_token_is_rejected(self):
+        """Test deleting the token evicts it from the cache"""
+        self.client.get('/posts/users/me/')
+        key = self.token.key
+        self.token.delete()
+        self.assertIsNone(token_cache.get(key))
+        self.assertEqual(self.client.get('/posts/users/me/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test saving the user (e.g. deactivating them) evicts their tokens"""
+        self.client.get('/posts/users/me/')
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/posts/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data['detail'], 'User inactive or deleted.')
+
+    def test_login_does_not_evict(self):
+        """Test last_login-only saves keep the cached entry"""
+        self.client.get('/posts/users/me/')
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(token_cache.get(self.token.key))
+
+    async def test_async_views_share_the_cache(self):
+        """Test the async views authenticate from the same cache"""
+        headers = {'Authorization': 'Token ' + self.token.key}
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            await self.async_client.get('/posts/feed/', headers=headers)
+            self.assertIsNotNone(await token_cache.aget(self.token.key))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class LikeWritePathTestCase(APITestCase):
+    """Test cases for the single-statement like/unlike writes and the batch endpoint"""
+
+    def setUp(self):
+        caches['auth'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='liker', password='likerpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.posts = [PostFactory.create_post(post_type='text', title=f'Like {i}', author=self.user) for i in range(3)]
+        self.post = self.posts[0]
+        # Warm the token cache so only the write path is captured
+        self.client.get('/posts/users/me/')
+
+    def writes(self, queries):
+        return [q['sql'].split()[0] for q in queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+
+    def test_like_is_one_insert_and_one_counter_update(self):
+        """Test liking issues the conditional INSERT first and no SELECT before it"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['like']['post_title'], 'Like 0')
+        statements = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertIn('ON CONFLICT DO NOTHING', statements[0])
+        self.assertEqual(self.writes(ctx.captured_queries), ['INSERT', 'UPDATE'])
+
+    def test_duplicate_like_changes_nothing(self):
+        """Test a repeated like neither raises nor touches the counter"""
+        self.client.post(f'/posts/{self.post.id}/like/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.writes(ctx.captured_queries), ['INSERT'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_unlike_is_one_delete(self):
+        """Test unliking deletes with a single statement and reports misses"""
+        self.client.post(f'/posts/{self.post.id}/like/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.delete(f'/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.writes(ctx.captured_queries), ['DELETE', 'UPDATE'])
+        self.assertEqual(self.client.delete(f'/posts/{self.post.id}/like/').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_post(self):
+        """Test liking or unliking a missing post is a 404"""
+        self.assertEqual(self.client.post('/posts/99999/like/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete('/posts/99999/like/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Like.objects.exists())
+
+    def test_batch_like(self):
+        """Test the batch endpoint likes new posts and reports the rest"""
+        self.client.post(f'/posts/{self.posts[1].id}/like/')
+        post_ids = [post.id for post in self.posts] + [99999]
+        response = self.client.post('/posts/like/', {'post_ids': post_ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'liked': [self.posts[0].id, self.posts[2].id],
+            'already_liked': [self.posts[1].id],
+            'not_found': [99999],
+        })
+        self.assertEqual(
+            list(Post.objects.filter(pk__in=post_ids).order_by('pk').values_list('like_count', flat=True)), [1, 1, 1]
+        )
+
+    def test_batch_like_validation(self):
+        """Test the batch endpoint rejects malformed and oversized requests"""
+        for body in ({}, {'post_ids': []}, {'post_ids': ['a']}, {'post_ids': list(range(likes.BATCH_LIMIT + 1))}):
+            response = self.client.post('/posts/like/', body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LikeConcurrencyTestCase(TransactionTestCase):
+    """Many threads liking and unliking one post must leave Like rows and like_count in agreement"""
+
+    THREADS = 16
+
+    def run_threads(self, target, users):
+        barrier = threading.Barrier(len(users))
+        errors = []
+
+        def worker(user):
+            try:
+                barrier.wait()
+                target(user)
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_likes_on_one_post(self):
+        author = User.objects.create_user(username='author', password='authorpass123')
+        post = PostFactory.create_post(post_type='text', title='Viral', author=author)
+        users = [User.objects.create_user(username=f'fan{i}', password='x') for i in range(self.THREADS)]
+
+        # Every user likes twice at once; the duplicate must be a no-op, not an error
+        self.run_threads(lambda user: (likes.add_like(user, post.pk), likes.add_like(user, post.pk)), users)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, self.THREADS)
+        self.assertEqual(Like.objects.filter(post=post).count(), self.THREADS)
+
+        # Half of them unlike twice at once; only one delete per user counts
+        self.run_threads(lambda user: (likes.remove_like(user, post.pk), likes.remove_like(user, post.pk)),
+                         users[::2])
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, self.THREADS // 2)
+        self.assertEqual(Like.objects.filter(post=post).count(), self.THREADS // 2)
+
+    @override_settings(LIKE_WRITE_BEHIND=True, LIKE_FLUSH_INTERVAL=0)
+    def test_concurrent_buffered_likes_on_one_post(self):
+        author = User.objects.create_user(username='author', password='authorpass123')
+        post = PostFactory.create_post(post_type='text', title='Viral', author=author)
+        users = [User.objects.create_user(username=f'fan{i}', password='x') for i in range(self.THREADS)]
+        try:
+            self.run_threads(lambda user: (likes.add_like(user, post.pk), likes.add_like(user, post.pk)), users)
+            self.assertEqual(likes.like_count(post), self.THREADS)
+            self.assertEqual(like_buffer.flush(), self.THREADS)
+            post.refresh_from_db()
+            self.assertEqual(post.like_count, self.THREADS)
+            self.assertEqual(likes.like_count(post), self.THREADS)
+        finally:
+            like_buffer.reset()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, LIKE_WRITE_BEHIND=True, LIKE_FLUSH_INTERVAL=0)
+class WriteBehindLikesTestCase(APITestCase):
+    """Test cases for the buffered (write-behind) like path"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buffered', password='bufferedpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = PostFactory.create_post(post_type='text', title='Hot', author=self.user)
+        self.addCleanup(like_buffer.reset)
+
+    def test_like_is_visible_before_it_is_stored(self):
+        """Test a buffered like writes nothing yet but shows in like_count"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))])
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(self.client.get(f'/posts/{self.post.id}/').data['like_count'], 1)
+
+        self.assertEqual(like_buffer.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertTrue(Like.objects.filter(user=self.user, post=self.post).exists())
+        self.assertEqual(like_buffer.pending_delta(self.post.id), 0)
+        self.assertEqual(self.client.get(f'/posts/{self.post.id}/').data['like_count'], 1)
+
+    def test_duplicates_and_cancelled_likes(self):
+        """Test the membership set rejects duplicates and a like+unlike flushes to nothing"""
+        self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(self.client.post(f'/posts/{self.post.id}/like/').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.delete(f'/posts/{self.post.id}/like/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.delete(f'/posts/{self.post.id}/like/').status_code, status.HTTP_400_BAD_REQUEST)
+        like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_stored_likes_are_known(self):
+        """Test likes already in the database count as members"""
+        other = User.objects.create_user(username='other', password='otherpass123')
+        likes.add_like(self.user, self.post.id)
+        like_buffer.flush()
+        self.assertEqual(self.client.post(f'/posts/{self.post.id}/like/').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNotNone(likes.add_like(other, self.post.id))
+        self.assertTrue(likes.remove_like(self.user, self.post.id))
+        like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(list(Like.objects.values_list('user__username', flat=True)), ['other'])
+
+    def test_missing_post(self):
+        """Test buffered likes of a missing post are a 404"""
+        self.assertEqual(self.client.post('/posts/99999/like/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(like_buffer.flush(), 0)
+
+    def test_member_sets_survive_flushes(self):
+        """Test a flush keeps the post's member set, so the next like reads nothing"""
+        other = User.objects.create_user(username='other', password='otherpass123')
+        like_buffer.add(self.user.pk, self.post.pk)
+        like_buffer.flush()
+        like_buffer.flush()
+        with self.assertNumQueries(0):
+            self.assertTrue(like_buffer.add(other.pk, self.post.pk))
+            self.assertFalse(like_buffer.add(self.user.pk, self.post.pk))
+
+    @override_settings(LIKE_MEMBER_CACHE_SIZE=1)
+    def test_member_sets_are_bounded(self):
+        """Test least recently used member sets are dropped, but not while they have pending likes"""
+        second = PostFactory.create_post(post_type='text', title='Also hot', author=self.user)
+        like_buffer.add(self.user.pk, self.post.pk)
+        like_buffer.add(self.user.pk, second.pk)
+        self.assertEqual(set(like_buffer._members), {self.post.pk, second.pk})
+        like_buffer.flush()
+        self.assertEqual(set(like_buffer._members), {second.pk})
+        # Reloaded from the database, with the flushed like
+        self.assertFalse(like_buffer.add(self.user.pk, self.post.pk))
+
+    def test_deleted_posts_are_forgotten(self):
+        """Test likes of a post deleted before the flush are dropped instead of failing the flush"""
+        like_buffer.add(self.user.pk, self.post.pk)
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(like_buffer.flush(), 0)
+        self.assertIsNone(like_buffer.add(self.user.pk, self.post.pk))
+
+
+class LikeFlusherTestCase(TransactionTestCase):
+    """The background flusher writes buffered likes without an explicit flush()"""
+
+    @override_settings(LIKE_WRITE_BEHIND=True, LIKE_FLUSH_INTERVAL=0.05)
+    def test_background_flush(self):
+        user = User.objects.create_user(username='flusher', password='flusherpass123')
+        post = PostFactory.create_post(post_type='text', title='Flushed', author=user)
+        try:
+            likes.add_like(user, post.pk)
+            for _ in range(100):
+                if Like.objects.filter(post=post).exists():
+                    break
+                time.sleep(0.05)
+            like_buffer.stop()
+            post.refresh_from_db()
+            self.assertEqual(post.like_count, 1)
+            self.assertEqual(like_buffer.pending_delta(post.pk), 0)
+        finally:
+            like_buffer.reset()
+
+
+class DatabaseProfileTestCase(SimpleTestCase):
+    """Test DATABASE_PROFILE=sqlite-concurrent against a real connection"""
+
+    def load_settings(self, **environ):
+        """The settings module as it loads with these environment variables"""
+        self.addCleanup(importlib.reload, project_settings)
+        with mock.patch.dict(os.environ, environ):
+            return importlib.reload(project_settings)
+
+    def connect(self, settings_dict):
+        """A connection with these DATABASES settings, to a scratch file"""
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        settings_dict = connections.configure_settings({
+            'default': {**settings_dict, 'NAME': os.path.join(tempdir.name, 'profile.sqlite3')},
+        })['default']
+        # Not in settings.DATABASES, so the test isolation checks leave it alone
+        connections['profile'] = type(connections['default'])(settings_dict, 'profile')
+        self.addCleanup(connections.__delitem__, 'profile')
+        self.addCleanup(connections['profile'].close)
+        return connections['profile']
+
+    def pragma(self, conn, name):
+        with conn.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_profile_tunes_the_connection(self):
+        loaded = self.load_settings(DATABASE_PROFILE='sqlite-concurrent', SQLITE_BUSY_TIMEOUT_MS='1234')
+        conn = self.connect(loaded.DATABASES['default'])
+        self.assertEqual(self.pragma(conn, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(conn, 'busy_timeout'), 1234)
+        # 1 is NORMAL
+        self.assertEqual(self.pragma(conn, 'synchronous'), 1)
+        self.assertEqual(conn.settings_dict['CONN_MAX_AGE'], 600)
+        self.assertTrue(conn.settings_dict['CONN_HEALTH_CHECKS'])
+        self.assertEqual(conn.transaction_mode, 'IMMEDIATE')
+
+        # The write lock is taken at BEGIN, before anything is written
+        with transaction.atomic(using='profile'):
+            other = sqlite3.connect(conn.settings_dict['NAME'], timeout=0)
+            try:
+                with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+                    other.execute('BEGIN IMMEDIATE')
+            finally:
+                other.close()
+
+    def test_default_profile_keeps_stock_settings(self):
+        conn = self.connect(self.load_settings(DATABASE_PROFILE='default').DATABASES['default'])
+        self.assertEqual(self.pragma(conn, 'journal_mode'), 'delete')
+        self.assertEqual(conn.settings_dict['CONN_MAX_AGE'], 0)
+        self.assertIsNone(conn.transaction_mode)
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'DATABASE_PROFILE'):
+            self.load_settings(DATABASE_PROFILE='turbo')
+
+
+@override_settings(REPLICA_DATABASES=['replica1', 'replica2'])
+class ReplicaRouterTestCase(SimpleTestCase):
+    """Test cases for read-replica routing and read-your-writes pinning"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    @staticmethod
+    def in_request(func, pinned=False):
+        """func() inside a request scope, as ReplicaPinningMiddleware opens one"""
+        def scoped():
+            routers.pin(pinned)
+            return func()
+        return contextvars.copy_context().run(scoped)
+
+    def route_in_request(self, request):
+        """Where a read issued by the view handling `request` would go"""
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        ReplicaPinningMiddleware(view)(request)
+        return seen[0]
+
+    def test_reads_use_replicas_and_writes_the_primary(self):
+        self.assertIn(self.in_request(lambda: self.router.db_for_read(Post)), {'replica1', 'replica2'})
+        self.assertEqual(self.in_request(lambda: self.router.db_for_read(Token)), 'default')
+        self.assertEqual(self.in_request(lambda: self.router.db_for_read(Post), pinned=True), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    def test_write_pins_later_reads(self):
+        """Test reads after a write in the same request go to the primary"""
+        def write_then_read():
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            return self.router.db_for_read(Post)
+        self.assertEqual(self.in_request(write_then_read), 'default')
+        self.assertFalse(routers.is_pinned())
+
+    def test_outside_requests_reads_use_the_primary_and_writes_pin_nothing(self):
+        """Test background code reads what it wrote, without leaving its context pinned"""
+        def write_then_read():
+            self.router.db_for_write(Post)
+            return self.router.db_for_read(Post), routers.is_pinned()
+        self.assertEqual(contextvars.copy_context().run(write_then_read), ('default', False))
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_read_your_writes(self):
+        """Test a client that just wrote reads from the primary; other clients don't"""
+        writer = {'HTTP_AUTHORIZATION': 'Token writer'}
+        self.assertNotEqual(self.route_in_request(self.factory.get('/posts/feed/', **writer)), 'default')
+        self.assertEqual(self.route_in_request(self.factory.post('/posts/', **writer)), 'default')
+        self.assertEqual(self.route_in_request(self.factory.get('/posts/feed/', **writer)), 'default')
+        other = self.factory.get('/posts/feed/', HTTP_AUTHORIZATION='Token reader')
+        self.assertNotEqual(self.route_in_request(other), 'default')
+        self.assertFalse(routers.is_pinned())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, REPLICA_DATABASES=['lagging'])
+class ReplicaIntegrationTestCase(TransactionTestCase):
+    """Test read-your-writes and the response cache against a real, lagging SQLite replica"""
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['responses'].clear()
+        caches['auth'].clear()
+        response_cache.reset_stats()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.replica_path = os.path.join(tempdir.name, 'replica.sqlite3')
+        # A connection that isn't in settings.DATABASES, so the test runner leaves it alone
+        settings_dict = {**connections.settings['default'], 'NAME': self.replica_path}
+        connections['lagging'] = type(connections['default'])(settings_dict, 'lagging')
+        self.addCleanup(self.drop_replica)
+        self.writer = User.objects.create_user(username='writer', password='writerpass123')
+        self.reader = User.objects.create_user(username='reader', password='readerpass123')
+        self.post = PostFactory.create_post(post_type='text', title='Replicated', author=self.writer)
+        self.writer_client, self.reader_client = APIClient(), APIClient()
+        for client, user in ((self.writer_client, self.writer), (self.reader_client, self.reader)):
+            client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+        self.sync_replica()
+
+    def drop_replica(self):
+        connections['lagging'].close()
+        del connections['lagging']
+
+    def sync_replica(self):
+        """Copy the primary into the replica, which then lags until the next call"""
+        connections['lagging'].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        try:
+            connection.connection.backup(replica)
+        finally:
+            replica.close()
+
+    def like_count(self, client):
+        response = client.get(f'/posts/{self.post.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['like_count']
+
+    def test_writers_read_their_writes_and_stale_replica_reads_are_not_cached(self):
+        self.assertEqual(self.like_count(self.reader_client), 0)
+        response = self.writer_client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # The replica hasn't seen the like: other clients read it from there, the writer from the primary
+        self.assertEqual(self.like_count(self.reader_client), 0)
+        self.assertEqual(self.like_count(self.writer_client), 1)
+        self.assertEqual(self.like_count(self.writer_client), 1)
+
+        # Once the replica caught up, nothing stale was left cached under the new version
+        self.sync_replica()
+        caches['responses'].delete(f'post:{self.post.id}:v:recent')
+        self.assertEqual(self.like_count(self.reader_client), 1)
+        self.assertEqual(self.like_count(self.reader_client), 1)
+        self.assertEqual(response_cache.stats()['endpoints']['detail']['hits'], 1)
+
+    def test_background_writes_do_not_pin_the_context(self):
+        PostFactory.create_post(post_type='text', title='From a worker', author=self.writer)
+        self.assertFalse(routers.is_pinned())
+        self.assertEqual(self.like_count(self.reader_client), 0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SearchTestCase(APITestCase):
+    """Test cases for /posts/search/ and the full-text index"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='searcher', password='searchpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.in_title = PostFactory.create_post(
+            post_type='text', title='Django performance', content='Notes on caching', author=self.user)
+        self.in_content = PostFactory.create_post(
+            post_type='text', title='Weekly notes', content='We moved the API to django last week', author=self.user)
+        PostFactory.create_post(post_type='text', title='Unrelated', content='Nothing here', author=self.user)
+
+    def search(self, query, **params):
+        return self.client.get('/posts/search/', {'q': query, **params})
+
+    def ids(self, response):
+        return [result['id'] for result in response.data['results']]
+
+    def test_ranked_results(self):
+        """Test title matches rank above body matches and snippets mark the match"""
+        response = self.search('django')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ids(response), [self.in_title.id, self.in_content.id])
+        self.assertIn('[Django]', response.data['results'][0]['snippet'])
+        self.assertGreater(response.data['results'][0]['score'], response.data['results'][1]['score'])
+
+    def test_all_terms_must_match_and_prefixes(self):
+        self.assertEqual(self.ids(self.search('django caching')), [self.in_title.id])
+        self.assertEqual(self.ids(self.search('djan')), [])
+        self.assertEqual(self.ids(self.search('djan*')), [self.in_title.id, self.in_content.id])
+        # FTS syntax in user input is treated as plain words
+        self.assertEqual(self.search('django OR "notes" NEAR(').status_code, status.HTTP_200_OK)
+
+    def test_index_follows_writes(self):
+        """Test inserts (including bulk), updates and deletes reach the index"""
+        PostFactory.create_posts([{'post_type': 'text', 'title': 'Bulk zebra', 'content': 'Striped'}], author=self.user)
+        self.assertEqual(len(self.search('zebra').data['results']), 1)
+
+        self.in_content.content = 'Moved to flask'
+        self.in_content.save()
+        self.assertEqual(self.ids(self.search('django')), [self.in_title.id])
+        self.assertEqual(self.ids(self.search('flask')), [self.in_content.id])
+
+        self.in_title.delete()
+        self.assertEqual(self.ids(self.search('django')), [])
+
+    def test_comment_search(self):
+        comment = Comment.objects.create(text='Great write-up about sqlite', author=self.user, post=self.in_title)
+        response = self.search('sqlite', type='comments')
+        self.assertEqual(self.ids(response), [comment.id])
+        self.assertEqual(response.data['results'][0]['post'], self.in_title.id)
+        self.assertEqual(self.ids(self.search('sqlite')), [])
+
+    def test_pagination(self):
+        first = self.search('django', page_size=1)
+        self.assertEqual(self.ids(first), [self.in_title.id])
+        self.assertIsNotNone(first.data['next'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.ids(second), [self.in_content.id])
+        self.assertIsNone(second.data['next'])
+
+    def test_validation(self):
+        self.assertEqual(self.search('').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search('!!!').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search('django', type='users').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search('django', page='x').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command(self):
+        """Test --reinstall recreates the index and triggers from the base tables"""
+        out = StringIO()
+        call_command('rebuild_search_index', '--reinstall', stdout=out)
+        self.assertIn('Rebuilt the search index', out.getvalue())
+        self.assertEqual(self.ids(self.search('django')), [self.in_title.id, self.in_content.id])
+        PostFactory.create_post(post_type='text', title='After rebuild django', author=self.user)
+        self.assertEqual(len(self.search('django').data['results']), 3)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plan')
+    def test_migrate_restores_dropped_triggers(self):
+        """Test post_migrate re-creates triggers a table rebuild dropped, and catches the index up"""
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER posts_post_fts_ai")
+        missed = PostFactory.create_post(post_type='text', title='Written while unindexed', author=self.user)
+        self.assertEqual(self.ids(self.search('unindexed')), [])
+
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertTrue(search.backend(connection).installed())
+        self.assertEqual(self.ids(self.search('unindexed')), [missed.id])
+        later = PostFactory.create_post(post_type='text', title='Unindexed no more', author=self.user)
+        self.assertEqual(set(self.ids(self.search('unindexed'))), {missed.id, later.id})
+
+    def test_sqlite_without_fts5(self):
+        """Test the migration goes on without the index and search answers 501"""
+        migration = importlib.import_module('posts.migrations.0008_search_index')
+        no_fts5 = mock.patch('django.db.backends.utils.CursorWrapper.execute',
+                             side_effect=OperationalError('no such module: fts5'))
+        with no_fts5:
+            migration.install_search_index(None, types.SimpleNamespace(connection=connection))
+        # What such a database is left with
+        search.backend(connection).uninstall()
+        self.assertEqual(self.search('django').status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    def test_lookup_uses_the_index(self):
+        """Test the match is answered by the FTS index rather than a table scan"""
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH 'django'")
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TrendingTestCase(APITestCase):
+    """Test cases for the trending scores and /posts/feed/?sort=hot"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='trender', password='trendpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='x') for i in range(3)]
+        self.old, self.new = (
+            PostFactory.create_post(post_type='text', title=title, author=self.user) for title in ('Old', 'New')
+        )
+
+    def age(self, post, hours):
+        Post.objects.filter(pk=post.pk).update(created_at=timezone.now() - timedelta(hours=hours))
+
+    def hot_ids(self):
+        response = self.client.get('/posts/feed/?sort=hot')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data['results']]
+
+    def test_engagement_beats_recency_until_it_decays(self):
+        self.age(self.old, 2)
+        trending.refresh()
+        self.assertEqual(self.hot_ids(), [self.new.id, self.old.id])
+
+        for fan in self.fans:
+            likes.add_like(fan, self.old.id)
+        Comment.objects.create(text='Hot take', author=self.fans[0], post=self.old)
+        trending.refresh()
+        caches['responses'].clear()
+        self.assertEqual(self.hot_ids(), [self.old.id, self.new.id])
+
+        # The same engagement two days ago is worth less than a fresh post
+        self.age(self.old, 48)
+        Like.objects.filter(post=self.old).update(created_at=timezone.now() - timedelta(hours=48))
+        Comment.objects.filter(post=self.old).update(created_at=timezone.now() - timedelta(hours=48))
+        trending.refresh(full=True)
+        caches['responses'].clear()
+        self.assertEqual(self.hot_ids(), [self.new.id, self.old.id])
+
+    def test_refresh_is_incremental(self):
+        self.assertEqual(trending.refresh(), {'post': 2, 'like': 0, 'comment': 0})
+        likes.add_like(self.fans[0], self.new.id)
+        before = PostScore.objects.get(post=self.new).score
+        self.assertEqual(trending.refresh(), {'post': 0, 'like': 1, 'comment': 0})
+        self.assertGreater(PostScore.objects.get(post=self.new).score, before)
+        self.assertEqual(trending.refresh(), {'post': 0, 'like': 0, 'comment': 0})
+
+    def test_scores_match_a_full_recompute(self):
+        trending.refresh(batch_size=1)
+        for fan in self.fans:
+            likes.add_like(fan, self.new.id)
+        trending.refresh(batch_size=2)
+        incremental = dict(PostScore.objects.values_list('post_id', 'score'))
+        trending.refresh(full=True)
+        full = dict(PostScore.objects.values_list('post_id', 'score'))
+        self.assertEqual(incremental.keys(), full.keys())
+        for post_id, score in full.items():
+            self.assertAlmostEqual(incremental[post_id], score, places=6)
+
+    def test_toggling_a_like_counts_once(self):
+        trending.refresh()
+        likes.add_like(self.fans[0], self.old.id)
+        trending.refresh()
+        score = PostScore.objects.get(post=self.old).score
+        for _ in range(3):
+            likes.remove_like(self.fans[0], self.old.id)
+            likes.add_like(self.fans[0], self.old.id)
+            trending.refresh()
+        self.assertEqual(PostScore.objects.get(post=self.old).score, score)
+
+    def test_events_committed_below_the_checkpoint_are_picked_up(self):
+        first, _ = (Comment.objects.create(text=t, author=self.fans[0], post=self.old) for t in 'ab')
+        # As if `first` had not committed yet when the refresh ran
+        Comment.objects.filter(pk=first.pk).delete()
+        self.assertEqual(trending.refresh()['comment'], 1)
+        score = PostScore.objects.get(post=self.old).score
+        Comment.objects.create(pk=first.pk, text='a', author=self.fans[0], post=self.old)
+        self.assertEqual(trending.refresh()['comment'], 1)
+        self.assertGreater(PostScore.objects.get(post=self.old).score, score)
+        self.assertEqual(trending.refresh()['comment'], 0)
+        # Ids that never show up (deleted rows) are given up on
+        deleted, _ = (Comment.objects.create(text=t, author=self.fans[0], post=self.old) for t in 'cd')
+        deleted_pk = deleted.pk
+        deleted.delete()
+        trending.refresh()
+        self.assertEqual(list(RankingCheckpoint.objects.get().gaps['comment']), [str(deleted_pk)])
+        with mock.patch.object(trending.time, 'time', return_value=time.time() + trending.GAP_SECONDS + 1):
+            trending.refresh()
+        self.assertEqual(RankingCheckpoint.objects.get().gaps['comment'], {})
+
+    def test_gaps_before_old_rows_are_not_kept(self):
+        deleted, kept = (Comment.objects.create(text=t, author=self.fans[0], post=self.old) for t in 'ab')
+        deleted.delete()
+        # A row created before the wait was over has no in-flight ids below it
+        Comment.objects.filter(pk=kept.pk).update(
+            created_at=timezone.now() - timedelta(seconds=trending.GAP_SECONDS + 1)
+        )
+        self.assertEqual(trending.refresh()['comment'], 1)
+        self.assertEqual(RankingCheckpoint.objects.get().gaps['comment'], {})
+
+    def test_hot_pages_follow_the_cursor(self):
+        extra = [PostFactory.create_post(post_type='text', title=f'Extra {i}', author=self.user) for i in range(3)]
+        trending.refresh()
+        # Tied scores are ordered by post id
+        PostScore.objects.filter(post__in=extra).update(score=PostScore.objects.get(post=self.new).score)
+        expected = list(trending.hot_posts().values_list('pk', flat=True))
+        self.assertEqual(len(expected), 5)
+
+        seen, url = [], '/posts/feed/?sort=hot&page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('COUNT(', ' '.join(q['sql'] for q in ctx.captured_queries))
+            self.assertNotIn('count', response.data)
+            seen += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_hot_page_is_one_index_range_scan(self):
+        trending.refresh()
+        with CaptureQueriesContext(connection) as ctx:
+            self.hot_ids()
+        hot_query = next(q['sql'] for q in ctx.captured_queries if 'posts_postscore' in q['sql'] and 'LIMIT' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + hot_query)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('postscore_score_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_invalid_sort_and_command(self):
+        self.assertEqual(self.client.get('/posts/feed/?sort=top').status_code, status.HTTP_400_BAD_REQUEST)
+        out = StringIO()
+        call_command('refresh_trending', stdout=out)
+        self.assertIn('2 posts', out.getvalue())
+        self.assertEqual(PostScore.objects.count(), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SparseFieldsetTestCase(APITestCase):
+    """Test cases for ?fields= / ?expand= and the compact list representation"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='sparse', password='sparsepass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = PostFactory.create_post(post_type='text', title='Sparse', content='A long body',
+                                            author=self.user)
+        self.comment = Comment.objects.create(text='First', author=self.user, post=self.post)
+
+    def test_lists_are_compact(self):
+        response = self.client.get('/posts/feed/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        post = response.data['results'][0]
+        self.assertNotIn('comments', post)
+        self.assertEqual(post['author_username'], 'sparse')
+
+        response = self.client.get('/posts/feed/?expand=comments')
+        self.assertEqual(response.data['results'][0]['comments'], [str(self.comment)])
+
+    def test_fields_narrow_payload_and_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/posts/feed/?fields=id,title')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'id': self.post.id, 'title': 'Sparse'}])
+        page_query = next(q['sql'] for q in ctx.captured_queries if 'LIMIT' in q['sql'] and 'posts_post' in q['sql'])
+        self.assertNotIn('content', page_query)
+        self.assertNotIn('posts_user', page_query)
+        self.assertNotIn('posts_comment', ' '.join(q['sql'] for q in ctx.captured_queries))
+
+    def test_expand_nests_related_objects(self):
+        response = self.client.get(f'/posts/{self.post.id}/comments/?fields=id,text&expand=author,post')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        comment = response.data['results'][0]
+        self.assertEqual(set(comment), {'id', 'text', 'author', 'post'})
+        self.assertEqual(comment['author']['username'], 'sparse')
+        self.assertEqual(comment['post'], {'id': self.post.id, 'title': 'Sparse', 'like_count': 0, 'comment_count': 0})
+
+        users = self.client.get('/posts/users/?fields=username').json()
+        self.assertIn({'username': 'sparse'}, users)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/posts/feed/?fields=id,password')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+        response = self.client.get('/posts/feed/?expand=likes')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expand', response.data)
+
+
+class TokenBucketStoreTestCase(SimpleTestCase):
+    """Test cases for the rate limit stores"""
+
+    def test_bucket_refills_at_the_configured_rate(self):
+        store = throttling.TokenBucketStore(stripes=4)
+        self.assertEqual([store.consume('k', 3, 3, now=0.0)[0] for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(store.consume('k', 3, 3, now=0.0)[1], 1.0)
+        self.assertEqual(store.consume('k', 3, 3, now=1.0), (True, 0.0))
+        self.assertFalse(store.consume('k', 3, 3, now=1.0)[0])
+        # Buckets are independent per key
+        self.assertTrue(store.consume('other', 3, 3, now=1.0)[0])
+
+    def test_concurrent_consumers_never_exceed_the_limit(self):
+        store = throttling.TokenBucketStore()
+        allowed = []
+
+        def consume():
+            mine = [store.consume('hot', 500, 60, now=0.0)[0] for _ in range(100)]
+            allowed.append(sum(mine))
+
+        threads = [threading.Thread(target=consume) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(allowed), 500)
+
+    def test_idle_buckets_are_pruned(self):
+        store = throttling.TokenBucketStore(stripes=1)
+        for i in range(throttling.PRUNE_THRESHOLD + 1):
+            store.consume(i, 10, 10, now=0.0)
+        store.consume('late', 10, 10, now=100.0)
+        self.assertEqual(len(store._stripes[0][1]), 1)
+
+    def test_cache_window_store(self):
+        caches['default'].clear()
+        store = throttling.CacheWindowStore('default')
+        self.assertEqual([store.consume('k', 2, 10, now=100.0)[0] for _ in range(3)], [True, True, False])
+        # Halfway through the next window half of the previous window's requests still count
+        allowed, wait = store.consume('k', 2, 10, now=115.0)
+        self.assertTrue(allowed)
+        allowed, wait = store.consume('k', 2, 10, now=115.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 5.0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RateLimitTestCase(APITestCase):
+    """Test cases for ConfigRateThrottle on the write endpoints"""
+
+    def setUp(self):
+        throttling.memory_store.reset()
+        self.addCleanup(throttling.memory_store.reset)
+        self.enterContext(ConfigManager().override(RATE_LIMIT=2, RATE_LIMIT_ENDPOINTS={}))
+        self.user = User.objects.create_user(username='limited', password='limitpass123')
+        self.other = User.objects.create_user(username='unlimited', password='limitpass123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        self.posts = [PostFactory.create_post(post_type='text', title=f'Limited {i}', author=self.other)
+                      for i in range(4)]
+
+    def like(self, post, client=None):
+        return (client or self.client).post(f'/posts/{post.id}/like/')
+
+    def test_writes_are_limited_per_user_and_endpoint(self):
+        self.assertEqual(self.like(self.posts[0]).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.like(self.posts[1]).status_code, status.HTTP_201_CREATED)
+        response = self.like(self.posts[2])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Like.objects.filter(user=self.user).count(), 2)
+
+        # Reads, other endpoints and other users have their own budgets
+        self.assertEqual(self.client.get(f'/posts/{self.posts[2].id}/').status_code, status.HTTP_200_OK)
+        response = self.client.post(f'/posts/{self.posts[2].id}/comment/', {'text': 'Still allowed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        other = APIClient()
+        other.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.other).key)
+        self.assertEqual(self.like(self.posts[2], other).status_code, status.HTTP_201_CREATED)
+
+    def test_limits_are_read_from_config_manager(self):
+        ConfigManager().set_setting('RATE_LIMIT_ENDPOINTS', {'post-like': 3})
+        codes = [self.like(post).status_code for post in self.posts]
+        self.assertEqual(codes, [201, 201, 201, 429])
+
+        throttling.memory_store.reset()
+        ConfigManager().set_setting('RATE_LIMIT', None)
+        ConfigManager().set_setting('RATE_LIMIT_ENDPOINTS', {})
+        self.assertEqual(self.client.delete(f'/posts/{self.posts[0].id}/like/').status_code, status.HTTP_200_OK)
+        for _ in range(3):
+            self.assertEqual(self.like(self.posts[0]).status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.client.delete(f'/posts/{self.posts[0].id}/like/').status_code, status.HTTP_200_OK)
+
+    async def test_async_like_view_is_limited(self):
+        token = await Token.objects.acreate(user=self.other)
+        auth = {'headers': {'Authorization': 'Token ' + token.key}}
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            codes = [(await self.async_client.post(f'/posts/{post.id}/like/', **auth)).status_code
+                     for post in self.posts[:3]]
+            response = await self.async_client.post(f'/posts/{self.posts[3].id}/like/', **auth)
+        self.assertEqual(codes, [201, 201, 429])
+        self.assertEqual(response.json(), {'detail': 'Request was throttled. Expected available in 30 seconds.'})
+        self.assertEqual(response['Retry-After'], '30')
+
+
+class ConfigManagerTestCase(SimpleTestCase):
+    """Test cases for the layered, hot-reloadable ConfigManager"""
+
+    def setUp(self):
+        self.config = ConfigManager()
+        self.addCleanup(self.config.load, self.config.path)
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def write(self, settings):
+        with open(self.path, 'w') as handle:
+            json.dump(settings, handle)
+        # Make the change visible to the (mtime, size) check even within one clock tick
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    def test_concurrent_first_use_creates_one_instance(self):
+        class Probe(ConfigManager):
+            _instance = None
+
+        barrier = threading.Barrier(16)
+        instances = []
+
+        def create():
+            barrier.wait()
+            instances.append(Probe())
+
+        threads = [threading.Thread(target=create) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+
+    def test_snapshots_are_immutable(self):
+        snapshot = self.config.settings
+        with self.assertRaises(TypeError):
+            snapshot['RATE_LIMIT'] = 1
+        with self.assertRaises(TypeError):
+            snapshot['TRENDING_WEIGHTS']['like'] = 100
+        with self.config.override(RATE_LIMIT=7):
+            self.assertEqual(self.config.get_setting('RATE_LIMIT'), 7)
+            # Readers holding the old snapshot keep a consistent view
+            self.assertEqual(snapshot['RATE_LIMIT'], 100)
+        self.assertEqual(self.config.get_setting('RATE_LIMIT'), 100)
+
+    def test_layers(self):
+        self.write({'RATE_LIMIT': 5, 'DEFAULT_PAGE_SIZE': 3})
+        self.assertTrue(self.config.load(self.path))
+        self.assertEqual(self.config.get_setting('RATE_LIMIT'), 5)
+
+        with mock.patch.dict(os.environ, {'CONNECTLY_RATE_LIMIT': '6'}):
+            self.config.reload()
+            self.assertEqual(self.config.get_setting('RATE_LIMIT'), 6)
+            with self.config.override(RATE_LIMIT=7):
+                self.assertEqual(self.config.get_setting('RATE_LIMIT'), 7)
+            self.assertEqual(self.config.get_setting('RATE_LIMIT'), 6)
+        self.config.reload()
+        self.assertEqual(self.config.get_setting('RATE_LIMIT'), 5)
+        self.assertEqual(self.config.get_setting('DEFAULT_PAGE_SIZE'), 3)
+
+    def test_bad_file_keeps_current_settings(self):
+        self.write({'RATE_LIMIT': 5})
+        self.config.load(self.path)
+        with open(self.path, 'w') as handle:
+            handle.write('{"RATE_LIMIT": ')
+        self.assertFalse(self.config.reload())
+        self.assertEqual(self.config.get_setting('RATE_LIMIT'), 5)
+
+    def test_watcher_picks_up_changes(self):
+        self.write({'RATE_LIMIT': 5})
+        self.config.load(self.path)
+        self.config.watch(interval=0.01)
+        self.addCleanup(self.config.stop)
+        self.write({'RATE_LIMIT': 50})
+        deadline = time.monotonic() + 5
+        while self.config.get_setting('RATE_LIMIT') != 50 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.config.get_setting('RATE_LIMIT'), 50)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class LivePageSizeTestCase(APITestCase):
+    """Test cases for pagination following DEFAULT_PAGE_SIZE at runtime"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='pager', password='pagerpass123')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        self.post = PostFactory.create_post(post_type='text', title='Paged', author=self.user)
+        for i in range(12):
+            PostFactory.create_post(post_type='text', title=f'Filler {i}', author=self.user)
+            Comment.objects.create(text=f'Comment {i}', author=self.user, post=self.post)
+
+    def test_page_size_is_read_live(self):
+        self.assertEqual(len(self.client.get('/posts/feed/').data['results']), 10)
+        self.assertEqual(len(self.client.get(f'/posts/{self.post.id}/comments/').data['results']), 10)
+        # The pages above are cached; the new size must not be served from them
+        with ConfigManager().override(DEFAULT_PAGE_SIZE=4):
+            self.assertEqual(len(self.client.get('/posts/feed/').data['results']), 4)
+            self.assertEqual(len(self.client.get('/posts/feed/?pagination=cursor').data['results']), 4)
+            self.assertEqual(len(self.client.get(f'/posts/{self.post.id}/comments/').data['results']), 4)
+            # An explicit ?page_size= still wins
+            self.assertEqual(len(self.client.get('/posts/feed/?page_size=6').data['results']), 6)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class LoginPipelineTestCase(TestCase):
+    """Test cases for the bounded, negatively cached login endpoint"""
+
+    def setUp(self):
+        caches['login_failures'].clear()
+        self.user = User.objects.create_user(username='loginuser', password='placeholder')
+        # A hash from before Argon2 was the default
+        User.objects.filter(pk=self.user.pk).update(password=make_password('loginpass123', hasher='pbkdf2_sha256'))
+
+    def login(self, password, username='loginuser'):
+        return self.client.post('/posts/authenticate/', {'username': username, 'password': password},
+                                content_type='application/json')
+
+    def test_successful_login_upgrades_the_hash(self):
+        response = self.login('loginpass123')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'loginuser')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+        # The upgraded hash verifies, and isn't replaced again
+        upgraded = self.user.password
+        self.assertEqual(self.login('loginpass123').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, upgraded)
+
+    def test_repeated_bad_credentials_skip_hashing(self):
+        with mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password) as check:
+            self.assertEqual(self.login('wrong').status_code, 401)
+            # Once per backend that checks local passwords
+            checks = check.call_count
+            self.assertGreaterEqual(checks, 1)
+            for _ in range(2):
+                self.assertEqual(self.login('wrong').status_code, 401)
+            self.assertEqual(check.call_count, checks)
+            # A different password is checked
+            self.assertEqual(self.login('loginpass123').status_code, 200)
+            self.assertGreater(check.call_count, checks)
+        # Unknown usernames are hashed too, then answered from the cache
+        with mock.patch('django.contrib.auth.base_user.make_password', wraps=make_password) as dummy:
+            self.assertEqual(self.login('x', username='nobody').status_code, 401)
+            hashes = dummy.call_count
+            self.assertGreaterEqual(hashes, 1)
+            self.assertEqual(self.login('x', username='nobody').status_code, 401)
+        self.assertEqual(dummy.call_count, hashes)
+
+    def test_failures_send_user_login_failed(self):
+        failures = []
+        receiver = lambda sender, credentials, request, **kwargs: failures.append((sender, credentials, request.path))
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        self.assertEqual(self.login('wrong').status_code, 401)
+        # Answered from the negative cache, still reported the same way
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(self.login('loginpass123').status_code, 200)
+        self.assertEqual(len(failures), 2)
+        self.assertEqual(failures[0], failures[1])
+        sender, credentials, path = failures[0]
+        self.assertEqual(sender, 'django.contrib.auth')
+        self.assertEqual(credentials, {'username': 'loginuser', 'password': login.CLEANSED_PASSWORD})
+        self.assertEqual(path, '/posts/authenticate/')
+
+    @override_settings(AUTHENTICATION_BACKENDS=['posts.tests.SingleUserBackend'])
+    def test_authentication_backends_are_consulted(self):
+        # Not a local password: only the backend knows it
+        self.assertEqual(self.login('backendpass').status_code, 200)
+        self.assertEqual(self.login('loginpass123').status_code, 401)
+
+    def test_failures_are_cached_apart_from_tokens(self):
+        """Test bad passwords fill their own alias, so they can't push tokens out of the auth LRU"""
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.user.refresh_from_db()
+        key = login._failure_key('loginuser', 'wrong', self.user.password)
+        self.assertTrue(caches['login_failures'].get(key))
+        self.assertIsNone(caches['auth'].get(key))
+
+    def test_password_change_invalidates_the_negative_cache(self):
+        self.assertEqual(self.login('newpass123').status_code, 401)
+        self.user.set_password('newpass123')
+        self.user.save()
+        self.assertEqual(self.login('newpass123').status_code, 200)
+
+    def test_inactive_users_are_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.login('loginpass123').status_code, 401)
+
+    def test_busy_slots_shed_logins(self):
+        with mock.patch.object(login.hashing_slots, 'hold', side_effect=login.LoginBusy):
+            response = self.login('loginpass123')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_slots_bound_work_in_flight(self):
+        slots = login.HashingSlots(size=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def hold():
+            with slots.hold():
+                started.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        started.wait(5)
+        with self.assertRaises(login.LoginBusy):
+            with slots.hold():
+                pass
+        release.set()
+        thread.join()
+        with slots.hold():
+            pass
+
+
+class SingleUserBackend:
+    """Authenticates loginuser with a password that isn't stored locally"""
+
+    def authenticate(self, request, username=None, password=None):
+        if username == 'loginuser' and password == 'backendpass':
+            return User.objects.get(username=username)
+        return None
+
+    def get_user(self, user_id):
+        return User.objects.filter(pk=user_id).first()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, MEDIA_JOBS_IN_PROCESS=False)
+class MediaJobTestCase(APITestCase):
+    """Test cases for the media post job queue"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='mediauser', password='mediapass123')
+        self.client.force_authenticate(user=self.user)
+
+    def create(self, post_type='image', **metadata):
+        return PostFactory.create_post(post_type, f'A {post_type}', metadata=metadata, author=self.user)
+
+    def test_metadata_is_normalized(self):
+        self.assertEqual(media.parse_size('2.5 MB'), 2500000)
+        self.assertEqual(media.parse_size('1KiB'), 1024)
+        self.assertEqual(media.parse_duration('1:02:03'), 3723)
+        self.assertEqual(media.parse_duration('90s'), 90)
+        self.assertEqual(media.thumbnail_size(1920, 1080), {'width': 320, 'height': 180})
+        self.assertEqual(media.thumbnail_size(100, 50), {'width': 100, 'height': 50})
+        result = media.process('video', {'duration': '1:40', 'file_size': '25 MB', 'resolution': '1080x1920'})
+        self.assertEqual(result['poster_at'], 10.0)
+        self.assertEqual(result['bitrate_kbps'], 2000.0)
+        self.assertEqual(result['orientation'], 'portrait')
+        for bad in ('lots', '-1', '5 parsecs'):
+            with self.assertRaises(ValueError):
+                media.parse_size(bad)
+
+    def test_only_media_posts_are_queued(self):
+        image = self.create(file_size=1024)
+        text = self.create('text')
+        self.assertEqual(image.media_job.status, MediaJob.PENDING)
+        self.assertFalse(MediaJob.objects.filter(post=text).exists())
+        created, _ = PostFactory.create_posts(
+            [{'post_type': 'video', 'title': 'Clip', 'metadata': {'duration': 30}}, {'title': 'Words'}],
+            author=self.user,
+        )
+        self.assertEqual(MediaJob.objects.filter(post__in=created).count(), 1)
+        response = self.client.post('/posts/', {
+            'title': 'Via the API', 'content': 'A photo', 'post_type': 'image', 'metadata': {'file_size': 2048},
+            'author': self.user.id,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(MediaJob.objects.get(post_id=response.data['id']).status, MediaJob.PENDING)
+
+    def test_create_returns_before_processing(self):
+        response = self.client.post('/posts/create/', {
+            'post_type': 'image', 'title': 'Photo', 'metadata': {'file_size': '3 MB', 'width': 640, 'height': 480},
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['media_status'], 'pending')
+        post_id = response.data['post_id']
+        self.assertNotIn('media', Post.objects.get(pk=post_id).metadata)
+
+        self.assertEqual(media_jobs.run_once(), 1)
+        response = self.client.get(f'/posts/{post_id}/media/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], MediaJob.DONE)
+        self.assertEqual(response.data['attempts'], 1)
+        self.assertEqual(response.data['media']['file_size_bytes'], 3000000)
+        self.assertEqual(response.data['media']['thumbnail'], {'width': 320, 'height': 240})
+        # The original metadata is kept alongside the result
+        self.assertEqual(Post.objects.get(pk=post_id).metadata['width'], 640)
+
+    def test_status_of_missing_and_text_posts(self):
+        text = self.create('text')
+        self.assertEqual(self.client.get(f'/posts/{text.pk}/media/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/posts/999999/media/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_metadata_fails_without_retry(self):
+        post = self.create(file_size='huge')
+        media_jobs.run_once()
+        job = MediaJob.objects.get(post=post)
+        self.assertEqual(job.status, MediaJob.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('huge', job.error)
+        self.assertEqual(media_jobs.run_once(), 0)
+
+    def test_unexpected_errors_are_retried(self):
+        post = self.create(file_size=10)
+        with override_settings(MEDIA_JOB_MAX_ATTEMPTS=2), \
+                mock.patch.object(media, 'process', side_effect=RuntimeError('disk on fire')):
+            media_jobs.run_once()
+            self.assertEqual(MediaJob.objects.get(post=post).status, MediaJob.PENDING)
+            media_jobs.run_once()
+        job = MediaJob.objects.get(post=post)
+        self.assertEqual(job.status, MediaJob.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('disk on fire', job.error)
+
+    def test_abandoned_jobs_are_reclaimed(self):
+        post = self.create(file_size=10)
+        self.assertEqual(len(media_jobs.claim(10)), 1)
+        # Claimed jobs are not handed out twice
+        self.assertEqual(media_jobs.claim(10), [])
+        MediaJob.objects.filter(post=post).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(media_jobs.run_once(), 1)
+        job = MediaJob.objects.get(post=post)
+        self.assertEqual((job.status, job.attempts), (MediaJob.DONE, 2))
+
+    def test_finished_jobs_are_pruned(self):
+        done, failed = self.create(file_size=10), self.create(file_size='huge')
+        media_jobs.run_once()
+        MediaJob.objects.update(finished_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(scheduler.run_task('prune_media_jobs').result, {'deleted': 1})
+        self.assertEqual(list(MediaJob.objects.values_list('post', flat=True)), [failed.pk])
+        # The result outlives its job
+        response = self.client.get(f'/posts/{done.pk}/media/')
+        self.assertEqual(response.data['status'], MediaJob.DONE)
+        self.assertEqual(response.data['media']['file_size_bytes'], 10)
+
+    def test_worker_pool_drains_the_queue(self):
+        posts = [self.create(file_size=f'{n + 1} KB') for n in range(6)]
+        runner = media_jobs.MediaJobRunner(workers=2, batch_size=4)
+        self.addCleanup(runner.stop)
+        self.assertEqual(runner.drain(), 6)
+        sizes = [Post.objects.get(pk=post.pk).metadata['media']['file_size_bytes'] for post in posts]
+        self.assertEqual(sizes, [1000 * (n + 1) for n in range(6)])
+
+    def test_command_processes_pending_jobs(self):
+        post = self.create('video', duration=12)
+        out = StringIO()
+        call_command('process_media', workers=0, stdout=out)
+        self.assertIn('Processed 1 media jobs', out.getvalue())
+        self.assertEqual(MediaJob.objects.get(post=post).status, MediaJob.DONE)
+
+
+class ScheduleTestCase(SimpleTestCase):
+    """Test cases for interval and cron schedule parsing"""
+
+    def at(self, text):
+        return timezone.make_aware(timezone.datetime.fromisoformat(text))
+
+    def test_intervals(self):
+        self.assertEqual(scheduler.parse_schedule('every 90s').seconds, 90)
+        self.assertEqual(scheduler.parse_schedule('every 5m').seconds, 300)
+        self.assertEqual(scheduler.parse_schedule('every 2h').next_after(self.at('2026-01-01 00:00')),
+                         self.at('2026-01-01 02:00'))
+
+    def test_cron_next_run(self):
+        cases = [
+            ('30 3 * * *', '2026-01-01 03:30', '2026-01-02 03:30'),
+            ('*/15 * * * *', '2026-01-01 10:07', '2026-01-01 10:15'),
+            ('0 9 * * 1-5', '2026-01-02 09:00', '2026-01-05 09:00'),  # Friday to Monday
+            ('0 0 29 2 *', '2026-03-01 00:00', '2028-02-29 00:00'),
+            ('0 0 13 * 5', '2026-01-01 00:00', '2026-01-02 00:00'),  # the 13th or any Friday
+            ('@monthly', '2026-12-15 12:00', '2027-01-01 00:00'),
+        ]
+        for spec, after, expected in cases:
+            with self.subTest(spec=spec):
+                self.assertEqual(scheduler.parse_schedule(spec).next_after(self.at(after)), self.at(expected))
+
+    def test_search_rebuild_only_runs_on_demand(self):
+        self.assertIn('rebuild_search_index', scheduler.TASKS)
+        self.assertNotIn('rebuild_search_index', scheduler.schedules())
+        self.assertIn('reconcile_counters', scheduler.schedules())
+
+    def test_invalid_schedules(self):
+        for spec in ('every 0s', '* * * *', '60 * * * *', '*/0 * * * *', '0 0 30 2 *', 'soon', 5):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                scheduler.parse_schedule(spec)
+
+
+class SchedulerTestCase(TestCase):
+    """Test cases for the run log, overlap guard and due-task selection"""
+
+    def setUp(self):
+        self.calls = []
+        self.enterContext(mock.patch.dict(scheduler.TASKS, clear=True))
+        scheduler.register('tick', lambda: self.calls.append('tick') or {'done': 1}, 'every 10m')
+        scheduler.register('nightly', lambda: 'ok', '0 3 * * *')
+
+    def test_runs_are_logged(self):
+        run = scheduler.run_task('tick')
+        self.assertEqual(run.status, TaskRun.SUCCEEDED)
+        stored = TaskRun.objects.get(pk=run.pk)
+        self.assertEqual((stored.status, stored.result), (TaskRun.SUCCEEDED, {'done': 1}))
+        self.assertIsNotNone(stored.finished_at)
+
+    def test_failures_are_logged(self):
+        scheduler.register('broken', mock.Mock(side_effect=RuntimeError('no disk')), 'every 1m')
+        run = scheduler.run_task('broken')
+        stored = TaskRun.objects.get(pk=run.pk)
+        self.assertEqual(stored.status, TaskRun.FAILED)
+        self.assertEqual(stored.error, 'RuntimeError: no disk')
+
+    def test_overlapping_runs_are_skipped(self):
+        TaskRun.objects.create(task='tick', status=TaskRun.RUNNING, host='elsewhere')
+        run = scheduler.run_task('tick')
+        self.assertEqual(run.status, TaskRun.SKIPPED)
+        self.assertEqual(self.calls, [])
+        # A run that outlived the task's timeout was abandoned by a dead scheduler
+        TaskRun.objects.filter(status=TaskRun.RUNNING).update(started_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(scheduler.run_task('tick').status, TaskRun.SUCCEEDED)
+        self.assertEqual(TaskRun.objects.get(host='elsewhere').status, TaskRun.FAILED)
+
+    def test_next_runs_follow_the_run_log(self):
+        now = timezone.now()
+        runner = scheduler.Scheduler()
+        runner.started_at = now
+        TaskRun.objects.create(task='tick', status=TaskRun.SUCCEEDED, started_at=now - timedelta(minutes=4))
+        due = runner.next_runs(now)
+        self.assertEqual(due['tick'], now + timedelta(minutes=6))
+        self.assertEqual(due['nightly'], scheduler.parse_schedule('0 3 * * *').next_after(now))
+
+    def test_config_overrides_schedules(self):
+        with ConfigManager().override(SCHEDULED_TASKS={'tick': None, 'nightly': 'every 1h'}):
+            plan = scheduler.schedules()
+        self.assertNotIn('tick', plan)
+        self.assertEqual(plan['nightly'].seconds, 3600)
+
+    def test_command_runs_tasks_on_demand(self):
+        out = StringIO()
+        call_command('run_scheduler', run=['nightly'], stdout=out)
+        self.assertIn('nightly: succeeded ok', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('run_scheduler', run=['nope'], stdout=out)
+
+
+class SchedulerPoolTestCase(TransactionTestCase):
+    """Due tasks run on the scheduler's worker threads"""
+
+    def test_tick_submits_due_tasks_once(self):
+        calls = []
+        self.enterContext(mock.patch.dict(scheduler.TASKS, clear=True))
+        scheduler.register('tick', lambda: calls.append('tick'), 'every 10m')
+        scheduler.register('nightly', lambda: calls.append('nightly'), '0 3 * * *')
+        runner = scheduler.Scheduler(workers=2)
+        self.addCleanup(runner.stop)
+        self.assertEqual(runner.tick(), ['tick'])
+        runner.wait()
+        self.assertEqual(runner.tick(), [])
+        self.assertEqual(calls, ['tick'])
+        self.assertEqual(TaskRun.objects.get(task='tick').status, TaskRun.SUCCEEDED)
@@ -0,0 +1,146 @@
+"""
+Rate limiting for the write endpoints.
+
+ConfigRateThrottle allows RATE_LIMIT write requests (POST, PUT, PATCH, DELETE)
+per RATE_LIMIT_PERIOD seconds for each user and endpoint (URL name), both
+read from ConfigManager on every check. RATE_LIMIT_ENDPOINTS overrides the
+limit of single endpoints; a limit of 0 or None turns throttling off.
+
+The default store (RATE_LIMIT_BACKEND=memory) is a token bucket per key held
+in this process: a check takes one of RATE_LIMIT_STRIPES locks, chosen by the
+key's hash, and does a little arithmetic. No database or cache round trip, and
+threads only contend when their keys share a stripe. Each worker process
+counts separately, so a client spread over N workers gets up to N times the
+limit.
+
+RATE_LIMIT_BACKEND=filebased counts in the `ratelimit` cache instead, which
+the workers on one host share, with a sliding-window counter. It costs a few
+file reads per check and, since FileBasedCache increments aren't atomic
+between processes, can let a few extra requests through under contention.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from singletons.config_manager import ConfigManager
+
+RATE_LIMIT_STRIPES = 64
+# A stripe is swept for idle (refilled) buckets once it holds this many keys
+PRUNE_THRESHOLD = 4096
+
+
+class TokenBucketStore:
+    """In-process token buckets behind striped locks"""
+
+    def __init__(self, stripes=RATE_LIMIT_STRIPES):
+        # key -> (tokens, last update, time the bucket is full again)
+        self._stripes = [(threading.Lock(), {}) for _ in range(stripes)]
+
+    def consume(self, key, limit, period, now=None):
+        """Take a token from `key`'s bucket. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic() if now is None else now
+        rate = limit / period
+        lock, buckets = self._stripes[hash(key) % len(self._stripes)]
+        with lock:
+            tokens, updated, _ = buckets.get(key, (limit, now, now))
+            tokens = min(limit, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            buckets[key] = (tokens, now, now + (limit - tokens) / rate)
+            if len(buckets) > PRUNE_THRESHOLD:
+                self._prune(buckets, now)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    @staticmethod
+    def _prune(buckets, now):
+        # A full bucket is the same as no bucket
+        for key in [key for key, (_, _, full_at) in buckets.items() if full_at <= now]:
+            del buckets[key]
+
+    def reset(self):
+        for lock, buckets in self._stripes:
+            with lock:
+                buckets.clear()
+
+
+class CacheWindowStore:
+    """Sliding-window counters in a Django cache shared between processes"""
+
+    def __init__(self, alias='ratelimit'):
+        self.alias = alias
+
+    def consume(self, key, limit, period, now=None):
+        cache = caches[self.alias]
+        now = time.time() if now is None else now
+        window, elapsed = divmod(now / period, 1)
+        current, previous = f'ratelimit:{key}:{int(window)}', f'ratelimit:{key}:{int(window) - 1}'
+        counts = cache.get_many([previous, current])
+        # The previous window's requests count for the part of it still inside the sliding period
+        in_previous, in_current = counts.get(previous, 0), counts.get(current, 0)
+        if in_previous * (1 - elapsed) + in_current + 1 > limit:
+            if in_current + 1 > limit:
+                wait = 1 - elapsed
+            else:
+                wait = 1 - (limit - 1 - in_current) / in_previous - elapsed
+            return False, max(wait, 0.0) * period
+        if not cache.add(current, 1, timeout=2 * period):
+            try:
+                cache.incr(current)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(current, 1, timeout=2 * period)
+        return True, 0.0
+
+    def reset(self):
+        caches[self.alias].clear()
+
+
+memory_store = TokenBucketStore()
+
+
+def get_store():
+    if settings.RATE_LIMIT_BACKEND == 'memory':
+        return memory_store
+    return CacheWindowStore()
+
+
+def endpoint_limit(endpoint):
+    """(limit, period in seconds) for `endpoint` from ConfigManager; limit 0/None means unlimited"""
+    config = ConfigManager()
+    overrides = config.get_setting('RATE_LIMIT_ENDPOINTS') or {}
+    limit = overrides.get(endpoint, config.get_setting('RATE_LIMIT'))
+    return limit, config.get_setting('RATE_LIMIT_PERIOD')
+
+
+class ConfigRateThrottle(BaseThrottle):
+    """Per user and endpoint limit on write requests (see module docstring)"""
+
+    def __init__(self):
+        self.retry_after = None
+
+    @staticmethod
+    def endpoint(request, view):
+        match = getattr(request, 'resolver_match', None)
+        return match.url_name if match and match.url_name else type(view).__name__
+
+    def get_key(self, request, view):
+        user = request.user
+        client = f'user:{user.pk}' if user and user.is_authenticated else f'ip:{self.get_ident(request)}'
+        return f'{self.endpoint(request, view)}:{client}'
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        limit, period = endpoint_limit(self.endpoint(request, view))
+        if not limit:
+            return True
+        allowed, self.retry_after = get_store().consume(self.get_key(request, view), limit, period)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
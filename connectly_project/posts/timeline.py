@@ -0,0 +1,120 @@
+"""
+Personalized home timelines.
+
+Posts are fanned out on write: PostFactory copies each new post into the
+TimelineEntry rows of the author's followers, so reading a home feed page is
+a single range read on (owner, created_at, post). Authors with more than
+FANOUT_FOLLOWER_LIMIT followers are skipped on write and their posts are
+merged in at read time from the (author, created_at) index instead.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from singletons.config_manager import ConfigManager
+from .models import Follow, Post, TimelineEntry, User
+from .pagination import keyset_filter
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def fanout_limit():
+    return ConfigManager().get_setting('FANOUT_FOLLOWER_LIMIT')
+
+
+def fan_out_post(post):
+    """Fan out one post; see fan_out_posts"""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """
+    Copy posts into the home timelines of their authors and, for regular authors,
+    of every follower. Rows are written in batches of FANOUT_BATCH_SIZE.
+    """
+    posts = [post for post in posts if post.author_id is not None]
+    if not posts:
+        return
+
+    author_ids = {post.author_id for post in posts}
+    pushed_authors = set(
+        User.objects.filter(pk__in=author_ids, follower_count__lte=fanout_limit()).values_list('pk', flat=True)
+    )
+
+    batch = [TimelineEntry(owner_id=post.author_id, post=post, created_at=post.created_at) for post in posts]
+    for author_id in pushed_authors:
+        authored = [post for post in posts if post.author_id == author_id]
+        followers = (
+            Follow.objects.filter(followee_id=author_id)
+            .values_list('follower_id', flat=True)
+            .iterator(chunk_size=FANOUT_BATCH_SIZE)
+        )
+        for follower_id in followers:
+            batch.extend(
+                TimelineEntry(owner_id=follower_id, post=post, created_at=post.created_at) for post in authored
+            )
+            if len(batch) >= FANOUT_BATCH_SIZE:
+                TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def follow(follower, followee):
+    """
+    Create the follow edge and backfill the followee's recent posts.
+    Raises ValueError for self-follows and IntegrityError if the edge already exists.
+    """
+    if follower.pk == followee.pk:
+        raise ValueError("You cannot follow yourself")
+
+    with transaction.atomic():
+        Follow.objects.create(follower=follower, followee=followee)
+        User.objects.filter(pk=followee.pk).update(follower_count=F('follower_count') + 1)
+
+        backfill = ConfigManager().get_setting('TIMELINE_BACKFILL_SIZE')
+        recent = Post.objects.filter(author=followee).order_by('-created_at', '-id').values_list('pk', 'created_at')
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner=follower, post_id=pk, created_at=created_at) for pk, created_at in recent[:backfill]],
+            ignore_conflicts=True,
+        )
+
+
+def unfollow(follower, followee):
+    """Remove the follow edge and its timeline rows. Returns False if there was no edge."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, followee=followee).delete()
+        if not deleted:
+            return False
+        User.objects.filter(pk=followee.pk).update(follower_count=F('follower_count') - 1)
+        TimelineEntry.objects.filter(owner=follower, post__author=followee).delete()
+    return True
+
+
+def home_timeline(user, position, limit, queryset=None):
+    """
+    Up to `limit` posts for `user`'s home feed older than the keyset `position`,
+    newest first. Merges the materialized timeline with posts pulled from
+    followed authors that are above the fan-out limit. The posts are loaded
+    from `queryset` (default: Post.objects.for_listing()).
+    """
+    entries = TimelineEntry.objects.filter(owner=user)
+    if position is not None:
+        entries = entries.filter(keyset_filter(position, id_field='post_id'))
+    rows = set(entries.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[:limit])
+
+    pulled_authors = Follow.objects.filter(
+        follower=user, followee__follower_count__gt=fanout_limit()
+    ).values_list('followee_id', flat=True)
+    for author_id in pulled_authors:
+        # One bounded range read on (author, created_at) per popular author
+        authored = Post.objects.filter(author_id=author_id)
+        if position is not None:
+            authored = authored.filter(keyset_filter(position))
+        rows.update(authored.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit])
+    page = sorted(rows, reverse=True)[:limit]
+
+    if queryset is None:
+        queryset = Post.objects.for_listing()
+    posts = queryset.in_bulk([pk for _, pk in page])
+    return [posts[pk] for _, pk in page if pk in posts]
+
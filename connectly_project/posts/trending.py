@@ -0,0 +1,178 @@
+"""
+Trending ("hot") ranking.
+
+Every post, like and comment is an event worth TRENDING_WEIGHTS[kind] that
+halves in value every TRENDING_HALF_LIFE_HOURS. A post's hotness is the sum of
+its decayed events. Because all events decay at the same rate, the ranking
+never changes by itself; only new events move it. So instead of re-decaying
+every post on each refresh, each event is stored pre-scaled to a fixed epoch:
+
+    log2(weight) + (event time - EPOCH) / half life
+
+and a post's PostScore.score is the log2 of the sum of its events (combined
+with log2_add, which can't overflow). Ordering by score is ordering by current
+hotness, and refresh() only reads the events added since its checkpoint.
+
+Ids are handed out before transactions commit, so a row below the checkpoint
+can still appear (a lower id committing after a higher one was read). Only ids
+skipped just before a row created in the last GAP_SECONDS can still be in
+flight; those are kept in the checkpoint (at most MAX_GAPS per kind) and looked
+up on the next refreshes. A gap still missing once it is GAP_SECONDS old is a
+deleted row and is dropped after that lookup.
+
+Unlikes and deleted comments don't lower a score (the event happened), but a
+user's like of a post counts once (ScoredLike), so toggling like/unlike can't
+pump a score. After changing the half-life or weights, run
+`refresh_trending --full`.
+"""
+import math
+import time
+from datetime import datetime, timezone
+
+from django.db import transaction
+from django.db.models import F
+
+from singletons.config_manager import ConfigManager
+from .models import Comment, Like, Post, PostScore, RankingCheckpoint, ScoredLike
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+CHECKPOINT = 'trending'
+# How long an id missing below the checkpoint is waited for (longer than any write
+# transaction), and how many are kept per event kind
+GAP_SECONDS = 60
+MAX_GAPS = 1000
+
+# (event kind, model, field holding the post id, checkpoint attribute)
+SOURCES = (
+    ('post', Post, 'pk', 'last_post_id'),
+    ('like', Like, 'post_id', 'last_like_id'),
+    ('comment', Comment, 'post_id', 'last_comment_id'),
+)
+
+
+def log2_add(a, b):
+    """log2(2**a + 2**b) without leaving log space"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def event_score(weight, at, half_life_seconds):
+    return math.log2(weight) + (at - EPOCH).total_seconds() / half_life_seconds
+
+
+def refresh(batch_size=1000, full=False):
+    """
+    Fold the events created since the last run into PostScore. Each batch and the
+    checkpoint move together in one transaction, so an interrupted run resumes
+    where it stopped. Returns the number of events read per kind.
+    """
+    config = ConfigManager()
+    half_life = config.get_setting('TRENDING_HALF_LIFE_HOURS') * 3600
+    weights = config.get_setting('TRENDING_WEIGHTS')
+
+    if full:
+        with transaction.atomic():
+            PostScore.objects.all().delete()
+            ScoredLike.objects.all().delete()
+            RankingCheckpoint.objects.filter(name=CHECKPOINT).delete()
+    checkpoint, _ = RankingCheckpoint.objects.get_or_create(name=CHECKPOINT)
+
+    processed = {}
+    for kind, model, post_field, attr in SOURCES:
+        processed[kind] = 0
+        if not weights.get(kind):
+            continue
+        fields = ('pk', post_field, 'created_at') + (('user_id',) if kind == 'like' else ())
+        events = model.objects.order_by('pk').values_list(*fields)
+        now = time.time()
+
+        gaps = checkpoint.gaps.get(kind, {})
+        if gaps:
+            with transaction.atomic():
+                rows = list(events.filter(pk__in=[int(pk) for pk in gaps]))
+                _fold(kind, rows, weights[kind], half_life)
+                found = {str(row[0]) for row in rows}
+                # Missing past the wait: deleted, not in flight
+                gaps = {pk: seen for pk, seen in gaps.items() if pk not in found and now - seen < GAP_SECONDS}
+                checkpoint.gaps = {**checkpoint.gaps, kind: gaps}
+                checkpoint.save()
+            processed[kind] += len(rows)
+
+        while True:
+            with transaction.atomic():
+                last = getattr(checkpoint, attr)
+                rows = list(events.filter(pk__gt=last)[:batch_size])
+                if not rows:
+                    break
+                _fold(kind, rows, weights[kind], half_life)
+                gaps.update((str(pk), now) for pk in _in_flight(last, rows, now - GAP_SECONDS))
+                if len(gaps) > MAX_GAPS:
+                    gaps = dict(sorted(gaps.items(), key=lambda item: int(item[0]))[-MAX_GAPS:])
+                checkpoint.gaps = {**checkpoint.gaps, kind: gaps}
+                setattr(checkpoint, attr, rows[-1][0])
+                checkpoint.save()
+            processed[kind] += len(rows)
+    return processed
+
+
+def _in_flight(last, rows, horizon):
+    """
+    Ids skipped between the pk-ordered rows that may belong to uncommitted rows.
+    An id is handed out before any higher one, so ids skipped before a row created
+    before `horizon` were allocated even earlier and can only be deleted rows.
+    """
+    previous = last
+    for pk, _, created_at, *_ in rows:
+        if created_at.timestamp() >= horizon:
+            yield from range(max(previous + 1, pk - MAX_GAPS), pk)
+        previous = pk
+
+
+def _fold(kind, rows, weight, half_life):
+    """Add the rows' events to their posts' scores"""
+    if kind == 'like':
+        rows = _first_likes(rows)
+    gains = {}
+    for _, post_id, created_at, *_ in rows:
+        gain = event_score(weight, created_at, half_life)
+        gains[post_id] = log2_add(gains[post_id], gain) if post_id in gains else gain
+    if gains:
+        _apply(gains)
+
+
+def _first_likes(rows):
+    """The like rows whose (user, post) pair hasn't been counted before, now marked as counted"""
+    # Rows are (pk, post_id, created_at, user_id); a pair liked twice in one batch counts once
+    pairs = {(row[3], row[1]): row for row in rows}
+    counted = set(
+        ScoredLike.objects.filter(user_id__in={user for user, _ in pairs}, post_id__in={post for _, post in pairs})
+        .values_list('user_id', 'post_id')
+    )
+    alive = set(Post.objects.filter(pk__in={post for _, post in pairs}).values_list('pk', flat=True))
+    fresh = {pair: row for pair, row in pairs.items() if pair not in counted and pair[1] in alive}
+    ScoredLike.objects.bulk_create(
+        [ScoredLike(user_id=user_id, post_id=post_id) for user_id, post_id in fresh], ignore_conflicts=True
+    )
+    return list(fresh.values())
+
+
+def _apply(gains):
+    """Add log-space gains to the posts' scores with one upsert"""
+    # Skip posts deleted since their events were read
+    alive = set(Post.objects.filter(pk__in=gains).values_list('pk', flat=True))
+    current = dict(PostScore.objects.filter(post_id__in=alive).values_list('post_id', 'score'))
+    PostScore.objects.bulk_create(
+        [
+            PostScore(post_id=post_id, score=log2_add(current[post_id], gain) if post_id in current else gain)
+            for post_id, gain in gains.items() if post_id in alive
+        ],
+        update_conflicts=True, unique_fields=['post'], update_fields=['score', 'updated_at'],
+    )
+
+
+def hot_posts():
+    """Posts with a score as `hot`, hottest first (an index range scan on PostScore)"""
+    return (
+        Post.objects.for_listing().filter(hot_score__isnull=False).annotate(hot=F('hot_score__score'))
+        .order_by('-hot_score__score', '-hot_score__post')
+    )
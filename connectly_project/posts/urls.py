@@ -1,21 +1,37 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from .views import (
     UserListCreate, PostListCreate, CommentListCreate, PostDetailView, 
     CreatePostView, LikePostView, CommentOnPostView, PostCommentsView,
-    AuthenticatedUserProfileView, NewsFeedView # Added for user profile and NewsFeed
+    AuthenticatedUserProfileView, NewsFeedView, # Added for user profile and NewsFeed
+    FollowUserView, CacheStatsView, BulkCreatePostsView, ExportView, RequestMetricsView, BatchLikeView, SearchView,
+    PostMediaView,
 )
 
 urlpatterns = [
     path('users/', UserListCreate.as_view(), name='user-list-create'),
     path('users/me/', AuthenticatedUserProfileView.as_view(), name='user-profile'), # Added for user profile
+    path('users/<int:pk>/follow/', FollowUserView.as_view(), name='user-follow'),
     path('feed/', NewsFeedView.as_view(), name='news-feed'), # New News Feed Endpoint
     path('', PostListCreate.as_view(), name='post-list-create'),
     path('create/', CreatePostView.as_view(), name='post-create-factory'),
+    path('bulk/', BulkCreatePostsView.as_view(), name='post-bulk-create'),
+    path('like/', BatchLikeView.as_view(), name='post-like-batch'),
     path('<int:pk>/', PostDetailView.as_view(), name='post-detail'),
     path('<int:pk>/like/', LikePostView.as_view(), name='post-like'),
     path('<int:pk>/comment/', CommentOnPostView.as_view(), name='post-comment'),
     path('<int:pk>/comments/', PostCommentsView.as_view(), name='post-comments-list'),
+    path('<int:pk>/media/', PostMediaView.as_view(), name='post-media'),
+    path('search/', SearchView.as_view(), name='post-search'),
     path('comments/', CommentListCreate.as_view(), name='comment-list-create'),
     path('authenticate/', views.authenticate_user, name='authenticate-user'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('metrics/', RequestMetricsView.as_view(), name='request-metrics'),
+    path('export/<str:kind>/', ExportView.as_view(), name='export'),
 ]
+
+if settings.ASYNC_API_VIEWS:
+    # Same URLs served by the native async views (see posts/async_views.py)
+    from .async_views import async_urlpatterns
+    urlpatterns = async_urlpatterns(urlpatterns)
@@ -1,30 +1,43 @@
 import json
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.contrib.auth import authenticate
-from django.db import IntegrityError
+from django.db import IntegrityError, NotSupportedError, transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.pagination import PageNumberPagination
-from .models import Post, Comment, User, Like
-from .serializers import UserSerializer, PostSerializer, CommentSerializer, LikeSerializer
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.urls import replace_query_param
+from .authentication import CachedTokenAuthentication
+from .models import Post, Comment, User, Like, MediaJob
+from .serializers import UserSerializer, PostSerializer, CommentSerializer, LikeSerializer, sparse_fieldset
+from .pagination import ConfigPageSizeMixin, HotKeysetPagination, KeysetPagination
+from .throttling import ConfigRateThrottle
+from .parsers import NDJSONParser
+from . import export
+from .cache import response_cache
+from .metrics import histogram
+from .signals import notify_interaction, notify_posts_created
+from . import likes, login, media_jobs, search, timeline, trending
 from singletons.logger_singleton import LoggerSingleton
 from singletons.config_manager import ConfigManager
 from factories.post_factory import PostFactory
 
 logger = LoggerSingleton().get_logger()
+# Per-request read lines; sampled via LOG_SAMPLE_RATES
+access_logger = LoggerSingleton().get_logger('access')
 logger.info("API initialized successfully.")
 
 def get_users(request):
     try:
-        users = list(User.objects.values('id', 'username', 'email', 'created_at'))
-        logger.info(f"Retrieved {len(users)} users")
-        return JsonResponse(users, safe=False)
+        # Streamed as a JSON array so memory stays flat however many users there are
+        users = User.objects.values('id', 'username', 'email', 'created_at').iterator(chunk_size=export.DEFAULT_CHUNK_SIZE)
+        access_logger.info("Streaming users")
+        return StreamingHttpResponse(export.json_array(users), content_type='application/json')
     except Exception as e:
-        logger.error(f"Error retrieving users: {str(e)}")
+        logger.error("Error retrieving users: %s", e)
         return JsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
@@ -33,10 +46,10 @@ def create_user(request):
         try:
             data = json.loads(request.body)
             user = User.objects.create_user(username=data['username'], password=data.get('password', 'secure_pass123'), email=data.get('email', ''))
-            logger.info(f"User created successfully: {user.username}")
+            logger.info("User created successfully: %s", user.username)
             return JsonResponse({'id': user.id, 'username': user.username, 'message': 'User created successfully'}, status=201)
         except Exception as e:
-            logger.error(f"Error creating user: {str(e)}")
+            logger.error("Error creating user: %s", e)
             return JsonResponse({'error': str(e)}, status=400)
 
 @csrf_exempt
@@ -44,24 +57,28 @@ def authenticate_user(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            user = authenticate(username=data['username'], password=data['password'])
+            user = login.authenticate(data['username'], data['password'], request)
             if user is not None:
-                logger.info(f"Authentication successful for user: {user.username}")
+                logger.info("Authentication successful for user: %s", user.username)
                 return JsonResponse({'message': 'Authentication successful!', 'username': user.username}, status=200)
             else:
-                logger.warning(f"Invalid credentials attempt for username: {data.get('username', 'unknown')}")
+                logger.warning("Invalid credentials attempt for username: %s", data.get('username', 'unknown'))
                 return JsonResponse({'message': 'Invalid credentials.'}, status=401)
+        except login.LoginBusy:
+            logger.warning("Every login hashing slot is taken, turning away authentication request")
+            return JsonResponse({'error': 'Too many logins in progress, try again shortly.'}, status=503,
+                                headers={'Retry-After': '1'})
         except Exception as e:
-            logger.error(f"Error during authentication: {str(e)}")
+            logger.error("Error during authentication: %s", e)
             return JsonResponse({'error': str(e)}, status=400)
 
 def get_posts(request):
     try:
-        posts = list(Post.objects.values('id', 'content', 'author', 'created_at'))
-        logger.info(f"Retrieved {len(posts)} posts")
-        return JsonResponse(posts, safe=False)
+        posts = Post.objects.values('id', 'content', 'author', 'created_at').iterator(chunk_size=export.DEFAULT_CHUNK_SIZE)
+        access_logger.info("Streaming posts")
+        return StreamingHttpResponse(export.json_array(posts), content_type='application/json')
     except Exception as e:
-        logger.error(f"Error retrieving posts: {str(e)}")
+        logger.error("Error retrieving posts: %s", e)
         return JsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
@@ -71,23 +88,24 @@ def create_post(request):
             data = json.loads(request.body)
             author = User.objects.get(id=data['author'])
             post = Post.objects.create(content=data['content'], author=author)
-            logger.info(f"Post created successfully by user {author.username}: Post ID {post.id}")
+            logger.info("Post created successfully by user %s: Post ID %s", author.username, post.id)
             return JsonResponse({'id': post.id, 'message': 'Post created successfully'}, status=201)
         except User.DoesNotExist:
-            logger.error(f"Author not found with ID: {data.get('author', 'unknown')}")
+            logger.error("Author not found with ID: %s", data.get('author', 'unknown'))
             return JsonResponse({'error': 'Author not found'}, status=404)
         except Exception as e:
-            logger.error(f"Error creating post: {str(e)}")
+            logger.error("Error creating post: %s", e)
             return JsonResponse({'error': str(e)}, status=400)
 
 
 class UserListCreate(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
+        fieldset = sparse_fieldset(request)
+        users = UserSerializer.narrow(User.objects.all(), **fieldset)
+        serializer = UserSerializer(users, many=True, **fieldset)
         return Response(serializer.data)
 
 
@@ -103,42 +121,52 @@ class UserListCreate(APIView):
         try:
             # Create user with password hashing
             user = User.objects.create_user(username=username, email=email, password=password)
-            logger.info(f"User created via API: {user.username}")
+            logger.info("User created via API: %s", user.username)
             serializer = UserSerializer(user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
-            logger.error(f"Error creating user via API: {str(e)}")
+            logger.error("Error creating user via API: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class PostListCreate(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ConfigRateThrottle]
 
     def get(self, request):
-        posts = Post.objects.all()
-        serializer = PostSerializer(posts, many=True)
+        fieldset = sparse_fieldset(request)
+        posts = PostSerializer.narrow(Post.objects.all(), **fieldset)
+        serializer = PostSerializer(posts, many=True, **fieldset)
         return Response(serializer.data)
 
 
     def post(self, request):
         serializer = PostSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            logger.info(f"Post created via API by user: {request.user.username}")
+            with transaction.atomic():
+                post = serializer.save()
+                timeline.fan_out_posts([post])
+                media_jobs.enqueue([post])
+                notify_posts_created([post])
+            logger.info("Post created via API by user: %s", request.user.username)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        logger.warning(f"Invalid post data: {serializer.errors}")
+        logger.warning("Invalid post data: %s", serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class CommentListCreate(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ConfigRateThrottle]
 
     def get(self, request):
-        comments = Comment.objects.all()
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        # Serialize one comment at a time while the rows are fetched in chunks
+        fieldset = sparse_fieldset(request)
+        comments = CommentSerializer.narrow(Comment.objects.all(), **fieldset)
+        comments = comments.iterator(chunk_size=export.DEFAULT_CHUNK_SIZE)
+        data = (CommentSerializer(comment, **fieldset).data for comment in comments)
+        return StreamingHttpResponse(export.json_array(data), content_type='application/json')
 
 
     def post(self, request):
@@ -147,16 +175,19 @@ class CommentListCreate(APIView):
             post_id = request.data.get('post')
             post = Post.objects.get(pk=post_id)
         except (Post.DoesNotExist, TypeError):
-            logger.error(f"Post not found or invalid post ID in comment creation")
+            logger.error("Post not found or invalid post ID in comment creation")
             return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
         
         serializer = CommentSerializer(data=request.data)
         if serializer.is_valid():
             # Set author from authenticated user
-            serializer.save(author=request.user, post=post)
-            logger.info(f"Comment created via API by user: {request.user.username}")
+            with transaction.atomic():
+                serializer.save(author=request.user, post=post)
+                Post.objects.filter(pk=post.pk).adjust_counters(comments=1)
+                notify_interaction(post.pk, 'comment')
+            logger.info("Comment created via API by user: %s", request.user.username)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        logger.warning(f"Invalid comment data: {serializer.errors}")
+        logger.warning("Invalid comment data: %s", serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -165,8 +196,9 @@ class CreatePostView(APIView):
     API View to create posts using the Factory Pattern.
     Supports authentication and uses PostFactory for standardized post creation.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ConfigRateThrottle]
 
     def post(self, request):
         data = request.data
@@ -179,27 +211,64 @@ class CreatePostView(APIView):
                 metadata=data.get('metadata', {}),
                 author=request.user
             )
-            logger.info(f"Post created successfully using Factory by user {request.user.username}: Post ID {post.id}")
+            logger.info("Post created successfully using Factory by user %s: Post ID %s", request.user.username, post.id)
             return Response({
                 'message': 'Post created successfully!',
                 'post_id': post.id,
                 'post_type': post.post_type,
-                'title': post.title
+                'title': post.title,
+                # Processed in the background; poll GET /posts/{id}/media/
+                'media_status': MediaJob.PENDING if post.post_type in media_jobs.MEDIA_TYPES else None
             }, status=status.HTTP_201_CREATED)
         except KeyError as e:
-            logger.warning(f"Missing required field in post creation: {str(e)}")
+            logger.warning("Missing required field in post creation: %s", e)
             return Response({'error': f'Missing required field: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
         except ValueError as e:
-            logger.warning(f"Validation error in post creation: {str(e)}")
+            logger.warning("Validation error in post creation: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error creating post via Factory: {str(e)}")
+            logger.error("Error creating post via Factory: %s", e)
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class BulkCreatePostsView(APIView):
+    """
+    API View to create many posts in one request using PostFactory.create_posts.
+    POST /posts/bulk: Accepts a JSON array or an NDJSON stream (Content-Type: application/x-ndjson)
+    of post objects. Valid posts are written in batches; invalid ones are reported by index.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [ConfigRateThrottle]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request):
+        items = request.data
+        if isinstance(items, dict):
+            return Response({'error': 'Expected a JSON array or NDJSON stream of posts'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            batch_size = int(request.query_params.get('batch_size', PostFactory.BULK_BATCH_SIZE))
+        except ValueError:
+            return Response({'error': 'batch_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created, errors = PostFactory.create_posts(items, author=request.user, batch_size=max(batch_size, 1))
+        except Exception as e:
+            logger.error("Error in bulk post creation: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        logger.info("Bulk created %s posts for user %s (%s rejected)", len(created), request.user.username, len(errors))
+        return Response({
+            'created': len(created),
+            'failed': len(errors),
+            'post_ids': [post.id for post in created],
+            'errors': errors
+        }, status=status.HTTP_201_CREATED if created or not errors else status.HTTP_400_BAD_REQUEST)
 
-class CommentPagination(PageNumberPagination):
+
+class CommentPagination(ConfigPageSizeMixin, PageNumberPagination):
     """Custom pagination class for comments"""
-    page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
@@ -208,77 +277,155 @@ class LikePostView(APIView):
     """
     API View to like a post.
     POST /posts/{id}/like: Allows authenticated users to like a post.
-    Prevents duplicate likes using unique_together constraint.
+    Duplicate likes are skipped by the INSERT itself (see posts/likes.py), so
+    repeating the request is harmless.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ConfigRateThrottle]
 
     def post(self, request, pk):
         try:
-            post = Post.objects.get(pk=pk)
-        except Post.DoesNotExist:
-            logger.error(f"Post not found with ID: {pk}")
-            return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+            like = likes.add_like(request.user, pk)
+        except Exception as e:
+            logger.error("Error liking post %s: %s", pk, e)
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        try:
-            # Create like
-            like = Like.objects.create(user=request.user, post=post)
-            logger.info(f"User {request.user.username} liked post {pk}")
-            serializer = LikeSerializer(like)
-            return Response({
-                'message': 'Post liked successfully',
-                'like': serializer.data
-            }, status=status.HTTP_201_CREATED)
-        except IntegrityError:
-            # User already liked this post
-            logger.warning(f"User {request.user.username} attempted to like post {pk} again")
+        if like is None:
+            # Nothing inserted: either the post is gone or the like already exists
+            if not Post.objects.filter(pk=pk).exists():
+                logger.error("Post not found with ID: %s", pk)
+                return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+            logger.warning("User %s attempted to like post %s again", request.user.username, pk)
             return Response(
                 {'error': 'You have already liked this post'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        except Exception as e:
-            logger.error(f"Error liking post {pk}: {str(e)}")
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        logger.info("User %s liked post %s", request.user.username, pk)
+        serializer = LikeSerializer(like)
+        return Response({
+            'message': 'Post liked successfully',
+            'like': serializer.data
+        }, status=status.HTTP_201_CREATED)
 
     def delete(self, request, pk):
         """
         Unlike a post by removing the like.
         """
         try:
-            post = Post.objects.get(pk=pk)
-        except Post.DoesNotExist:
-            logger.error(f"Post not found with ID: {pk}")
-            return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+            removed = likes.remove_like(request.user, pk)
+        except Exception as e:
+            logger.error("Error unliking post %s: %s", pk, e)
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        try:
-            like = Like.objects.get(user=request.user, post=post)
-            like.delete()
-            logger.info(f"User {request.user.username} unliked post {pk}")
+        if removed:
+            logger.info("User %s unliked post %s", request.user.username, pk)
             return Response({'message': 'Post unliked successfully'}, status=status.HTTP_200_OK)
-        except Like.DoesNotExist:
-            logger.warning(f"User {request.user.username} tried to unlike post {pk} but hasn't liked it")
+        if not Post.objects.filter(pk=pk).exists():
+            logger.error("Post not found with ID: %s", pk)
+            return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+        logger.warning("User %s tried to unlike post %s but hasn't liked it", request.user.username, pk)
+        return Response(
+            {'error': 'You have not liked this post'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class BatchLikeView(APIView):
+    """
+    API View to like many posts at once.
+    POST /posts/like: Accepts {"post_ids": [...]} (at most likes.BATCH_LIMIT ids) and
+    likes them all with one INSERT. Reports which posts were newly liked, which
+    were already liked and which don't exist.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [ConfigRateThrottle]
+
+    def post(self, request):
+        post_ids = request.data.get('post_ids') if isinstance(request.data, dict) else None
+        if not isinstance(post_ids, list) or not post_ids:
+            return Response({'error': 'post_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(post_id, int) and not isinstance(post_id, bool) for post_id in post_ids):
+            return Response({'error': 'post_ids must contain integers'}, status=status.HTTP_400_BAD_REQUEST)
+        post_ids = set(post_ids)
+        if len(post_ids) > likes.BATCH_LIMIT:
             return Response(
-                {'error': 'You have not liked this post'},
+                {'error': f'At most {likes.BATCH_LIMIT} posts can be liked at once'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        try:
+            created = likes.add_likes(request.user, post_ids)
         except Exception as e:
-            logger.error(f"Error unliking post {pk}: {str(e)}")
+            logger.error("Error in batch like for user %s: %s", request.user.username, e)
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        rest = post_ids - created.keys()
+        existing = set(Post.objects.filter(pk__in=rest).values_list('pk', flat=True)) if rest else set()
+        logger.info("User %s liked %s posts in a batch", request.user.username, len(created))
+        return Response({
+            'liked': sorted(created),
+            'already_liked': sorted(existing),
+            'not_found': sorted(rest - existing),
+        }, status=status.HTTP_200_OK)
+
+
+class FollowUserView(APIView):
+    """
+    API View to follow or unfollow a user.
+    POST /posts/users/{id}/follow: Follow the user and backfill their recent posts into your timeline.
+    DELETE /posts/users/{id}/follow: Unfollow the user.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [ConfigRateThrottle]
+
+    def post(self, request, pk):
+        try:
+            followee = User.objects.get(pk=pk)
+        except User.DoesNotExist:
+            logger.error("User not found with ID: %s", pk)
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            timeline.follow(request.user, followee)
+            logger.info("User %s followed %s", request.user.username, followee.username)
+            return Response({'message': f'You are now following {followee.username}'}, status=status.HTTP_201_CREATED)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            logger.warning("User %s attempted to follow %s again", request.user.username, followee.username)
+            return Response({'error': 'You already follow this user'}, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request, pk):
+        try:
+            followee = User.objects.get(pk=pk)
+        except User.DoesNotExist:
+            logger.error("User not found with ID: %s", pk)
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if not timeline.unfollow(request.user, followee):
+            return Response({'error': 'You do not follow this user'}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info("User %s unfollowed %s", request.user.username, followee.username)
+        return Response({'message': f'You unfollowed {followee.username}'}, status=status.HTTP_200_OK)
+
 
 class CommentOnPostView(APIView):
     """
     API View to comment on a post.
     POST /posts/{id}/comment: Allows authenticated users to add a comment to a post.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ConfigRateThrottle]
 
     def post(self, request, pk):
         try:
             post = Post.objects.get(pk=pk)
         except Post.DoesNotExist:
-            logger.error(f"Post not found with ID: {pk}")
+            logger.error("Post not found with ID: %s", pk)
             return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
 
         # Add post and author to request data
@@ -288,14 +435,17 @@ class CommentOnPostView(APIView):
 
         serializer = CommentSerializer(data=data)
         if serializer.is_valid():
-            comment = serializer.save(author=request.user, post=post)
-            logger.info(f"User {request.user.username} commented on post {pk}")
+            with transaction.atomic():
+                comment = serializer.save(author=request.user, post=post)
+                Post.objects.filter(pk=post.pk).adjust_counters(comments=1)
+                notify_interaction(post.pk, 'comment')
+            logger.info("User %s commented on post %s", request.user.username, pk)
             return Response({
                 'message': 'Comment added successfully',
                 'comment': CommentSerializer(comment).data
             }, status=status.HTTP_201_CREATED)
         
-        logger.warning(f"Invalid comment data from user {request.user.username}: {serializer.errors}")
+        logger.warning("Invalid comment data from user %s: %s", request.user.username, serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -303,27 +453,40 @@ class PostCommentsView(APIView):
     """
     API View to retrieve all comments for a specific post.
     GET /posts/{id}/comments: Returns paginated comments for the post.
+    Add ?pagination=cursor (then follow `next`) for keyset pagination.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     pagination_class = CommentPagination
+    cursor_pagination_class = KeysetPagination
 
     def get(self, request, pk):
+        cache_key = response_cache.post_key(pk, 'comments', request)
+        return response_cache.respond('comments', cache_key, lambda: self.build_response(request, pk))
+
+    def build_response(self, request, pk):
         try:
             post = Post.objects.get(pk=pk)
         except Post.DoesNotExist:
-            logger.error(f"Post not found with ID: {pk}")
+            logger.error("Post not found with ID: %s", pk)
             return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        comments = Comment.objects.filter(post=post)
-        
+        fieldset = sparse_fieldset(request)
+        comments = CommentSerializer.narrow(Comment.objects.filter(post=post), **fieldset)
+
+        if KeysetPagination.is_requested(request):
+            paginator = self.cursor_pagination_class()
+            page = paginator.paginate_queryset(comments, request, view=self)
+            serializer = CommentSerializer(page, many=True, **fieldset)
+            return paginator.get_paginated_response(serializer.data)
+
         # Apply pagination
         paginator = self.pagination_class()
         try:
             paginated_comments = paginator.paginate_queryset(comments, request)
         except Exception:
             # If page is out of range, return empty results
-            logger.info(f"Page out of range for post {pk}, returning empty results")
+            access_logger.info("Page out of range for post %s, returning empty results", pk)
             return Response({
                 'count': comments.count(),
                 'next': None,
@@ -331,8 +494,8 @@ class PostCommentsView(APIView):
                 'results': []
             })
         
-        serializer = CommentSerializer(paginated_comments, many=True)
-        logger.info(f"Retrieved {len(serializer.data)} comments for post {pk}")
+        serializer = CommentSerializer(paginated_comments, many=True, **fieldset)
+        access_logger.info("Retrieved %s comments for post %s", len(serializer.data), pk)
         
         return paginator.get_paginated_response(serializer.data)
 
@@ -341,36 +504,62 @@ class PostDetailView(APIView):
     """
     Enhanced Post Detail View with like_count and comment_count.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
+        cache_key = response_cache.post_key(pk, 'detail', request)
+        return response_cache.respond('detail', cache_key, lambda: self.build_response(request, pk))
+
+    def build_response(self, request, pk):
         try:
-            post = Post.objects.get(pk=pk)
-            logger.info(f"User {request.user.username} accessed post {pk}")
+            post = Post.objects.for_detail().get(pk=pk)
+            access_logger.info("User %s accessed post %s", request.user.username, pk)
             
             # Return detailed post information with counts
-            return Response({
-                'id': post.id,
-                'title': post.title,
-                'content': post.content,
-                'post_type': post.post_type,
-                'metadata': post.metadata,
-                'author': post.author.id,
-                'author_username': post.author.username if post.author else None,
-                'created_at': post.created_at,
-                'like_count': post.like_count,
-                'comment_count': post.comment_count
-            })
+            return Response(self.serialize(post))
         except Post.DoesNotExist:
-            logger.error(f"Post not found with ID: {pk}")
+            logger.error("Post not found with ID: %s", pk)
+            return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    @staticmethod
+    def serialize(post):
+        return {
+            'id': post.id,
+            'title': post.title,
+            'content': post.content,
+            'post_type': post.post_type,
+            'metadata': post.metadata,
+            'author': post.author_id,
+            'author_username': post.author.username if post.author else None,
+            'created_at': post.created_at,
+            'like_count': likes.like_count(post),
+            'comment_count': post.comment_count
+        }
+
+
+class PostMediaView(APIView):
+    """
+    GET /posts/{id}/media/: processing status of an image or video post
+    (pending, running, done or failed) and, once done, its normalized metadata.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        post = Post.objects.only('id', 'post_type', 'metadata').filter(pk=pk).first()
+        if post is None:
             return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
+        if post.post_type not in media_jobs.MEDIA_TYPES:
+            return Response({"error": "Post has no media"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(media_jobs.status(post))
+
 
 class AuthenticatedUserProfileView(APIView):
     """
     API View to retrieve the profile of the currently authenticated user.
     """
-    authentication_classes = [TokenAuthentication] # Or SessionAuthentication if primarily browser-based
+    authentication_classes = [CachedTokenAuthentication] # Or SessionAuthentication if primarily browser-based
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -378,31 +567,71 @@ class AuthenticatedUserProfileView(APIView):
         return Response(serializer.data)
 
 
-class NewsFeedPagination(PageNumberPagination):
+class NewsFeedPagination(ConfigPageSizeMixin, PageNumberPagination):
     """Custom pagination for the news feed"""
-    page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
+FEED_SORTS = ('new', 'hot')
+
+
 class NewsFeedView(APIView):
     """
     API View to retrieve a paginated list of posts for the news feed.
     Posts are sorted by creation date (newest first).
+    Add ?pagination=cursor (then follow `next`) for keyset pagination.
+    ?scope=following returns the user's personalized home timeline (always cursor paginated).
+    ?sort=hot orders by trending score instead (always cursor paginated; scores are
+    refreshed by the refresh_trending command).
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     pagination_class = NewsFeedPagination
+    cursor_pagination_class = KeysetPagination
+    hot_pagination_class = HotKeysetPagination
 
     def get(self, request):
-        posts = Post.objects.all().order_by('-created_at') # Newest posts first
+        if request.query_params.get('scope') == 'following':
+            fieldset = sparse_fieldset(request)
+            posts = PostSerializer.narrow(Post.objects.all(), **fieldset)
+            paginator = self.cursor_pagination_class()
+            page = paginator.paginate_fetch(
+                lambda position, limit: timeline.home_timeline(request.user, position, limit, posts), request
+            )
+            serializer = PostSerializer(page, many=True, **fieldset)
+            return paginator.get_paginated_response(serializer.data)
+
+        return response_cache.respond(
+            'feed', response_cache.feed_key(request), lambda: self.build_response(request),
+            timeout=settings.FEED_CACHE_TIMEOUT,
+        )
+
+    def build_response(self, request):
+        sort = request.query_params.get('sort', 'new')
+        if sort not in FEED_SORTS:
+            return Response({'error': f"sort must be one of: {', '.join(FEED_SORTS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        fieldset = sparse_fieldset(request)
+        if sort == 'hot' or KeysetPagination.is_requested(request):
+            if sort == 'hot':
+                paginator = self.hot_pagination_class()
+                posts = PostSerializer.narrow(trending.hot_posts(), **fieldset)
+            else:
+                paginator = self.cursor_pagination_class()
+                posts = PostSerializer.narrow(Post.objects.all(), **fieldset)
+            page = paginator.paginate_queryset(posts, request, view=self)
+            serializer = PostSerializer(page, many=True, **fieldset)
+            return paginator.get_paginated_response(serializer.data)
+
+        posts = PostSerializer.narrow(Post.objects.all(), **fieldset).order_by('-created_at', '-id') # Newest posts first
         
         paginator = self.pagination_class()
         try:
             paginated_posts = paginator.paginate_queryset(posts, request)
         except Exception:
             # If page is out of range, return empty results
-            logger.info(f"Page out of range for news feed, returning empty results")
+            access_logger.info("Page out of range for news feed, returning empty results")
             return Response({
                 'count': posts.count(),
                 'next': None,
@@ -410,10 +639,127 @@ class NewsFeedView(APIView):
                 'results': []
             })
         
-        serializer = PostSerializer(paginated_posts, many=True)
-        logger.info(f"Retrieved {len(serializer.data)} posts for news feed")
+        serializer = PostSerializer(paginated_posts, many=True, **fieldset)
+        access_logger.info("Retrieved %s posts for news feed", len(serializer.data))
         
         return paginator.get_paginated_response(serializer.data)
 
 
+class SearchView(APIView):
+    """
+    API View for full-text search over posts and comments.
+    GET /posts/search/?q=<terms>: Posts matching every term, best match first. A trailing
+    `*` makes a term a prefix (`djan*`). `?type=comments` searches comment text instead;
+    `?page=` / `?page_size=` (max 50) page through the results.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_page_size = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('type', 'posts')
+        if kind not in search.KINDS:
+            return Response({'error': f"type must be one of: {', '.join(search.KINDS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not search.parse_query(query):
+            return Response({'error': 'q must contain at least one word'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', 20)), 1), self.max_page_size)
+        except ValueError:
+            return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # One extra row tells whether there is a next page
+            hits = search.search(kind, query, limit=page_size + 1, offset=(page - 1) * page_size)
+        except NotSupportedError as e:
+            return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        serialize = self.serialize_post if kind == 'posts' else self.serialize_comment
+        results = [{**serialize(obj), 'snippet': snippet, 'score': score} for obj, snippet, score in hits[:page_size]]
+        access_logger.info("Search for %r (%s) returned %s results", query, kind, len(results))
+        url = request.build_absolute_uri()
+        return Response({
+            'query': query,
+            'type': kind,
+            'next': replace_query_param(url, 'page', page + 1) if len(hits) > page_size else None,
+            'results': results,
+        })
+
+    @staticmethod
+    def serialize_post(post):
+        return {
+            'id': post.id,
+            'title': post.title,
+            'author_username': post.author.username if post.author else None,
+            'created_at': post.created_at,
+            'like_count': likes.like_count(post),
+            'comment_count': post.comment_count,
+        }
+
+    @staticmethod
+    def serialize_comment(comment):
+        return {
+            'id': comment.id,
+            'post': comment.post_id,
+            'author_username': comment.author.username,
+            'created_at': comment.created_at,
+        }
+
+
+class CacheStatsView(APIView):
+    """
+    Admin-only view exposing response cache hit rates.
+    GET /posts/cache/stats: Hits, misses and hit rate overall and per endpoint.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
+
+
+class RequestMetricsView(APIView):
+    """
+    Admin-only view exposing the rolling per-endpoint request metrics.
+    GET /posts/metrics: Latency histogram and percentiles, queries, DB and serializer time per endpoint.
+    DELETE /posts/metrics: Clear the window.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(histogram.snapshot())
+
+    def delete(self, request):
+        histogram.reset()
+        return Response({'message': 'Request metrics cleared'}, status=status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    """
+    Admin-only streaming export of posts, comments or likes.
+    GET /posts/export/{posts|comments|likes}: ?output=ndjson (default) or csv,
+    optional ?since= / ?until= ISO dates or datetimes filtering on created_at.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, kind):
+        output = request.query_params.get('output', 'ndjson')
+        if kind not in export.EXPORTS or output not in export.FORMATS:
+            return Response({'error': 'Unknown export or output format'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            since = export.parse_bound(request.query_params.get('since'))
+            until = export.parse_bound(request.query_params.get('until'), end_of_day=True)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        logger.info("User %s started a %s export of %s", request.user.username, output, kind)
+        response = StreamingHttpResponse(
+            export.export_stream(kind, output, since, until),
+            content_type=export.FORMATS[output]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{output}"'
+        return response
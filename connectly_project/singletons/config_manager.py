@@ -1,21 +1,207 @@
+"""
+Application tunables.
+
+Settings are layered, later layers winning:
+
+1. DEFAULTS below,
+2. the JSON object in the file named by CONNECTLY_CONFIG (if set),
+3. CONNECTLY_<KEY> environment variables (values parsed as JSON, else taken as strings),
+4. set_setting() overrides made at runtime.
+
+The result is an immutable snapshot (read-only mappings all the way down).
+Readers get it with one attribute load and never take a lock; reload() and
+set_setting() build a new snapshot and swap the reference. A watcher thread
+polls the config file every CONNECTLY_CONFIG_POLL_INTERVAL seconds (default 2)
+and reloads it when it changes, so limits and page sizes can be tuned on a
+running server. A file that fails to parse is logged and the previous snapshot
+stays in place.
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+
+DEFAULTS = {
+    # Page size of the feed, comment and cursor pagination when ?page_size= isn't given
+    "DEFAULT_PAGE_SIZE": 10,
+    "ENABLE_ANALYTICS": True,
+    # Write requests per user and endpoint every RATE_LIMIT_PERIOD seconds (posts/throttling.py);
+    # RATE_LIMIT_ENDPOINTS overrides it per URL name, e.g. {"post-like": 300}
+    "RATE_LIMIT": 100,
+    "RATE_LIMIT_PERIOD": 60,
+    "RATE_LIMIT_ENDPOINTS": {},
+    # Authors with more followers than this are merged into feeds at read time
+    "FANOUT_FOLLOWER_LIMIT": 1000,
+    # Recent posts copied into a timeline when a user follows someone
+    "TIMELINE_BACKFILL_SIZE": 50,
+    # LoggerSingleton: records per write and how long a partial batch may wait (seconds)
+    "LOG_BATCH_SIZE": 100,
+    "LOG_FLUSH_INTERVAL": 0.5,
+    # Share of INFO records kept per logger name; unlisted loggers keep everything
+    "LOG_SAMPLE_RATES": {"connectly_logger.access": 0.1},
+    # Trending feed (posts/trending.py): hours for an event's weight to halve, and event weights
+    "TRENDING_HALF_LIFE_HOURS": 6,
+    "TRENDING_WEIGHTS": {"post": 1, "like": 1, "comment": 3},
+    # Maintenance schedules by task name (posts/scheduler.py), e.g. {"reconcile_counters": "0 2 * * *"};
+    # null disables a task
+    "SCHEDULED_TASKS": {}
+}
+
+CONFIG_FILE_VARIABLE = 'CONNECTLY_CONFIG'
+ENV_PREFIX = 'CONNECTLY_'
+
+# Not LoggerSingleton: it reads its own settings from here
+logger = logging.getLogger('connectly_logger.config')
+
+
+def freeze(value):
+    """Read-only copy of a JSON-like value: dicts become mapping proxies, lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def _parse_env(raw):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
 class ConfigManager:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
-            cls._instance = super(ConfigManager, cls).__new__(cls, *args, **kwargs)
-            cls._instance._initialize()
+            with cls._instance_lock:
+                # Another thread may have created it while this one waited
+                if not cls._instance:
+                    instance = super(ConfigManager, cls).__new__(cls, *args, **kwargs)
+                    instance._initialize()
+                    cls._instance = instance
         return cls._instance
 
     def _initialize(self):
-        self.settings = {
-            "DEFAULT_PAGE_SIZE": 20,
-            "ENABLE_ANALYTICS": True,
-            "RATE_LIMIT": 100
-        }
+        self._write_lock = threading.Lock()
+        self._overrides = {}
+        self._file_settings = {}
+        self._file_signature = None
+        self._path = os.environ.get(CONFIG_FILE_VARIABLE) or None
+        self._snapshot = freeze(DEFAULTS)
+        self._watcher = None
+        self._stop = threading.Event()
+        self.reload()
+        if self._path:
+            self.watch(float(os.environ.get(f'{CONFIG_FILE_VARIABLE}_POLL_INTERVAL', 2)))
+
+    @property
+    def settings(self):
+        """The current snapshot (read-only)"""
+        return self._snapshot
 
     def get_setting(self, key):
-        return self.settings.get(key)
+        return self._snapshot.get(key)
 
     def set_setting(self, key, value):
-        self.settings[key] = value
+        """Override `key` in this process until clear_setting(); survives reloads"""
+        with self._write_lock:
+            self._overrides[key] = value
+            self._publish()
+
+    def clear_setting(self, key):
+        """Drop a set_setting() override, going back to the file/environment/default value"""
+        with self._write_lock:
+            self._overrides.pop(key, None)
+            self._publish()
+
+    @contextmanager
+    def override(self, **values):
+        """set_setting() for the duration of the block, then restore the previous overrides"""
+        with self._write_lock:
+            saved = {key: self._overrides[key] for key in values if key in self._overrides}
+        for key, value in values.items():
+            self.set_setting(key, value)
+        try:
+            yield
+        finally:
+            for key in values:
+                if key in saved:
+                    self.set_setting(key, saved[key])
+                else:
+                    self.clear_setting(key)
+
+    @property
+    def path(self):
+        return self._path
+
+    def load(self, path):
+        """Switch to the config file at `path` (None: no file) and reload"""
+        with self._write_lock:
+            self._path = path
+            self._file_settings = {}
+            self._file_signature = None
+        return self.reload()
+
+    def reload(self):
+        """Re-read the config file and environment; True if the file was (re)loaded"""
+        with self._write_lock:
+            loaded = False
+            if self._path:
+                loaded = self._load_file()
+            self._publish()
+            return loaded
+
+    def _load_file(self):
+        try:
+            stat = os.stat(self._path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._file_signature:
+                return False
+            with open(self._path) as handle:
+                settings = json.load(handle)
+            if not isinstance(settings, dict):
+                raise ValueError("expected a JSON object")
+        except (OSError, ValueError) as e:
+            # Once per failure, not on every poll
+            if self._file_signature != str(e):
+                logger.error("Keeping the current settings; could not load %s: %s", self._path, e)
+                self._file_signature = str(e)
+            return False
+        unknown = settings.keys() - DEFAULTS.keys()
+        if unknown:
+            logger.warning("Unknown settings in %s: %s", self._path, ', '.join(sorted(unknown)))
+        self._file_settings = settings
+        self._file_signature = signature
+        logger.info("Loaded settings from %s", self._path)
+        return True
+
+    def _publish(self):
+        # Callers hold _write_lock; readers see either the old or the new snapshot
+        env = {
+            key: _parse_env(os.environ[ENV_PREFIX + key])
+            for key in DEFAULTS if ENV_PREFIX + key in os.environ
+        }
+        self._snapshot = freeze({**DEFAULTS, **self._file_settings, **env, **self._overrides})
+
+    def watch(self, interval=2.0):
+        """Start the thread that reloads the config file when it changes"""
+        if self._watcher is not None or not self._path:
+            return
+        self._watcher = threading.Thread(target=self._run, args=(interval,), name='config-watcher', daemon=True)
+        self._watcher.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.reload()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        self._stop.clear()
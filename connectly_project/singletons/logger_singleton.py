@@ -1,4 +1,135 @@
+import atexit
+import json
 import logging
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import BufferingHandler, QueueHandler, QueueListener
+
+from singletons.config_manager import ConfigManager
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message and any `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BatchedStreamHandler(BufferingHandler):
+    """Buffer formatted records and write each batch to the stream with a single write()"""
+
+    def __init__(self, stream=None, capacity=100):
+        super().__init__(capacity)
+        self.stream = stream or sys.stderr
+
+    def emit(self, record):
+        try:
+            # Format now so the buffer holds plain strings
+            self.buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+        if self.shouldFlush(record):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            try:
+                self.stream.write('\n'.join(self.buffer) + '\n')
+                self.stream.flush()
+            except Exception:
+                self.handleError(logging.makeLogRecord({'msg': 'Failed to write log batch'}))
+            self.buffer = []
+
+
+class FlushRequest:
+    """Queue marker asking the listener to write out everything queued before it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that also flushes partial batches whenever the queue goes idle"""
+
+    def __init__(self, log_queue, *handlers, flush_interval=0.5):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block=block, timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush()
+
+    def handle(self, record):
+        if isinstance(record, FlushRequest):
+            self.flush()
+            record.done.set()
+            return
+        super().handle(record)
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+        self.flush()
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Enqueue records as they are: %-style arguments are merged and the JSON encoded
+    by the listener thread, not by the request thread. Pass immutable arguments.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in N records at INFO and below for loggers listed in the LOG_SAMPLE_RATES
+    setting ({logger name: rate}, N = 1 / rate). Warnings and errors always pass.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = (ConfigManager().get_setting('LOG_SAMPLE_RATES') or {}).get(record.name)
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        with self._lock:
+            seen = self._counters.get(record.name, 0)
+            self._counters[record.name] = seen + 1
+        return seen % round(1 / rate) == 0
 
 
 class LoggerSingleton:
@@ -11,12 +142,33 @@ class LoggerSingleton:
         return cls._instance
 
     def _initialize(self):
+        # Request threads only put records on an unbounded queue; a background
+        # listener formats them as JSON and writes them out in batches.
+        config = ConfigManager()
+        self.queue = queue.SimpleQueue()
+        self.writer = BatchedStreamHandler(capacity=config.get_setting('LOG_BATCH_SIZE'))
+        self.writer.setFormatter(JsonFormatter())
+        self.listener = BatchingQueueListener(
+            self.queue, self.writer, flush_interval=config.get_setting('LOG_FLUSH_INTERVAL')
+        )
+
+        handler = LazyQueueHandler(self.queue)
+        handler.addFilter(SamplingFilter())
         self.logger = logging.getLogger("connectly_logger")
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        handler.setFormatter(formatter)
         self.logger.addHandler(handler)
         self.logger.setLevel(logging.INFO)
 
-    def get_logger(self):
-        return self.logger
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def get_logger(self, name=None):
+        """The app logger, or its `connectly_logger.<name>` child (sampled separately)"""
+        if name is None:
+            return self.logger
+        return self.logger.getChild(name)
+
+    def flush(self, timeout=5):
+        """Block until every record logged so far has been written"""
+        request = FlushRequest()
+        self.queue.put(request)
+        return request.done.wait(timeout)